@@ -1,20 +1,37 @@
 from flask import Flask
 from config import Config
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap
+from flask_migrate import Migrate
+from app.database import REPLICA_BIND, PooledSQLAlchemy, engine_options
 
-application = Flask(__name__)
-application.config.from_object(Config)
+db = PooledSQLAlchemy()
+login_manager = LoginManager()
+bootstrap = Bootstrap()
+migrate = Migrate()
 
-db = SQLAlchemy(application)
-db.create_all()
-db.session.commit()
 
-login_manager = LoginManager()
-login_manager.init_app(application)
+def create_app(config=Config):
+    """Create and configure a Flask application"""
+    application = Flask(__name__)
+    application.config.from_object(config)
+    application.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                                  engine_options(application.config))
+    if application.config.get("SQLALCHEMY_REPLICA_URI"):
+        binds = dict(application.config.get("SQLALCHEMY_BINDS") or {})
+        binds[REPLICA_BIND] = application.config["SQLALCHEMY_REPLICA_URI"]
+        application.config["SQLALCHEMY_BINDS"] = binds
+
+    db.init_app(application)
+    login_manager.init_app(application)
+    bootstrap.init_app(application)
+    migrate.init_app(application, db)
 
-bootstrap = Bootstrap(application)
+    from app import routes, commands, api, metrics, profiler
+    application.register_blueprint(routes.main)
+    application.register_blueprint(api.api)
+    commands.init_app(application)
+    metrics.init_app(application)
+    profiler.init_app(application)
 
-from app import routes
-from app import classes
+    return application
@@ -0,0 +1,251 @@
+"""
+JSON API of the logged in user's history.
+
+Including:
+/api/coins - coin ledger, most recent log_date first
+/api/transactions - transactions, most recent trans_date first
+/api/transactions/export - every transaction as a CSV or NDJSON download
+
+The first two are keyset paginated: a page is fetched with the cursor
+returned as next_cursor by the previous page, so every page is an index
+range scan that costs the same however much history the user has. Each
+supported filter has an index leading with the user and the filtered
+column, then the date and id the pages are ordered by, so a date range
+combined with one of description, category_id or account_id costs the
+same too. category_id and account_id together read one of the two
+indexes and skip the rows of the other filter.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, jsonify, request, \
+    stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy import tuple_
+
+from app import classes, db
+from app.etag import conditional_on_data_version
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# rows fetched from the database and written to the client at a time
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = ["id", "account_id", "trans_date", "post_date",
+                  "trans_amount", "category_id", "is_preferred_saving",
+                  "merchant_category", "merchant_address", "merchant_city",
+                  "merchant_state", "merchant_country",
+                  "merchant_postal_code", "merchant_longitude",
+                  "merchant_latitude"]
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+
+@api.errorhandler(400)
+def bad_request(e):
+    """Error handler - 400"""
+    return jsonify(error=e.description), 400
+
+
+def date_arg(name):
+    """Return the YYYY-MM-DD query parameter name as a date, or None"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        abort(400, "{} must be a date in the format YYYY-MM-DD".format(name))
+
+
+def int_arg(name, default=None):
+    """Return the integer query parameter name, or default"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, "{} must be an integer".format(name))
+
+
+def page_size():
+    """Return the requested number of items per page"""
+    return max(1, min(int_arg("limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def date_id_cursor():
+    """Return the date and id of the cursor query parameter, the last item
+    seen, or None"""
+    cursor = request.args.get("cursor")
+    if cursor is None:
+        return None
+    try:
+        cursor_date, cursor_id = cursor.split("_")
+        return datetime.strptime(cursor_date, "%Y-%m-%d").date(), \
+            int(cursor_id)
+    except ValueError:
+        abort(400, "invalid cursor")
+
+
+@api.route("/coins")
+@login_required
+@conditional_on_data_version()
+def coins():
+    """Page through the user's coin ledger.
+
+    Query parameters: cursor, limit, start_date, end_date, description
+    """
+    limit = page_size()
+    coin = classes.Coin
+    query = coin.query.filter(coin.user_id == current_user.id)
+
+    # the cursor is the log_date and id of the last coin seen
+    cursor = date_id_cursor()
+    if cursor is not None:
+        query = query.filter(tuple_(coin.log_date, coin.id) <
+                             tuple_(*cursor))
+    start_date, end_date = date_arg("start_date"), date_arg("end_date")
+    if start_date is not None:
+        query = query.filter(coin.log_date >= start_date)
+    if end_date is not None:
+        query = query.filter(coin.log_date <= end_date)
+    if "description" in request.args:
+        query = query.filter(coin.description == request.args["description"])
+
+    rows = query.order_by(coin.log_date.desc(), coin.id.desc()) \
+        .limit(limit + 1).all()
+    items, more = rows[:limit], len(rows) > limit
+    next_cursor = None
+    if more:
+        next_cursor = "{}_{}".format(items[-1].log_date.isoformat(),
+                                     items[-1].id)
+    return jsonify(items=[dict(id=c.id,
+                               log_date=c.log_date.isoformat(),
+                               coin_amount=c.coin_amount,
+                               description=c.description)
+                          for c in items],
+                   next_cursor=next_cursor)
+
+
+@api.route("/transactions")
+@login_required
+@conditional_on_data_version()
+def transactions():
+    """Page through the user's transactions.
+
+    Query parameters: cursor, limit, start_date, end_date, category_id,
+    account_id
+    """
+    limit = page_size()
+    transaction = classes.Transaction
+    query = transaction.query.filter(
+        transaction.user_id == current_user.id)
+
+    # the cursor is the trans_date and id of the last transaction seen
+    cursor = date_id_cursor()
+    if cursor is not None:
+        query = query.filter(tuple_(transaction.trans_date, transaction.id) <
+                             tuple_(*cursor))
+    start_date, end_date = date_arg("start_date"), date_arg("end_date")
+    if start_date is not None:
+        query = query.filter(transaction.trans_date >= start_date)
+    if end_date is not None:
+        query = query.filter(transaction.trans_date <= end_date)
+    category_id = int_arg("category_id")
+    if category_id is not None:
+        query = query.filter(transaction.category_id == category_id)
+    account_id = int_arg("account_id")
+    if account_id is not None:
+        query = query.filter(transaction.account_id == account_id)
+
+    rows = query.order_by(transaction.trans_date.desc(),
+                          transaction.id.desc()).limit(limit + 1).all()
+    items, more = rows[:limit], len(rows) > limit
+    next_cursor = None
+    if more:
+        next_cursor = "{}_{}".format(items[-1].trans_date.isoformat(),
+                                     items[-1].id)
+    return jsonify(items=[dict(id=t.id,
+                               account_id=t.account_id,
+                               trans_date=t.trans_date.isoformat(),
+                               trans_amount=str(t.trans_amount),
+                               category_id=t.category_id,
+                               merchant_category=t.merchant_category)
+                          for t in items],
+                   next_cursor=next_cursor)
+
+
+def export_value(value):
+    """Return a transaction column value as a JSON serializable value"""
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    # Decimal amounts are exported as strings so no cent is lost
+    return str(value)
+
+
+def csv_chunks(rows):
+    """Yield the rows as CSV text, EXPORT_CHUNK_SIZE rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([export_value(value) for value in row])
+        if i % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    """Yield the rows as JSON lines, EXPORT_CHUNK_SIZE rows at a time"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(
+            EXPORT_COLUMNS, [export_value(value) for value in row]))))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+@api.route("/transactions/export")
+@login_required
+def export_transactions():
+    """Stream all of the user's transactions, oldest first.
+
+    Query parameters: format (csv or ndjson), start_date, end_date
+
+    Rows are read EXPORT_CHUNK_SIZE at a time through a server-side
+    cursor and are never loaded as ORM objects, so memory stays bounded
+    however many transactions the user has.
+    """
+    export_format = request.args.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        abort(400, "format must be one of {}".format(
+            ", ".join(sorted(EXPORT_FORMATS))))
+    transaction = classes.Transaction
+    query = db.session.query(
+        *[getattr(transaction, column) for column in EXPORT_COLUMNS]) \
+        .filter(transaction.user_id == current_user.id)
+    start_date, end_date = date_arg("start_date"), date_arg("end_date")
+    if start_date is not None:
+        query = query.filter(transaction.trans_date >= start_date)
+    if end_date is not None:
+        query = query.filter(transaction.trans_date <= end_date)
+    rows = query.order_by(transaction.trans_date, transaction.id) \
+        .yield_per(EXPORT_CHUNK_SIZE)
+
+    chunks = csv_chunks if export_format == "csv" else ndjson_chunks
+    response = Response(stream_with_context(chunks(rows)),
+                        mimetype=EXPORT_FORMATS[export_format])
+    response.headers["Content-Disposition"] = \
+        "attachment; filename=transactions.{}".format(export_format)
+    return response
@@ -3,13 +3,16 @@ SQLAlchemy Object Relational Mapper (ORM) and Flask-WTForms
 
 Including:
 Classes for each table in the database -
-user, plaid_items, accounts, transaction, savings_history, habits,
-coin, lottery, and user_lottery_log
+user, plaid_items, accounts, transaction, habit_aggregate, savings_history,
+habits, coin, lottery, user_lottery_log and lottery_ticket
 
 WTForms -
 RegistrationForm, LogInForm, and HabitForm
 """
 
+import functools
+from decimal import ROUND_HALF_UP, Decimal
+
 import pytz
 from flask_login import UserMixin
 from flask_wtf import FlaskForm
@@ -17,15 +20,108 @@ from flask_wtf import FlaskForm
 from werkzeug.security import check_password_hash, generate_password_hash
 from wtforms import PasswordField, StringField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Length
-from flask_migrate import Migrate
 from datetime import datetime
+from sqlalchemy import types
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
+from sqlalchemy.sql import operators
 
-from app import db, login_manager, application
+from app import db, login_manager
 
-migrate = Migrate(application, db)
 TZ = pytz.timezone("America/Los_Angeles")
 
 
+@functools.lru_cache(maxsize=None)
+def time_zone(name):
+    """Return the pytz time zone of a name, built once per name"""
+    return pytz.timezone(name)
+
+
+def to_cents(amount):
+    """Return an amount in dollars (number or string) in integer cents,
+    half cents rounded away from zero"""
+    return int((Decimal(str(amount)) * 100)
+               .to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Return integer cents as a Decimal amount in dollars, e.g.
+    Decimal("1.00")"""
+    return Decimal(cents).scaleb(-2)
+
+
+class Dollars(types.TypeDecorator):
+    """Integer cents column read and compared as Decimal dollars"""
+    impl = types.BigInteger
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
+
+
+# comparisons of a Dollars property to amounts turned into comparisons of
+# its cents column to cents
+CENTS_COMPARISONS = {operators.eq, operators.ne, operators.lt, operators.le,
+                     operators.gt, operators.ge, operators.between_op,
+                     operators.notbetween_op, operators.in_op,
+                     operators.notin_op}
+
+
+def is_amount(value):
+    """Return whether a value is an amount, or a list of amounts, in dollars"""
+    return isinstance(value, (int, float, str, Decimal)) or \
+        isinstance(value, (list, tuple)) and all(map(is_amount, value))
+
+
+def amount_cents(value):
+    """Return an amount, or a list of amounts, in cents"""
+    if isinstance(value, (list, tuple)):
+        return [amount_cents(amount) for amount in value]
+    return to_cents(value)
+
+
+class DollarsComparator(Comparator):
+    """Query expression of a dollars property, compared to amounts on the
+    cents column itself (so it can be indexed, and evaluated by bulk
+    updates and deletes) and selected as Decimal dollars"""
+
+    def __init__(self, cents):
+        super(DollarsComparator, self).__init__(
+            db.type_coerce(cents, Dollars))
+        self.cents = cents
+
+    def operate(self, op, *other, **kwargs):
+        if op in CENTS_COMPARISONS and all(map(is_amount, other)):
+            return op(self.cents, *map(amount_cents, other), **kwargs)
+        return op(self.expression, *other, **kwargs)
+
+    def reverse_operate(self, op, other, **kwargs):
+        return op(other, self.expression, **kwargs)
+
+
+def dollars(cents_column):
+    """
+    Decimal dollars property of an integer cents column, so amounts are
+    read, set, queried and compared in dollars as when they were stored
+    as decimal(10, 2)
+    :param cents_column: name of the cents attribute
+    """
+
+    def get(self):
+        cents = getattr(self, cents_column)
+        return None if cents is None else from_cents(cents)
+
+    def set(self, amount):
+        setattr(self, cents_column,
+                None if amount is None else to_cents(amount))
+
+    def comparator(cls):
+        return DollarsComparator(getattr(cls, cents_column))
+
+    return hybrid_property(get, set, custom_comparator=comparator)
+
+
 class User(db.Model, UserMixin):
     """Data model for user table.
 
@@ -41,6 +137,10 @@ class User(db.Model, UserMixin):
     auth_id: unique user id from OAuth if available; string
     coins: total number of coins the user has; int
     saving_suggestions: number of habit notifications sent to the user; int
+    data_version: bumped whenever data shown on the user's dashboard changes,
+                  used to build ETags; int
+    timezone: name of the user's time zone, e.g. "America/Los_Angeles";
+              string
     """
     __tablename__ = "user"
     id = db.Column("user_id", db.Integer, primary_key=True)
@@ -55,6 +155,10 @@ class User(db.Model, UserMixin):
     auth_id = db.Column(db.String, default=None)
     coins = db.Column(db.Integer, nullable=False, default=0)
     saving_suggestions = db.Column(db.Integer, nullable=False, default=0)
+    data_version = db.Column(db.Integer, nullable=False, default=0,
+                             server_default="0")
+    timezone = db.Column(db.String, nullable=False, default=TZ.zone,
+                         server_default=TZ.zone)
 
     # relationships
     plaid_items = db.relationship("PlaidItems", backref="user")
@@ -64,6 +168,7 @@ class User(db.Model, UserMixin):
     habits = db.relationship("Habits", backref="user")
     coin = db.relationship("Coin", backref="user")
     lottery_log = db.relationship("UserLotteryLog", backref="user")
+    lottery_tickets = db.relationship("LotteryTicket", backref="user")
 
     def __init__(self, first_name, last_name, email,
                  phone, password, auth_id=None):
@@ -83,6 +188,23 @@ class User(db.Model, UserMixin):
         """Check if the input password matches the actual password"""
         return check_password_hash(self.password_hash, password)
 
+    def bump_data_version(self):
+        """Mark the user's dashboard data as changed.
+
+        The increment is done by the database on flush so concurrent
+        writers never lose a bump.
+        """
+        self.data_version = User.data_version + 1
+
+    @property
+    def tz(self):
+        """The user's pytz time zone"""
+        return time_zone(self.timezone or TZ.zone)
+
+    def today(self):
+        """Return today's date in the user's time zone"""
+        return datetime.now(self.tz).date()
+
 
 class PlaidItems(db.Model):
     """Data model for plaid_items table.
@@ -137,7 +259,7 @@ class Transaction(db.Model):
     transaction_id: auto increment primary key; int
     user_id: user id that the transaction is associated with; int
     account_id: account id that the transaction is associated with; int
-    trans_amount: transaction amount; decimal(10, 2)
+    trans_amount_cents: transaction amount in cents; int
     category_id: category id in plaid; int
     is_preferred_saving: whether the transaction is a preferred saving
                          category; string
@@ -151,13 +273,17 @@ class Transaction(db.Model):
     merchant_postal_code: merchant postal code; string
     merchant_longitude: merchant longitude; string
     merchant_latitude: merchant latitude; string
+    habit_bucket: habit bucket of the category, see scripts.habit_buckets;
+                  int
+
+    trans_amount is the amount in dollars, a Decimal.
     """
     __tablename__ = "transaction"
     id = db.Column("transaction_id", db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
     account_id = db.Column(db.Integer,
                            db.ForeignKey("accounts.account_id"))
-    trans_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    trans_amount_cents = db.Column(db.BigInteger, nullable=False)
     category_id = db.Column(db.Integer)
     is_preferred_saving = db.Column(db.String)
     trans_date = db.Column(db.Date, nullable=False)
@@ -170,6 +296,52 @@ class Transaction(db.Model):
     merchant_postal_code = db.Column(db.String)
     merchant_longitude = db.Column(db.String)
     merchant_latitude = db.Column(db.String)
+    habit_bucket = db.Column(db.SmallInteger, nullable=False, default=0,
+                             server_default="0")
+
+    __table_args__ = (
+        # keyset pagination of a user's transactions
+        db.Index("ix_transaction_user_id_trans_date", "user_id",
+                 "trans_date", "transaction_id"),
+        # the same filtered by category or account, see app.api
+        db.Index("ix_transaction_user_id_category_id", "user_id",
+                 "category_id", "trans_date", "transaction_id"),
+        db.Index("ix_transaction_user_id_account_id", "user_id",
+                 "account_id", "trans_date", "transaction_id"),
+        # a user's transactions of one habit in a period, the Insights
+        # median
+        db.Index("ix_transaction_user_id_habit_bucket", "user_id",
+                 "habit_bucket", "trans_date"),
+    )
+
+    trans_amount = dollars("trans_amount_cents")
+
+
+class HabitAggregate(db.Model):
+    """Data model for habit_aggregate table, a user's spending per habit
+    bucket, month and day of the week, kept up to date at ingestion.
+
+    Columns include:
+    user_id: user id that the spending is associated with; int
+    habit_bucket: habit bucket of the transactions, see
+                  scripts.habit_buckets; int
+    month: first day of the month of the transactions; date
+    weekday: day of the week of the transactions, Monday is 0; int
+    trans_count: number of transactions; int
+    amount_cents: sum of the transaction amounts in cents; int
+    amount_cents_squared: sum of the squared transaction amounts in cents;
+                          int
+    """
+    __tablename__ = "habit_aggregate"
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"),
+                        primary_key=True)
+    habit_bucket = db.Column(db.SmallInteger, primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    weekday = db.Column(db.SmallInteger, primary_key=True)
+    trans_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    amount_cents_squared = db.Column(db.BigInteger, nullable=False,
+                                     default=0)
 
 
 class SavingsHistory(db.Model):
@@ -178,22 +350,31 @@ class SavingsHistory(db.Model):
     Columns include:
     savings_id: auto increment primary key; int
     user_id: id of the user that made the saving; int
-    savings_amount: savings amount; decimal(10, 2)
-    total_savings: total savings the user has made so far; decimal(10, 2)
-    predicted_savings: predicted savings the user will make; decimal(10, 2)
+    savings_amount_cents: savings amount in cents; int
+    total_savings_cents: total savings the user has made so far in cents;
+                         int
+    predicted_savings_cents: predicted savings the user will make in cents;
+                             int
     transfer_date: date when the savings are transferred to a
                    savings/investment account; date
     update_date: date when the savings entry is updated in the system; date
+
+    savings_amount, total_savings and predicted_savings are the amounts in
+    dollars, Decimals.
     """
     __tablename__ = "savings_history"
     id = db.Column("savings_id", db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
-    savings_amount = db.Column(db.Numeric(10, 2), nullable=False)
-    total_savings = db.Column(db.Numeric(10, 2), nullable=False)
-    predicted_savings = db.Column(db.Numeric(10, 2))
+    savings_amount_cents = db.Column(db.BigInteger, nullable=False)
+    total_savings_cents = db.Column(db.BigInteger, nullable=False)
+    predicted_savings_cents = db.Column(db.BigInteger)
     transfer_date = db.Column(db.Date, nullable=False)
     update_date = db.Column(db.Date, nullable=False)
 
+    savings_amount = dollars("savings_amount_cents")
+    total_savings = dollars("total_savings_cents")
+    predicted_savings = dollars("predicted_savings_cents")
+
 
 class Habits(db.Model):
     """Data model for habits table.
@@ -207,6 +388,10 @@ class Habits(db.Model):
     time_hour: hour of the reminder (0-23); int
     time_day_of_week: day of week of the reminder, including 3 values:
                       "weekday", "weekend", "everyday"; string
+    next_fire_at: when the next reminder is due, in UTC, None if it never
+                  fires; datetime
+    reminded_at: when the last reminder was sent, in UTC, the habits of a
+                 user reminded in one text share it; datetime
     """
     __tablename__ = "habits"
     id = db.Column("habits_id", db.Integer, primary_key=True)
@@ -216,6 +401,12 @@ class Habits(db.Model):
     time_minute = db.Column(db.Integer, nullable=False)
     time_hour = db.Column(db.Integer, nullable=False)
     time_day_of_week = db.Column(db.String, nullable=False)
+    next_fire_at = db.Column(db.DateTime)
+    reminded_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_habits_next_fire_at", "next_fire_at"),
+    )
 
 
 class Coin(db.Model):
@@ -228,6 +419,7 @@ class Coin(db.Model):
     log_date: date when the coin transaction occurs; date
     description: why the coins are added or subtracted, including 3 values:
                  login, saving, and lottery; string
+    habit_id: habit saved on, None for other coins; int
     """
     __tablename__ = "coin"
     id = db.Column("log_id", db.Integer, primary_key=True)
@@ -235,6 +427,19 @@ class Coin(db.Model):
     coin_amount = db.Column(db.Integer, nullable=False)
     log_date = db.Column(db.Date, nullable=False)
     description = db.Column(db.String, nullable=False)
+    habit_id = db.Column(db.Integer, db.ForeignKey("habits.habits_id",
+                                                   ondelete="SET NULL"))
+
+    __table_args__ = (
+        # a user's latest coins
+        db.Index("ix_coin_user_id_log_id", "user_id", "log_id"),
+        # keyset pagination of a user's coin ledger, and the same filtered
+        # by description, see app.api
+        db.Index("ix_coin_user_id_log_date", "user_id", "log_date",
+                 "log_id"),
+        db.Index("ix_coin_user_id_description", "user_id", "description",
+                 "log_date", "log_id"),
+    )
 
 
 class Lottery(db.Model):
@@ -248,6 +453,8 @@ class Lottery(db.Model):
     category: lottery category; string
     cost: number of coins that the lottery costs; int
     winner_user_id: user id of the lottery winner; int
+    total_entries: sum of the entries of the user_lottery_log of the
+                   lottery, kept by enter_lottery; int
     """
     __tablename__ = "lottery"
     id = db.Column("lottery_id", db.Integer, primary_key=True)
@@ -257,9 +464,12 @@ class Lottery(db.Model):
     category = db.Column(db.String, nullable=False)
     cost = db.Column(db.Integer, nullable=False)
     winner_user_id = db.Column(db.Integer, default=None)
+    total_entries = db.Column(db.Integer, nullable=False, default=0,
+                              server_default="0")
 
     # relationships
     lottery_log = db.relationship("UserLotteryLog", backref="lottery")
+    tickets = db.relationship("LotteryTicket", backref="lottery")
 
 
 class UserLotteryLog(db.Model):
@@ -277,6 +487,56 @@ class UserLotteryLog(db.Model):
     lottery_id = db.Column(db.Integer, db.ForeignKey("lottery.lottery_id"))
     entries = db.Column(db.Integer, nullable=False, default=1)
 
+    @property
+    def odds(self):
+        """The user's chance of winning the lottery, None before any entry
+        is counted"""
+        total = self.lottery.total_entries
+        return self.entries / total if total else None
+
+
+class LotteryTicket(db.Model):
+    """Data model for lottery_ticket table, the tickets bought at once by a
+    user, numbered from ticket_offset in the order they were bought so a
+    draw finds the holder of a ticket with one indexed lookup.
+
+    Columns include:
+    lottery_id: id of the lottery; int
+    ticket_offset: number of the first ticket, the lottery's total_entries
+                   when they were bought; int
+    user_id: id of the user holding the tickets; int
+    entries: number of tickets; int
+    """
+    __tablename__ = "lottery_ticket"
+    lottery_id = db.Column(db.Integer, db.ForeignKey("lottery.lottery_id"),
+                           primary_key=True)
+    ticket_offset = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"),
+                        nullable=False)
+    entries = db.Column(db.Integer, nullable=False, default=1)
+
+
+class SmsSender(db.Model):
+    """Data model for sms_sender table, the token bucket of a number texts
+    are sent from, shared by the processes sending texts, see app.sms.
+
+    Columns include:
+    sender: phone number of the sender; string
+    tokens: messages the number may send now; float
+    updated: time the tokens were counted, seconds since the epoch; float
+    rate: messages per second, lowered by 429s; float
+    blocked_until: time the number is paused until, seconds since the
+                   epoch; float
+    failures: consecutive 429s; int
+    """
+    __tablename__ = "sms_sender"
+    sender = db.Column(db.String(20), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.Float, nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    blocked_until = db.Column(db.Float, nullable=False)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+
 
 class RegistrationForm(FlaskForm):
     """Class for registration form"""
@@ -289,6 +549,9 @@ class RegistrationForm(FlaskForm):
         DataRequired(message='Input Required')])
     phone = StringField("Phone Number:", validators=[
         DataRequired(message='Input Required')])
+    timezone = SelectField("Time Zone:", default=TZ.zone,
+                           choices=[(name, name)
+                                    for name in pytz.common_timezones])
     password = PasswordField("Create a Password:", validators=[
         DataRequired(message='Input Required')])
     submit = SubmitField("Submit")
@@ -329,7 +592,3 @@ class HabitForm(FlaskForm):
 def load_user(id):
     """Return a user object from the user id stored in the session"""
     return User.query.get(int(id))
-
-
-db.create_all()
-db.session.commit()
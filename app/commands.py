@@ -0,0 +1,88 @@
+"""
+Flask CLI commands, run with `flask <command>` (FLASK_APP=application.py).
+
+Including:
+create-db - create all tables that do not exist yet
+rebuild-habit-aggregates - recompute every user's monthly habit aggregates
+scheduler - send habit reminders and draw lotteries until stopped
+seed-db - generate synthetic users offline
+"""
+
+import signal
+
+import click
+from flask.cli import with_appcontext
+
+from app import classes, db
+
+
+@click.command("create-db")
+@with_appcontext
+def create_db():
+    """Create all database tables that do not exist yet"""
+    db.create_all()
+    db.session.commit()
+    click.echo("Database tables created")
+
+
+@click.command("rebuild-habit-aggregates")
+@with_appcontext
+def rebuild_habit_aggregates():
+    """Recompute the monthly habit aggregates of every user"""
+    from scripts import habit_aggregates
+    user_ids = [user_id for user_id, in db.session.query(classes.User.id)]
+    for user_id in user_ids:
+        habit_aggregates.rebuild(user_id)
+        db.session.commit()
+    click.echo("Habit aggregates rebuilt for {} users".format(len(user_ids)))
+
+
+@click.command("scheduler")
+@click.option("--poll-seconds", default=5, show_default=True,
+              help="Longest sleep between looks at the database")
+@with_appcontext
+def scheduler(poll_seconds):
+    """Send habit reminders and draw lotteries when they are due"""
+    from app.scheduler import Scheduler
+    reminder_scheduler = Scheduler(poll_seconds=poll_seconds)
+    signal.signal(signal.SIGTERM, lambda *_: reminder_scheduler.stop())
+    click.echo("Scheduler started")
+    try:
+        reminder_scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    click.echo("Scheduler stopped")
+
+
+@click.command("seed-db")
+@click.option("--users", default=1000, show_default=True,
+              help="Number of users to generate")
+@click.option("--seed", default=0, show_default=True,
+              help="Seed of the random generator")
+@click.option("--start", default="2019-10-01", show_default=True,
+              help="First day of the generated activity")
+@click.option("--months", default=3, show_default=True,
+              help="Number of months of activity")
+@with_appcontext
+def seed_db(users, seed, start, months):
+    """Generate synthetic users, accounts, habits, coins, lotteries and
+    transactions"""
+    import time
+    from datetime import datetime
+    from scripts import seed_db as seeder
+    started = time.perf_counter()
+    counts = seeder.seed(users, seed,
+                         datetime.strptime(start, "%Y-%m-%d").date(), months)
+    seconds = time.perf_counter() - started
+    for table, count in counts.items():
+        click.echo("{}: {}".format(table, count))
+    click.echo("{} rows in {:.1f} s ({:.0f} rows/s)".format(
+        sum(counts.values()), seconds, sum(counts.values()) / seconds))
+
+
+def init_app(application):
+    """Register the commands on the application"""
+    application.cli.add_command(create_db)
+    application.cli.add_command(rebuild_habit_aggregates)
+    application.cli.add_command(scheduler)
+    application.cli.add_command(seed_db)
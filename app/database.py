@@ -0,0 +1,240 @@
+"""
+SQLAlchemy engine and connection pool setup.
+
+Including:
+engine_options - build create_engine() keyword arguments from the config
+PoolStats - checkout/checkin and wait statistics of a connection pool
+TimedQueuePool - QueuePool that records how long checkouts wait
+RoutingSession - session that sends reads to the replica, writes to primary
+PooledSQLAlchemy - Flask-SQLAlchemy extension that instruments every engine
+dispose_engines - drop pooled connections, e.g. in the master before forking
+"""
+
+import os
+import threading
+import time
+import weakref
+
+from flask import has_request_context, request, \
+    session as flask_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, exc, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import Select, CompoundSelect
+
+from app.metrics import instrument_engine
+
+REPLICA_BIND = "replica"
+PRIMARY_UNTIL_KEY = "_db_primary_until"
+# requests with these methods do not write, others read from the primary
+READ_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+
+def engine_options(config):
+    """Return SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    SQLite keeps the pool Flask-SQLAlchemy picks for it, every other
+    database gets a sized, pre-pinged and recycled TimedQueuePool.
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.drivername.startswith("sqlite"):
+        return {}
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+    timeout = config["DB_STATEMENT_TIMEOUT_MS"]
+    if timeout and url.drivername.startswith("postgresql"):
+        options["connect_args"] = {
+            "options": "-c statement_timeout={:d}".format(timeout)}
+    return options
+
+
+class PoolStats(object):
+    """Counters for one connection pool, safe to update from any thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def incr(self, counter):
+        """Add one to a counter"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds, timed_out=False):
+        """Record how long a checkout waited for a connection"""
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self):
+        """Return a snapshot of the counters"""
+        with self._lock:
+            return {"connects": self.connects,
+                    "checkouts": self.checkouts,
+                    "checkins": self.checkins,
+                    "invalidated": self.invalidated,
+                    "waits": self.waits,
+                    "wait_seconds": round(self.wait_seconds, 6),
+                    "max_wait_seconds": round(self.max_wait_seconds, 6),
+                    "timeouts": self.timeouts}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records the time spent waiting for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super(TimedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - start, True)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super(TimedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def _track_pool(engine):
+    """Count pool events and invalidate connections inherited by a fork"""
+    stats = getattr(engine.pool, "stats", None) or PoolStats()
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        connection_record.info["pid"] = os.getpid()
+        stats.incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = connection_record.info.get("pid", os.getpid())
+        if pid != os.getpid():
+            # never reuse a socket opened by the parent process
+            connection_record.connection = connection_proxy.connection = None
+            stats.incr("invalidated")
+            raise exc.DisconnectionError(
+                "Connection record belongs to pid {}, attempting to check "
+                "out in pid {}".format(pid, os.getpid()))
+        stats.incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        stats.incr("checkins")
+
+    return stats
+
+
+class RoutingSession(SignallingSession):
+    """Session that runs read-only queries on the replica, if configured.
+
+    Everything else stays on the primary: flushes, bulk updates/deletes,
+    SELECT ... FOR UPDATE, every query after this session has written and
+    every query of a request that may write, one whose method is not
+    READ_METHODS, so a check such as a coin balance before a purchase
+    never reads a lagging replica. A write also keeps the user's following
+    requests on the primary for DB_STICKY_SECONDS (read-your-writes),
+    tracked in the flask session. Set session.info["primary"] = True to
+    opt out of the replica.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super(RoutingSession, self).__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._use_replica(clause):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def _use_replica(self, clause):
+        """Return True if clause can safely be read from the replica"""
+        if REPLICA_BIND not in (self.app.config["SQLALCHEMY_BINDS"] or {}):
+            return False
+        if self._flushing or self.info.get("wrote") or \
+                self.info.get("primary"):
+            return False
+        if not isinstance(clause, (Select, CompoundSelect)) or \
+                getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        if has_request_context() and (
+                request.method not in READ_METHODS or
+                flask_session.get(PRIMARY_UNTIL_KEY, 0) > time.time()):
+            return False
+        return True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_bulk_update")
+@event.listens_for(RoutingSession, "after_bulk_delete")
+def _after_bulk(update_context):
+    update_context.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if session.info.get("wrote") and has_request_context():
+        flask_session[PRIMARY_UNTIL_KEY] = \
+            time.time() + session.app.config["DB_STICKY_SECONDS"]
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension that keeps track of its engines, times
+    their statements and routes reads with RoutingSession"""
+
+    def __init__(self, *args, **kwargs):
+        super(PooledSQLAlchemy, self).__init__(*args, **kwargs)
+        self.engines = weakref.WeakKeyDictionary()
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super(PooledSQLAlchemy, self).create_engine(sa_url,
+                                                             engine_opts)
+        self.engines[engine] = _track_pool(engine)
+        instrument_engine(engine)
+        return engine
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def pool_stats(self):
+        """Return checkout and wait statistics of every engine's pool"""
+        return {repr(engine.url): dict(stats.as_dict(),
+                                       status=engine.pool.status())
+                for engine, stats in list(self.engines.items())}
+
+
+def dispose_engines(db):
+    """Close all pooled connections of every engine created by db.
+
+    Call it in the master process before workers are forked so that no
+    worker inherits an open connection.
+    """
+    for engine in list(db.engines):
+        engine.dispose()
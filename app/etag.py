@@ -0,0 +1,64 @@
+"""
+Conditional GET support for dashboard responses.
+
+The ETag of a response is derived from the user's data_version (bumped
+by every write that changes their dashboard), the request path and the
+templates, so a matching If-None-Match is answered with 304 before the
+view runs a single query.
+"""
+
+import hashlib
+import os
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+_template_digest = None
+
+
+def template_digest():
+    """Return a digest of the templates, so a deploy changes every ETag"""
+    global _template_digest
+    if _template_digest is None:
+        digest = hashlib.md5()
+        for root, _, files in sorted(os.walk(TEMPLATE_DIR)):
+            for name in sorted(files):
+                with open(os.path.join(root, name), "rb") as f:
+                    digest.update(f.read())
+        _template_digest = digest.hexdigest()
+    return _template_digest
+
+
+def dashboard_etag(*extra):
+    """Return the ETag of the current user's response to this request"""
+    parts = [template_digest(), request.full_path, current_user.id,
+             current_user.data_version] + list(extra)
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def conditional_on_data_version(extra=None):
+    """Decorator answering GET requests with 304 Not Modified if the client
+    already has the current version of the user's data.
+
+    extra is an optional function returning anything else the response
+    depends on, e.g. today's date or the active lotteries.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # flashed messages are shown once, never answer them with a 304
+            if request.method != "GET" or "_flashes" in session:
+                return view(*args, **kwargs)
+
+            etag = dashboard_etag(*([extra()] if extra else []))
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,26 @@
+"""
+Background jobs that run outside of the request/response cycle.
+
+Slow calls to external services (e.g. removing an item from Plaid) are
+handed to a small thread pool so that the request can return right away.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(max_workers=2)
+
+
+def _log_failure(future):
+    """Log the exception of a finished job, if any"""
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background job failed: %r", exc)
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) in the background and return its future"""
+    future = executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_failure)
+    return future
@@ -0,0 +1,113 @@
+"""
+Process-wide cache of the lotteries that can be bought right now.
+
+The active lotteries are the same for every user and only change when one
+starts or ends, so they are loaded once and kept until the next start or
+end, or MAX_AGE at most to pick up lotteries added by other processes.
+Committing a new, changed or deleted lottery (e.g. a draw) in this
+process drops the cache.
+
+Including:
+ActiveLottery - the columns of a lottery shown on the dashboard
+LotteryCache - the cache, its expiry and invalidation
+active_lotteries - the active lotteries of the current app
+"""
+
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import classes, db
+
+# longest time a lottery created by another process stays unseen
+MAX_AGE = timedelta(minutes=1)
+
+ActiveLottery = namedtuple("ActiveLottery", ["id", "lottery_name",
+                                             "category", "start_date",
+                                             "end_date", "cost"])
+
+
+def local_now():
+    """Return the current time in the app's time zone, naive as the
+    lottery dates are"""
+    return datetime.now(classes.TZ).replace(tzinfo=None)
+
+
+class LotteryCache(object):
+    """Active lotteries, reloaded at the next start or end boundary"""
+
+    def __init__(self, clock=local_now):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._lotteries = None
+        self.expires_at = None
+
+    def get(self):
+        """Return the active lotteries, ordered by id"""
+        with self._lock:
+            now = self.clock()
+            if self._lotteries is None or now >= self.expires_at:
+                self._lotteries, self.expires_at = self.load(now)
+            return self._lotteries
+
+    def load(self, now):
+        """
+        Query the lotteries active at now
+        :return: tuple of the lotteries and when they change
+        """
+        Lottery = classes.Lottery
+        lotteries = [ActiveLottery(*row) for row in db.session.query(
+            Lottery.id, Lottery.lottery_name, Lottery.category,
+            Lottery.start_date, Lottery.end_date, Lottery.cost)
+            .filter(Lottery.start_date <= now, Lottery.end_date >= now)
+            .order_by(Lottery.id)]
+        next_start = db.session.query(db.func.min(Lottery.start_date)) \
+            .filter(Lottery.start_date > now).scalar()
+        # a lottery is active until the end of its end_date's microsecond
+        boundaries = [lottery.end_date + timedelta(microseconds=1)
+                      for lottery in lotteries] + [now + MAX_AGE]
+        if next_start is not None:
+            boundaries.append(next_start)
+        return lotteries, min(boundaries)
+
+    def invalidate(self):
+        """Reload the lotteries on the next get"""
+        with self._lock:
+            self._lotteries = None
+
+
+def cache():
+    """Return the current app's cache, created on first use"""
+    return current_app.extensions.setdefault("active_lotteries",
+                                             LotteryCache())
+
+
+def active_lotteries():
+    """Return the lotteries that can be bought right now"""
+    return cache().get()
+
+
+@event.listens_for(Session, "after_flush")
+def lottery_changed(session, flush_context):
+    """Note a flush creating, changing or deleting a lottery"""
+    changed = list(session.new) + list(session.dirty) + \
+        list(session.deleted)
+    if any(isinstance(instance, classes.Lottery) for instance in changed):
+        session.info["lottery_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_on_commit(session):
+    """Drop the cache once a lottery change is committed, so the reload
+    sees it"""
+    if session.info.pop("lottery_changed", False) and has_app_context():
+        cache().invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_change(session):
+    session.info.pop("lottery_changed", None)
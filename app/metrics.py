@@ -0,0 +1,277 @@
+"""
+Request, SQL and external call metrics, served at /metrics in the
+Prometheus text format.
+
+Including:
+Counter, Histogram - thread-safe metrics with labels
+instrument_engine - time every SQL statement run by an engine
+external_call - time a call to Plaid or Twilio, as a context manager or
+                decorator
+init_app - record each route's latency, SQL statements and SQL time and
+           add the /metrics endpoint
+
+SQL statements slower than SLOW_QUERY_MS are logged to the
+"app.slow_query" logger. Metrics are kept per process, with several
+gunicorn workers a scrape sees the worker that answered it. /metrics
+needs the PROFILE_TOKEN as a bearer token, the 429s are labeled with the
+sender numbers.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_app_context, \
+    has_request_context, request
+from sqlalchemy import event
+
+from app import profiler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SLOW_QUERY_MS = 250
+# endpoint label of statements and calls made outside a request
+BACKGROUND = "background"
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+
+def _format_labels(labels):
+    """Return labels as {name="value",...}, escaped for Prometheus"""
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                         .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """A named metric with one value per combination of labels"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        """Forget every recorded value"""
+        with self._lock:
+            self._values = {}
+
+    def expose(self):
+        """Return the metric in the Prometheus text format"""
+        lines = ["# HELP {} {}".format(self.name, self.documentation),
+                 "# TYPE {} {}".format(self.name, self.kind)]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            labels = list(zip(self.labelnames, key))
+            for suffix, extra, sample in self.samples(value):
+                lines.append("{}{}{} {}".format(
+                    self.name, suffix, _format_labels(labels + extra),
+                    _format_value(sample)))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A total that only goes up"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self, value):
+        return [("", [], value)]
+
+
+class Histogram(Metric):
+    """Counts of observations in cumulative buckets, with their sum"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0))
+        return sum(counts)
+
+    def samples(self, value):
+        counts, total = value
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            samples.append(("_bucket", [("le", bound)], cumulative))
+        samples.append(("_sum", [], total))
+        samples.append(("_count", [], cumulative))
+        return samples
+
+
+REGISTRY = []
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latency of requests by route",
+    ["endpoint", "method", "status"])
+REQUEST_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements run per request",
+    ["endpoint"], STATEMENT_BUCKETS)
+SQL_STATEMENTS = Counter(
+    "sql_statements_total", "SQL statements run by each route",
+    ["endpoint"])
+SQL_SECONDS = Counter(
+    "sql_duration_seconds_total", "Time each route spent running SQL",
+    ["endpoint"])
+SLOW_STATEMENTS = Counter(
+    "sql_slow_statements_total",
+    "SQL statements slower than SLOW_QUERY_MS by route", ["endpoint"])
+EXTERNAL_LATENCY = Histogram(
+    "external_call_duration_seconds", "Latency of Plaid and Twilio calls",
+    ["service", "operation"])
+EXTERNAL_SECONDS = Counter(
+    "external_call_seconds_total",
+    "Time each route spent waiting on Plaid and Twilio",
+    ["endpoint", "service"])
+SMS_QUEUE_SECONDS = Histogram(
+    "sms_queue_seconds", "Time texts waited for the rate shaper by lane",
+    ["lane"])
+SMS_RATE_LIMITED = Counter(
+    "sms_rate_limited_total", "429 responses by sender number",
+    ["sender"])
+
+
+def reset():
+    """Forget every recorded value, e.g. between tests"""
+    for metric in REGISTRY:
+        metric.reset()
+
+
+def expose():
+    """Return every metric in the Prometheus text format"""
+    return "\n".join(metric.expose() for metric in REGISTRY) + "\n"
+
+
+def current_endpoint():
+    """Return the endpoint of the current request, BACKGROUND outside
+    requests (scheduler, commands and background jobs)"""
+    if has_request_context():
+        return request.endpoint or "unknown"
+    return BACKGROUND
+
+
+def _request_stats():
+    if has_request_context():
+        return getattr(g, "_metrics", None)
+    return None
+
+
+def record_statement(statement, seconds):
+    """Count a SQL statement and log it if it is slow"""
+    endpoint = current_endpoint()
+    SQL_STATEMENTS.inc(endpoint=endpoint)
+    SQL_SECONDS.inc(seconds, endpoint=endpoint)
+    stats = _request_stats()
+    if stats is not None:
+        stats["statements"] += 1
+    threshold = current_app.config.get("SLOW_QUERY_MS", SLOW_QUERY_MS) \
+        if has_app_context() else SLOW_QUERY_MS
+    if seconds * 1000 >= threshold:
+        SLOW_STATEMENTS.inc(endpoint=endpoint)
+        slow_query_logger.warning("%.1f ms in %s: %s", seconds * 1000,
+                                  endpoint, " ".join(statement.split()))
+
+
+def instrument_engine(engine):
+    """Time every statement an engine runs"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        start = getattr(context, "_metrics_start", None)
+        if start is not None:
+            record_statement(statement, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def external_call(service, operation):
+    """
+    Time a call to an external service, failed calls included
+    :param service: "plaid" or "twilio"
+    :param operation: name of the call, e.g. "transactions_get"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        EXTERNAL_LATENCY.observe(seconds, service=service,
+                                 operation=operation)
+        EXTERNAL_SECONDS.inc(seconds, endpoint=current_endpoint(),
+                             service=service)
+
+
+def metrics():
+    """Every metric of this process in the Prometheus text format"""
+    if not profiler.authorized():
+        abort(404)
+    return Response(expose(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(application):
+    """Record the metrics of every request and add /metrics"""
+
+    @application.before_request
+    def start_timer():
+        g._metrics = {"start": time.perf_counter(), "statements": 0}
+
+    @application.after_request
+    def record_request(response):
+        stats = _request_stats()
+        if stats is not None:
+            endpoint = current_endpoint()
+            REQUEST_LATENCY.observe(time.perf_counter() - stats["start"],
+                                    endpoint=endpoint,
+                                    method=request.method,
+                                    status=response.status_code)
+            REQUEST_STATEMENTS.observe(stats["statements"],
+                                       endpoint=endpoint)
+        return response
+
+    application.add_url_rule("/metrics", "metrics", metrics)
@@ -0,0 +1,186 @@
+"""
+On-demand profiling of single requests.
+
+A request carrying the PROFILE_TOKEN in the X-Profile header or the
+profile query parameter runs under cProfile and tracemalloc; its pstats
+file (open with `python -m pstats`) and a report of the lines that
+allocated the most memory are written to PROFILE_DIR, and the response
+names them in X-Profile-Id. Only the PROFILE_KEEP latest profiles are
+kept. Profiling is off when PROFILE_TOKEN is not set.
+
+cProfile only sees the thread of the profiled request, tracemalloc traces
+the whole process, so one request is profiled at a time and a second one
+asking for it is served unprofiled. Other requests are not profiled but
+their allocations, while a profile runs, are traced too.
+
+Including:
+Profile - a running cProfile and tracemalloc capture and its reports
+has_token - whether a value given with the request is the PROFILE_TOKEN
+authorized - whether the request has the PROFILE_TOKEN as a bearer token
+requested - whether the request asks for a profile with the right token
+init_app - profile the requests that ask for it
+"""
+
+import cProfile
+import glob
+import hmac
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask import current_app, g, request
+
+HEADER = "X-Profile"
+PARAMETER = "profile"
+# frames kept per traced allocation
+TRACEMALLOC_FRAMES = 10
+# allocation lines in the report
+TOP_ALLOCATIONS = 25
+KEEP = 20
+
+_running = threading.Lock()
+
+
+class Profile(object):
+    """cProfile and tracemalloc capture of one request"""
+
+    def __init__(self, frames=TRACEMALLOC_FRAMES):
+        # tracing started elsewhere, e.g. PYTHONTRACEMALLOC, is left on
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(frames)
+        elif hasattr(tracemalloc, "reset_peak"):
+            # Python 3.9+
+            tracemalloc.reset_peak()
+        # the peak is the process's when tracing was already on and the
+        # peak cannot be reset
+        self.own_peak = self.started_tracing or \
+            hasattr(tracemalloc, "reset_peak")
+        self.start = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling and take the allocation snapshot"""
+        self.profile.disable()
+        self.seconds = time.perf_counter() - self.start
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>")])
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def allocations(self, title, limit=TOP_ALLOCATIONS):
+        """
+        Report the lines holding the most memory at the end of the request
+        :param title: first line of the report, e.g. the request's url
+        :return: report text
+        """
+        summary = "%.1f ms, traced memory %.1f KiB" % (
+            self.seconds * 1000, self.current / 1024)
+        if self.own_peak:
+            summary += ", peak %.1f KiB" % (self.peak / 1024)
+        lines = [title, summary, ""]
+        for stat in self.snapshot.statistics("traceback")[:limit]:
+            lines.append("%.1f KiB in %d blocks" % (stat.size / 1024,
+                                                    stat.count))
+            lines.extend("    " + line for line in stat.traceback.format())
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory, name, title, keep=KEEP):
+        """
+        Write name.pstats and name.txt in directory, dropping all but the
+        keep latest profiles
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        self.profile.dump_stats(path + ".pstats")
+        with open(path + ".txt", "w") as report:
+            report.write(self.allocations(title))
+        rotate(directory, keep)
+
+
+def rotate(directory, keep):
+    """Remove the profiles of directory but the keep latest"""
+    # the names start with the time they were written
+    profiles = sorted(glob.glob(os.path.join(directory, "*.pstats")))
+    for path in profiles[:max(len(profiles) - keep, 0)]:
+        for old in (path, path[:-len(".pstats")] + ".txt"):
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+def has_token(given):
+    """Return whether given is the PROFILE_TOKEN, never when it is not
+    set"""
+    token = current_app.config.get("PROFILE_TOKEN")
+    return bool(token and given) and hmac.compare_digest(
+        given.encode(), token.encode())
+
+
+def authorized():
+    """Return whether the request has the PROFILE_TOKEN as a bearer token,
+    the gate of the endpoints showing the process's internals"""
+    scheme, _, token = request.headers.get("Authorization", "") \
+        .partition(" ")
+    return scheme.lower() == "bearer" and has_token(token)
+
+
+def requested():
+    """Return whether the request asks for a profile with the right
+    PROFILE_TOKEN"""
+    return has_token(request.headers.get(HEADER) or
+                     request.args.get(PARAMETER))
+
+
+def profile_name():
+    """Return a unique, sortable name of the request's profile files"""
+    return "%s-%s-%d" % (datetime.now().strftime("%Y%m%dT%H%M%S.%f"),
+                         request.endpoint or "unknown", os.getpid())
+
+
+def init_app(application):
+    """Profile the requests that ask for it"""
+
+    @application.before_request
+    def start_profile():
+        if requested() and _running.acquire(blocking=False):
+            try:
+                g._profile = Profile(application.config.get(
+                    "PROFILE_TRACEMALLOC_FRAMES", TRACEMALLOC_FRAMES))
+            except Exception:
+                _running.release()
+                raise
+
+    def finish_profile():
+        """Stop and write the request's profile
+        :return: the name of its files, None when not profiled"""
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return None
+        try:
+            profile.stop()
+            name = profile_name()
+            profile.write(application.config["PROFILE_DIR"], name,
+                          "%s %s" % (request.method, request.path),
+                          application.config.get("PROFILE_KEEP", KEEP))
+            return name
+        finally:
+            _running.release()
+
+    @application.after_request
+    def write_profile(response):
+        name = finish_profile()
+        if name is not None:
+            response.headers[HEADER + "-Id"] = name
+        return response
+
+    @application.teardown_request
+    def stop_profile(error=None):
+        # a request failing before after_request
+        finish_profile()
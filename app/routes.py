@@ -1,23 +1,25 @@
 import os
 from datetime import datetime
-from app import application, classes, db
-from flask import redirect, render_template, url_for, request, flash
+from app import classes, db, jobs, profiler
+from app.etag import conditional_on_data_version
+from app.lottery_cache import active_lotteries
+from app.metrics import external_call
+from app.scheduler import dispatch_due, last_reminder, parse_reply, \
+    schedule
+from flask import Blueprint, redirect, render_template, url_for, request, \
+    flash, jsonify, abort
 from flask_login import current_user, login_user, login_required, logout_user
 from plaid.errors import ItemError
 from plaid_methods.methods import get_accounts, get_transactions, \
-    token_exchange
+    remove_item, token_exchange
 from plaid_methods import add_plaid_data as plaid_to_db
 from plaid import Client
-from plaid.api import Item
-import pytz
-import pandas as pd
+from sqlalchemy.orm import joinedload
 import twilio.rest
 from twilio.twiml.messaging_response import MessagingResponse
+from scripts import habit_aggregates
 from scripts.coin_transaction import add_login_coin, add_saving_coin, \
     enter_lottery, lottery_drawing
-from app.plotly_dashboard import plotly_saving_history, plotly_percent_saved,\
-    select_past_week
-from scripts.extract_habit import Insights
 
 ENV_VARS = {
     "PLAID_CLIENT_ID": os.environ["PLAID_CLIENT_ID"],
@@ -43,21 +45,42 @@ twilio_client = twilio.rest.Client(
     ENV_VARS["TWILIO_ACCOUNT_SID"],
     ENV_VARS["TWILIO_AUTH_TOKEN"])
 
+main = Blueprint("main", __name__)
 
-@application.route("/index")
-@application.route("/")
+# number of months of each Insights period
+INSIGHTS_PERIODS = {"month": 1, "3m": 3, "6m": 6, "12m": 12, "yoy": 1}
+
+
+def today():
+    """Return today's date in the app's time zone"""
+    return datetime.now(classes.TZ).date()
+
+
+def available_lottery_entries():
+    """Return the ids and total entries of the lotteries that can be bought
+    right now, every entry changes the odds of the others who bought one"""
+    ids = [lottery.id for lottery in active_lotteries()]
+    if not ids:
+        return []
+    return [tuple(row) for row in db.session.query(
+        classes.Lottery.id, classes.Lottery.total_entries)
+        .filter(classes.Lottery.id.in_(ids)).order_by(classes.Lottery.id)]
+
+
+@main.route("/index")
+@main.route("/")
 def index():
     """Home page before user login"""
     if current_user.is_authenticated:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
     return render_template("home.html")
 
 
-@application.route("/login", methods=["GET", "POST"])
+@main.route("/login", methods=["GET", "POST"])
 def login():
     """Login page"""
     if current_user.is_authenticated:
-        return redirect(url_for("index"))
+        return redirect(url_for("main.index"))
     login_form = classes.LogInForm()
     if login_form.validate_on_submit():
         email = login_form.email.data
@@ -71,18 +94,18 @@ def login():
                     receive notifications!')
                 return render_template("message.html", validator=True)
             elif user.status == "verified":
-                return redirect(url_for("index"))
+                return redirect(url_for("main.index"))
         else:
             flash('Invalid username and password combination')
     return render_template("login.html", form=login_form)
 
 
-@application.route("/register", methods=["POST", "GET"])
+@main.route("/register", methods=["POST", "GET"])
 def register():
     """Register page"""
     registration_form = classes.RegistrationForm()
     if current_user.is_authenticated:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
     if registration_form.validate_on_submit():
         first_name = registration_form.first_name.data
         last_name = registration_form.last_name.data
@@ -101,32 +124,35 @@ def register():
         else:
             # User information does not already exist in DB
             user = classes.User(first_name, last_name, email, phone, password)
+            user.timezone = registration_form.timezone.data
             db.session.add(user)
             db.session.commit()
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
     return render_template("register.html", form=registration_form)
 
 
-@application.route('/start_verification', methods=('GET', 'POST'))
+@main.route('/start_verification', methods=('GET', 'POST'))
 @login_required
 def start_verification():
     """Start a phone number verification"""
 
     service = ENV_VARS["VERIFICATION_SID"]
     try:
-        verification = twilio_client.verify \
-            .services(service) \
-            .verifications \
-            .create(to="+1"+str(current_user.phone), channel="sms")
+        # Verify sends from its own numbers, not the SMS_SENDERS pool
+        with external_call("twilio", "verifications_create"):
+            verification = twilio_client.verify \
+                .services(service) \
+                .verifications \
+                .create(to="+1"+str(current_user.phone), channel="sms")
 
     except Exception as e:
         flash("oops! We can't verify this phone number, please use a \
             valid phone number! Returning to homepage in 3 seconds")
         return render_template('message.html', validator=True)
-    return redirect(url_for('verify'))
+    return redirect(url_for('main.verify'))
 
 
-@application.route('/verify', methods=('GET', 'POST'))
+@main.route('/verify', methods=('GET', 'POST'))
 @login_required
 def verify():
     """Verify a user on registration with their phone number"""
@@ -146,13 +172,15 @@ def check_verification(phone, code):
             please try again.")
     else:
         try:
-            verification_check = twilio_client.verify \
-                .services(service) \
-                .verification_checks \
-                .create(to=phone, code=code)
+            with external_call("twilio", "verification_checks_create"):
+                verification_check = twilio_client.verify \
+                    .services(service) \
+                    .verification_checks \
+                    .create(to=phone, code=code)
 
             if verification_check.status == "approved":
                 current_user.status = "verified"
+                current_user.bump_data_version()
                 db.session.commit()
                 flash('Your phone number has been verified!')
                 return render_template('message.html', validator=False)
@@ -161,10 +189,10 @@ def check_verification(phone, code):
         except Exception as e:
             flash("Error validating code: {}".format(e))
 
-    return redirect(url_for('verify'))
+    return redirect(url_for('main.verify'))
 
 
-@application.route('/habit_table_save_changes', methods=["POST"])
+@main.route('/habit_table_save_changes', methods=["POST"])
 @login_required
 def habit_table_save_changes():
     if request.method == "POST":
@@ -177,9 +205,11 @@ def habit_table_save_changes():
 
         # delete the user's habits
         classes.Habits.query.filter_by(user_id=user_id).delete()
+        current_user.bump_data_version()
         db.session.commit()
 
         # add the latest habits back to db
+        tz = current_user.tz
         for i in range(len(habit_name)):
             habit = classes.Habits(user_id=user_id, habit_name=habit_name[i],
                                    habit_category=habit_category[i],
@@ -187,13 +217,14 @@ def habit_table_save_changes():
                                    .split(':')[1],
                                    time_hour=time_hour_minute[i].split(':')[0],
                                    time_day_of_week=time_day_of_week[i])
+            schedule(habit, tz)
             db.session.add(habit)
             db.session.commit()
 
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard", tab="habits"))
 
 
-@application.route('/create_habit', methods=["POST"])
+@main.route('/create_habit', methods=["POST"])
 @login_required
 def create_habit():
     """Add a new habit"""
@@ -211,24 +242,30 @@ def create_habit():
                                time_hour=int(time_hour),
                                time_day_of_week=time_day_of_week)
 
+        schedule(habit, current_user.tz)
         db.session.add(habit)
+        current_user.bump_data_version()
         db.session.commit()
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard", tab="habits"))
 
-    return redirect(url_for('dashboard'))
+    return redirect(url_for("main.dashboard", tab="habits"))
 
 
-@application.route("/dashboard", methods=["POST", "GET"])
+@main.route("/dashboard", methods=["POST", "GET"])
 @login_required
+@conditional_on_data_version()
 def dashboard():
-    """Main dashboard page for all four tabs"""
+    """Main dashboard page, the content of each of the four tabs is
+    fetched from its own endpoint when the tab is shown"""
     # default values
     lottery_status = "Buy a lottery ticket before it ends!"
+    active_tab = request.args.get("tab", "dashboard")
 
     # get lottery
     if request.method == "POST":
         buy_lottery = request.form.getlist("lottery_submit")
         checked_lottery = request.form.getlist("lottery_check")
+        active_tab = "lottery"
 
         # if user try to buy the lottery tickets
         if buy_lottery[0] == 'buy':
@@ -242,18 +279,32 @@ def dashboard():
                 for lottery_obj in lottery_objs:
                     enter_lottery(current_user, lottery_obj)
 
-    # get the lottery that the user has bought
-    bought_lottery_records = classes.UserLotteryLog.query.filter_by(
-        user=current_user).all()
+    # coin transaction history
+    coin_log = classes.Coin.query.filter_by(user=current_user).order_by(
+        classes.Coin.id.desc()).limit(6).all()
 
-    # get all the available lottery records
-    tz = pytz.timezone("America/Los_Angeles")
-    current_time = datetime.now().astimezone(tz)
-    available_lottery_records = classes.Lottery.query.filter(
-        classes.Lottery.start_date <= str(current_time),
-        classes.Lottery.end_date >= str(current_time)).all()
+    return render_template("dashboard.html",
+                           user=current_user,
+                           coin_log=coin_log,
+                           active_tab=active_tab,
+                           lottery_status=lottery_status,
+                           plaid_public_key=client.public_key,
+                           plaid_environment=client.environment,
+                           plaid_products=ENV_VARS.get("PLAID_PRODUCTS",
+                                                       "transactions"),
+                           plaid_country_codes=ENV_VARS.
+                           get("PLAID_COUNTRY_CODES", "US"))
+
+
+@main.route("/dashboard/savings")
+@login_required
+@conditional_on_data_version(extra=today)
+def dashboard_savings():
+    """Dashboard tab: savings charts"""
+    # plotting stack is only loaded on first use
+    from app.plotly_dashboard import plotly_saving_history, \
+        plotly_percent_saved, select_past_week
 
-    # Dashboard tab
     # extract user's saving history from coins associated with "saving"
     user_id = current_user.id
 
@@ -269,120 +320,224 @@ def dashboard():
     saving_percent, total_saving_coins = select_past_week(saving_date)
 
     # count how many times user has responded "Y" to save
-    num_saved = len(classes.Coin.query.filter_by(user_id=user_id,
-                                                 description='saving').all())
+    num_saved = len(saving_date)
     saving_percent_plot = plotly_percent_saved(
         num_saved, current_user.saving_suggestions)
 
-    # Retrieve spending habits for Insights
-    categories_file = os.path.join(os.getcwd(), 'scripts', 'categories.json')
+    data = dict(num_suggestions=current_user.saving_suggestions,
+                num_saved=num_saved,
+                total_saving_coins=total_saving_coins,
+                saving_percent=saving_percent)
+    return jsonify(html=render_template("dashboard/savings.html",
+                                        source_bar=savings_bar_plot,
+                                        source_pie=saving_percent_plot,
+                                        **data),
+                   **data)
+
 
-    beginning_month = datetime(year=2019, month=10, day=1)
+@main.route("/dashboard/insights")
+@login_required
+@conditional_on_data_version()
+def dashboard_insights():
+    """Habits tab: spending insights shown in the Insights modal
+
+    Query parameters: month (YYYY-MM, defaults to the user's latest month
+    with spending) and period, one of month, 3m, 6m or 12m (rolling
+    windows ending with month) or yoy (month compared to a year earlier)
+    """
+    # analytics stack is only loaded on first use
+    from scripts.extract_habit import Insights
+
+    period = request.args.get("period", "month")
+    if period not in INSIGHTS_PERIODS:
+        abort(400)
+    try:
+        month = datetime.strptime(request.args["month"], "%Y-%m").date() \
+            if "month" in request.args else \
+            habit_aggregates.latest_month(current_user.id) or today()
+    except ValueError:
+        abort(400)
+    months = INSIGHTS_PERIODS[period]
+    beginning_month = habit_aggregates.add_months(
+        habit_aggregates.month_start(month), 1 - months)
+
+    # Retrieve spending habits for Insights
     insights_list = []
     thresholds = [8, 6, 2]
     for ind, habit_name in enumerate(['coffee', 'lunch', 'transportation']):
-        insights = Insights(user_id, beginning_month, categories_file,
-                            habit_name, thresholds[ind])
-        if insights.transactions is not None:
+        insights = Insights(current_user.id, beginning_month, habit_name,
+                            thresholds[ind], months)
+        if insights.summary is not None:
+            if period == "yoy":
+                insights.compare_year_over_year()
             insights_list.append(insights)
 
-    # coin transaction history
-    coin_log = classes.Coin.query.filter_by(user=current_user).order_by(
-        classes.Coin.id.desc()).limit(6).all()
-
-    return render_template("dashboard.html",
-                           user=current_user,
-                           coin_log=coin_log,
-                           lottery_status=lottery_status,
-                           available_lottery_records=available_lottery_records,
-                           bought_lottery_records=bought_lottery_records,
-                           plaid_public_key=client.public_key,
-                           plaid_environment=client.environment,
-                           plaid_products=ENV_VARS.get("PLAID_PRODUCTS",
-                                                       "transactions"),
-                           plaid_country_codes=ENV_VARS.
-                           get("PLAID_COUNTRY_CODES", "US"),
-                           source_bar=savings_bar_plot,
-                           source_pie=saving_percent_plot,
-                           num_suggestions=current_user.saving_suggestions,
-                           num_saved=num_saved,
-                           total_saving_coins=total_saving_coins,
-                           insights=insights_list,
-                           saving_percent=saving_percent
-                           )
-
-
-@application.route('/find_insights')
+    return jsonify(html=render_template("dashboard/insights.html",
+                                        insights=insights_list),
+                   period=period,
+                   month=beginning_month.isoformat(),
+                   insights=[dict(habit_name=insight.habit_name,
+                                  num=insight.num,
+                                  tot_amount=insight.tot_amount,
+                                  avg_amount=insight.avg_amount,
+                                  med_amount=insight.med_amount,
+                                  std_amount=insight.std_amount,
+                                  recommended=insight.recommended,
+                                  yearly_saving=insight.yearly_saving,
+                                  previous_tot_amount=(
+                                      insight.previous.tot_amount
+                                      if insight.previous else None))
+                             for insight in insights_list])
+
+
+@main.route("/dashboard/habits")
+@login_required
+@conditional_on_data_version()
+def dashboard_habits():
+    """Habits tab: the user's habits"""
+    habits = classes.Habits.query.filter_by(user_id=current_user.id).all()
+    return jsonify(html=render_template("dashboard/habits.html",
+                                        user=current_user,
+                                        habits=habits),
+                   habits=[dict(id=habit.id,
+                                habit_name=habit.habit_name,
+                                habit_category=habit.habit_category,
+                                time_hour=habit.time_hour,
+                                time_minute=habit.time_minute,
+                                time_day_of_week=habit.time_day_of_week)
+                           for habit in habits])
+
+
+@main.route("/dashboard/lottery")
+@login_required
+@conditional_on_data_version(extra=available_lottery_entries)
+def dashboard_lottery():
+    """Lottery tab: available lotteries and the ones the user bought"""
+    # get the lottery that the user has bought, with their lottery's
+    # total_entries for the odds
+    bought_lottery_records = classes.UserLotteryLog.query.filter_by(
+        user=current_user).options(
+        joinedload(classes.UserLotteryLog.lottery)).all()
+
+    # get all the available lottery records, shared by every user
+    available_lottery_records = active_lotteries()
+
+    return jsonify(
+        html=render_template(
+            "dashboard/lottery.html",
+            user=current_user,
+            available_lottery_records=available_lottery_records,
+            bought_lottery_records=bought_lottery_records),
+        available=[dict(id=lottery.id,
+                        lottery_name=lottery.lottery_name,
+                        category=lottery.category,
+                        end_date=lottery.end_date.isoformat(),
+                        cost=lottery.cost)
+                   for lottery in available_lottery_records],
+        bought=[dict(lottery_id=record.lottery_id,
+                     lottery_name=record.lottery.lottery_name,
+                     category=record.lottery.category,
+                     entries=record.entries,
+                     odds=record.odds,
+                     winner_user_id=record.lottery.winner_user_id)
+                for record in bought_lottery_records])
+
+
+@main.route("/dashboard/account")
+@login_required
+@conditional_on_data_version()
+def dashboard_account():
+    """Account tab: the user's linked accounts"""
+    accounts = classes.Accounts.query.filter_by(user_id=current_user.id).all()
+    return jsonify(html=render_template("dashboard/account.html",
+                                        accounts=accounts),
+                   accounts=[dict(id=account.id,
+                                  account_name=account.account_name,
+                                  account_type=account.account_type,
+                                  account_subtype=account.account_subtype)
+                             for account in accounts])
+
+
+@main.route('/find_insights')
 @login_required
 def find_insights():
-    """Find spending insights in the month of October"""
-    # time.sleep(3)
-    insights_start_date = '2019-10-01'
-    insights_end_date = '2019-11-01'
-    df = pd.DataFrame([t.__dict__ for t in current_user.transaction])
-    df.to_csv('test.csv')
-    return df.to_markdown()
+    """Moved to the streaming transaction export"""
+    return redirect(url_for("api.export_transactions", **request.args))
 
 
-@application.route("/logout")
+@main.route("/logout")
 def logout():
     """Logout page"""
     logout_user()
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
+
 
+@main.route("/pool_stats")
+def pool_stats():
+    """Connection pool checkout and wait statistics of this worker, for
+    requests authorized with the PROFILE_TOKEN as a bearer token"""
+    if not profiler.authorized():
+        # the engine urls name the database hosts
+        abort(404)
+    return jsonify(db.pool_stats())
 
-@application.route("/delete_plaid_account", methods=["POST"])
+
+@main.route("/delete_plaid_account", methods=["POST"])
 def delete_plaid_account():
     """Delete user's linked plaid account from db"""
     account_id = request.form['accountId']
     # get account
     account = classes.Accounts.query.get(account_id)
-    # get transactions associated with account
-    transactions = classes.Transaction.query.\
-        filter_by(account_id=account.id)
+    # bulk delete transactions associated with account
+    plaid_to_db.delete_transactions(account.id)
 
     accounts_with_plaid_id = classes.Accounts.query.\
         filter_by(plaid_id=account.plaid_id)\
         .count()
-    # if only account associated with plaid id delete plaid id
+    # if only account associated with plaid id delete plaid id, the item
+    # itself is removed from plaid in the background
+    access_token = None
     if accounts_with_plaid_id == 1:
         plaid_item = classes.PlaidItems.query.get(account.plaid_id)
-        Item(client).remove(plaid_item.access_token)
+        access_token = plaid_item.access_token
         db.session.delete(plaid_item)
 
-    for transaction in transactions:
-        db.session.delete(transaction)
+    account.user.bump_data_version()
     db.session.delete(account)
     db.session.commit()
+    # only once the item is gone from the db, a failed commit keeps it
+    # working
+    if access_token is not None:
+        jobs.submit(remove_item, client, access_token)
 
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 
-@application.errorhandler(401)
+@main.app_errorhandler(401)
 def re_route(e):
     """Error handler - 401"""
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
 
 
-@application.errorhandler(403)
+@main.app_errorhandler(403)
 def re_route(e):
     """Error handler - 403"""
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
 
-@application.errorhandler(404)
+@main.app_errorhandler(404)
 def re_route(e):
     """Error handler - 404"""
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
 
-@application.errorhandler(500)
+@main.app_errorhandler(500)
 def re_route(e):
     """Error handler - 500"""
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
 
-@application.route("/access_plaid_token", methods=["POST", "GET"])
+@main.route("/access_plaid_token", methods=["POST", "GET"])
 def access_plaid_token():
     """Access user's plaid token to link bank account"""
     try:
@@ -402,13 +557,15 @@ def access_plaid_token():
                  'subtype': request.form[f'accounts[{idx}][subtype]']}
             )
 
-        existing_account_ids = [account_id for account in current_user.accounts
-                                for account_id in account.account_plaid_id]
+        existing_account_ids = set(
+            account_id for account_id, in db.session.query(
+                classes.Accounts.account_plaid_id)
+            .filter_by(user_id=current_user.id))
 
         for new_account in accounts:
             if new_account['account_id'] in existing_account_ids:
                 flash("You have already added the account selected")
-                redirect(url_for("dashboard"))
+                return redirect(url_for("main.dashboard"))
 
         response = token_exchange(client, public_token)
         item_id = response['item_id']
@@ -422,10 +579,11 @@ def access_plaid_token():
 
         plaid_to_db.add_accounts(accounts, current_user, plaid)
 
-        for account in current_user.accounts:
+        # only the accounts just linked, the others are already imported
+        for account in plaid.accounts:
             transactions = get_transactions(
                 client, '2019-10-01', '2019-11-01',
-                access_token=account.plaid_item.access_token,
+                access_token=access_token,
                 account_id=account.account_plaid_id)
             plaid_to_db.add_transactions(transactions, current_user, account)
 
@@ -434,85 +592,66 @@ def access_plaid_token():
         print(outstring)
         return outstring
 
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard"))
 
 
-@application.route("/send_message", methods=['GET', 'POST'])
+@main.route("/send_message", methods=['GET', 'POST'])
 def send_message():
-    """send message to user's phone number based on habit time"""
-    dow_dict = {'weekday': [0, 1, 2, 3, 4],
-                'weekend': [5, 6],
-                'everyday': [0, 1, 2, 3, 4, 5, 6]}
-
-    habits = classes.Habits.query.all()
-
-    for habit in habits:
-        pst = pytz.timezone("America/Los_Angeles")
-        now = datetime.now().astimezone(pst)
-        if now.weekday() in dow_dict[habit.time_day_of_week] and \
-                habit.time_minute == now.minute and \
-                habit.time_hour == now.hour:
-            habit.user.saving_suggestions += 1  # add 1 user saving suggestion
-            body = f"Would you like to save $5 on {habit.habit_category} " + \
-                   "today? Respond Y/N"
-            twilio_client.messages.create(
-                body=body,
-                to=habit.user.phone,
-                from_="+16462573594")
-    db.session.commit()
+    """send message to user's phone number based on habit time
+
+    Reminders and draws are sent by `flask scheduler`, this per-minute
+    tick is kept for running without the scheduler.
+    """
+    dispatch_due()
 
     # lottery drawing and send message to the winner
     lottery_drawing()
 
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
 
-@application.route("/receive_message", methods=["POST"])
+@main.route("/receive_message", methods=["POST"])
 def receive_message():
-    """Receive user's reply to habit messages and add saving coins"""
-    dow_dict = {'weekday': [0, 1, 2, 3, 4],
-                'weekend': [5, 6],
-                'everyday': [0, 1, 2, 3, 4, 5, 6]}
-
-    pst = pytz.timezone("America/Los_Angeles")
-    now = datetime.now().astimezone(pst)
-    date = now.date()
+    """Receive user's reply to habit messages and add saving coins
 
+    The reply answers the user's last reminder: Y or N, or the numbers of
+    the habits saved on when it listed several.
+    """
     number = str(request.form['From'])[2:]
     response = request.form['Body']
     user_by_num = classes.User.query.filter_by(phone=number).first()
     name = user_by_num.first_name
 
-    user_habits_num = len([habit for habit in user_by_num.habits
-                           if now.weekday() in
-                           dow_dict[habit.time_day_of_week]])
+    habits = last_reminder(user_by_num)
+    saved = set(habit_id for habit_id, in db.session.query(
+        classes.Coin.habit_id).filter_by(
+        user_id=user_by_num.id, log_date=user_by_num.today(),
+        description="saving"))
 
-    save_num = len([save for save in user_by_num.coin
-                    if save.log_date == date and save.description == "saving"])
-
-    if save_num >= user_habits_num:
-        resp = MessagingResponse()
+    resp = MessagingResponse()
+    if all(habit.id in saved for habit in habits):
         res_str_1 = f"Oops, I don't understand!"
         resp.message(res_str_1)
         return str(resp)
 
-    else:
-        if response.lower() == "y":
-            add_saving_coin(user_by_num)
-            resp = MessagingResponse()
-            res_str_1 = f"Hi {name}, you save some money today! Hoorey!"
-            resp.message(res_str_1)
-            return str(resp)
-
-        elif response.lower() == "n":
-            resp = MessagingResponse()
-            res_str_1 = f"Hi {name}, we understand, maybe next time!"
-            resp.message(res_str_1)
-            return str(resp)
-
-        else:
-            resp = MessagingResponse()
+    chosen = parse_reply(response, len(habits))
+    if chosen is None:
+        if len(habits) == 1:
             res_str = f"Hi {name}, that's not a valid response, " + \
                       "please respond Y/N "
-            resp.message(res_str)
-            return str(resp)
+        else:
+            res_str = f"Hi {name}, that's not a valid response, please " + \
+                      "respond with the numbers you save on, Y or N"
+        resp.message(res_str)
+    elif chosen:
+        for habit_number in chosen:
+            habit = habits[habit_number - 1]
+            if habit.id not in saved:
+                add_saving_coin(user_by_num, habit, commit=False)
+        db.session.commit()
+        res_str_1 = f"Hi {name}, you save some money today! Hoorey!"
+        resp.message(res_str_1)
+    else:
+        res_str_1 = f"Hi {name}, we understand, maybe next time!"
+        resp.message(res_str_1)
+    return str(resp)
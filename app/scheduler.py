@@ -0,0 +1,309 @@
+"""
+Reminder scheduler, run as a long-running process with `flask scheduler`.
+
+Every habit stores the UTC time of its next reminder in next_fire_at,
+computed from its user's time zone. Due reminders are the indexed
+`next_fire_at <= now` rows; the due habits of a user are sent in one
+numbered text and their next_fire_at advanced in the same transaction,
+or advanced without a text when sending fails. Replies are matched to
+the habits of the user's last text by reminded_at. Undrawn lotteries are
+kept in an in-memory heap ordered by their end (UTC) and drawn when it
+passes, a failed draw again DRAW_RETRY later. The process sleeps until
+the earliest reminder or draw, waking at least every POLL_SECONDS to pick
+up edited habits and new lotteries.
+"""
+
+import heapq
+import itertools
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+
+from app import classes, db, sms
+from scripts.coin_transaction import draw_lottery
+
+logger = logging.getLogger(__name__)
+
+DAYS_OF_WEEK = {'weekday': [0, 1, 2, 3, 4],
+                'weekend': [5, 6],
+                'everyday': [0, 1, 2, 3, 4, 5, 6]}
+# longest sleep between two looks at the database, in seconds
+POLL_SECONDS = 5
+# reminders more than this late (e.g. after a restart) are skipped
+MAX_LATENESS = timedelta(minutes=5)
+# a draw that failed, e.g. on a database or twilio error, is retried
+# after this long
+DRAW_RETRY = timedelta(minutes=1)
+
+
+def utcnow():
+    """Return the current time in UTC"""
+    return datetime.now(pytz.utc)
+
+
+def next_fire_at(habit, after, tz=classes.TZ):
+    """
+    Return the first time after `after` the habit's reminder is due
+    :param habit: Habits object
+    :param after: time zone aware datetime
+    :param tz: time zone of the habit's time_hour and time_minute
+    :return: time zone aware datetime in UTC, None if the habit never fires
+    """
+    local = after.astimezone(tz)
+    for days in range(8):
+        day = local.date() + timedelta(days=days)
+        if day.weekday() not in DAYS_OF_WEEK.get(habit.time_day_of_week, []):
+            continue
+        fire_at = tz.normalize(tz.localize(datetime(
+            day.year, day.month, day.day, int(habit.time_hour),
+            int(habit.time_minute))))
+        if fire_at > after:
+            return fire_at.astimezone(pytz.utc)
+    return None
+
+
+def lottery_fire_at(lottery, tz=classes.TZ):
+    """Return the end of a lottery in UTC, end_date is in the app's time
+    zone"""
+    return tz.localize(lottery.end_date).astimezone(pytz.utc)
+
+
+def to_db(moment):
+    """Return a time zone aware datetime as the naive UTC stored in the
+    database"""
+    return moment.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def schedule(habit, tz, after=None):
+    """
+    Set a habit's next_fire_at to its first reminder after a time, the
+    caller commits
+    :param habit: Habits object
+    :param tz: time zone of the habit's user
+    :param after: time zone aware datetime, now by default
+    """
+    fire_at = next_fire_at(habit, after or utcnow(), tz)
+    habit.next_fire_at = to_db(fire_at) if fire_at is not None else None
+
+
+def reschedule_user(user):
+    """Recompute the reminders of a user, e.g. after a time zone change,
+    the caller commits"""
+    for habit in user.habits:
+        schedule(habit, user.tz)
+
+
+def reminder_body(habits):
+    """Return the text reminding of habits, numbered when there are
+    several"""
+    if len(habits) == 1:
+        return f"Would you like to save $5 on {habits[0].habit_category} " \
+               "today? Respond Y/N"
+    options = " ".join(f"{number}. {habit.habit_category} "
+                       f"({habit.habit_name})"
+                       for number, habit in enumerate(habits, 1))
+    return f"Would you like to save $5 today on {options}? Respond with " \
+           "the numbers you save on (e.g. 1 2), Y for all or N"
+
+
+def send_reminder(user, habits, now):
+    """
+    Text the saving suggestions of a user's due habits in one message, the
+    caller commits
+    :param habits: the habits, in the order of their numbers
+    :param now: time of the reminder, replies are matched to it
+    """
+    for habit in habits:
+        habit.reminded_at = to_db(now)
+    user.saving_suggestions += len(habits)  # one suggestion per habit
+    user.bump_data_version()
+    sms.send(user.phone, reminder_body(habits))
+
+
+def last_reminder(user):
+    """
+    Return the habits of the user's last reminder if it was sent today, in
+    the order of their numbers
+    """
+    reminded = [habit for habit in user.habits
+                if habit.reminded_at is not None]
+    if not reminded:
+        return []
+    reminded_at = max(habit.reminded_at for habit in reminded)
+    if pytz.utc.localize(reminded_at).astimezone(user.tz).date() != \
+            user.today():
+        return []
+    return sorted((habit for habit in reminded
+                   if habit.reminded_at == reminded_at),
+                  key=lambda habit: habit.id)
+
+
+def parse_reply(body, count):
+    """
+    Parse a reply to a reminder of count habits
+    :return: sorted numbers of the habits saved on, all of them for Y and
+    none for N, None when the reply is not valid
+    """
+    words = re.split(r"[\s,.]+", body.strip().lower())
+    if words == ["y"]:
+        return list(range(1, count + 1))
+    if words == ["n"]:
+        return []
+    if all(word.isdigit() and 1 <= int(word) <= count for word in words):
+        return sorted(set(int(word) for word in words))
+    return None
+
+
+def dispatch_due(now=None):
+    """
+    Send every due reminder and advance its next_fire_at, the habits of a
+    user due together are sent in one text
+    :param now: time zone aware datetime, now by default
+    :return: number of habits reminded
+    """
+    now = now or utcnow()
+    due = db.session.query(classes.Habits.user_id, classes.Habits.id) \
+        .filter(classes.Habits.next_fire_at <= to_db(now)) \
+        .order_by(classes.Habits.user_id, classes.Habits.id).all()
+    sent = 0
+    for user_id, rows in itertools.groupby(due, key=lambda row: row[0]):
+        habit_ids = [row[1] for row in rows]
+        try:
+            habits = lock_due(habit_ids, now)
+            if not habits:
+                continue
+            user = habits[0].user
+            on_time = []
+            for habit in habits:
+                fire_at = pytz.utc.localize(habit.next_fire_at)
+                schedule(habit, user.tz, now)
+                if now - fire_at > MAX_LATENESS:
+                    logger.warning("Skipped reminder of habit %s due at %s",
+                                   habit.id, fire_at)
+                else:
+                    on_time.append(habit)
+            if on_time:
+                send_reminder(user, on_time, now)
+                sent += len(on_time)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Failed to send reminders of user %s", user_id)
+            # the rollback restored next_fire_at, a failed send is skipped
+            # rather than retried every tick
+            skip_due(habit_ids, now)
+    return sent
+
+
+def lock_due(habit_ids, now):
+    """Lock and return the habits of habit_ids still due, another
+    dispatcher may be sending them"""
+    return classes.Habits.query \
+        .filter(classes.Habits.id.in_(habit_ids),
+                classes.Habits.next_fire_at <= to_db(now)) \
+        .order_by(classes.Habits.id) \
+        .with_for_update(skip_locked=True).all()
+
+
+def skip_due(habit_ids, now):
+    """Advance the next_fire_at of the habits of habit_ids still due,
+    without reminding them"""
+    try:
+        for habit in lock_due(habit_ids, now):
+            schedule(habit, habit.user.tz, now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Failed to skip reminders %s", habit_ids)
+
+
+class Scheduler:
+    """
+    Dispatcher of due reminders and heap of lottery draws
+
+    """
+
+    def __init__(self, clock=utcnow, poll_seconds=POLL_SECONDS):
+        """
+
+        :param clock: function returning the current time in UTC
+        :param poll_seconds: longest sleep between looks at the database
+        """
+        self.clock = clock
+        self.poll_seconds = poll_seconds
+        # (end in UTC, lottery id) of undrawn lotteries
+        self.heap = []
+        self.last_lottery_id = 0
+        self.stopped = threading.Event()
+
+    def load_lotteries(self):
+        """Schedule the draws of lotteries created since the last call"""
+        last_lottery_id = db.session.query(
+            db.func.max(classes.Lottery.id)).scalar() or 0
+        lotteries = classes.Lottery.query.filter(
+            classes.Lottery.id > self.last_lottery_id,
+            classes.Lottery.id <= last_lottery_id,
+            classes.Lottery.winner_user_id.is_(None))
+        for lottery in lotteries:
+            heapq.heappush(self.heap, (lottery_fire_at(lottery), lottery.id))
+        self.last_lottery_id = last_lottery_id
+
+    def run_due(self):
+        """Send the due reminders and draw the ended lotteries, return
+        how many"""
+        now = self.clock()
+        fired = dispatch_due(now)
+        while self.heap and self.heap[0][0] <= now:
+            _, lottery_id = heapq.heappop(self.heap)
+            try:
+                fired += self.fire_lottery(lottery_id, now)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Failed to draw lottery %s", lottery_id)
+                # load_lotteries only loads new lotteries, keep it
+                heapq.heappush(self.heap, (now + DRAW_RETRY, lottery_id))
+        return fired
+
+    def fire_lottery(self, lottery_id, now):
+        """Draw a lottery that has ended"""
+        lottery = classes.Lottery.query.get(lottery_id)
+        if lottery is None or lottery.winner_user_id is not None:
+            return 0
+        fire_at = lottery_fire_at(lottery)
+        if fire_at > now:
+            # the end_date was moved back
+            heapq.heappush(self.heap, (fire_at, lottery_id))
+            return 0
+        draw_lottery(lottery)
+        return 1
+
+    def wait_seconds(self):
+        """Return how long to sleep before the next reminder, draw or look
+        at the database"""
+        now = self.clock()
+        wait = self.poll_seconds
+        next_reminder = db.session.query(
+            db.func.min(classes.Habits.next_fire_at)).scalar()
+        if next_reminder is not None:
+            wait = min(wait, (pytz.utc.localize(next_reminder) - now)
+                       .total_seconds())
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(wait, 0)
+
+    def run(self):
+        """Send reminders and draw lotteries until stop() is called"""
+        while not self.stopped.is_set():
+            self.load_lotteries()
+            self.run_due()
+            wait = self.wait_seconds()
+            # never hold a connection or transaction while sleeping
+            db.session.remove()
+            self.stopped.wait(wait)
+
+    def stop(self):
+        self.stopped.set()
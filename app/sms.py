@@ -0,0 +1,337 @@
+"""
+Outbound text messages.
+
+Every text the app sends (habit reminders, lottery results) goes through
+send(), so the twilio client and sender numbers live in one place.
+
+Texts are shaped to the provider's throughput: each number of the
+SMS_SENDERS pool has a token bucket of SMS_RATE_PER_SENDER messages per
+second, a message waits for a token of the least busy number, and the
+messages waiting in a process are served by lane, REMINDER before LOTTERY.
+A 429 from the provider halves the rate of the number and pauses it
+(Retry-After when given), the message is retried up to SMS_MAX_RETRIES
+times and the rate recovers with each message sent.
+
+The buckets are kept in the sms_sender table, so the web workers and the
+`flask scheduler` process share each number's rate. With
+SMS_SHARED_BUCKETS off they are kept in the process, for running in one.
+Phone verifications are sent by Twilio Verify from its own numbers and do
+not go through here.
+"""
+
+import contextlib
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import twilio.rest
+from flask import current_app
+from sqlalchemy import exc
+
+from app import classes, db
+from app.metrics import SMS_QUEUE_SECONDS, SMS_RATE_LIMITED, external_call
+
+SENDER = "+16462573594"
+# lanes, lower goes first
+REMINDER, LOTTERY = 0, 1
+LANES = {REMINDER: "reminder", LOTTERY: "lottery"}
+# Twilio sends 1 message per second from a long code
+RATE_PER_SENDER = 1.0
+BURST = 1
+MAX_RETRIES = 3
+# pause of a number after its first 429 without Retry-After, doubled on
+# each consecutive one
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+# a 429 never slows a number below this fraction of its rate
+MIN_RATE_FRACTION = 1 / 16
+_client = None
+
+
+def client():
+    """Return the twilio client, created on first use"""
+    global _client
+    if _client is None:
+        _client = twilio.rest.Client(os.environ["TWILIO_ACCOUNT_SID"],
+                                     os.environ["TWILIO_AUTH_TOKEN"])
+    return _client
+
+
+def twilio_transport(sender, to, body):
+    """Send a text message from sender with twilio"""
+    with external_call("twilio", "messages_create"):
+        return client().messages.create(body=body, to=to, from_=sender)
+
+
+class RateLimited(Exception):
+    """The provider refused a message for going over its rate limit"""
+
+    def __init__(self, retry_after=None):
+        super(RateLimited, self).__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def is_rate_limited(error):
+    """Return whether error is RateLimited or has status 429, as twilio's
+    TwilioRestException"""
+    return isinstance(error, RateLimited) or \
+        getattr(error, "status", None) == 429
+
+
+class TokenBucket(object):
+    """Tokens refilled at rate per second up to burst, slowed down by 429s
+    and recovering with each success"""
+
+    def __init__(self, rate, burst, now):
+        self.max_rate = self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.blocked_until = now
+        self.failures = 0
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait(self, now):
+        """Return the seconds until a token is available"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.refill(now)
+        return max((1 - self.tokens) / self.rate, 0)
+
+    def take(self):
+        self.tokens -= 1
+
+    def throttled(self, now, retry_after=None):
+        """
+        Halve the rate and pause after a 429
+        :param retry_after: seconds to pause, backs off exponentially when
+        None
+        """
+        self.failures += 1
+        self.rate = max(self.rate / 2, self.max_rate * MIN_RATE_FRACTION)
+        if retry_after is None:
+            retry_after = min(BACKOFF_SECONDS * 2 ** (self.failures - 1),
+                              MAX_BACKOFF_SECONDS)
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        # one token when the pause ends, none accrue before
+        self.tokens = 1
+        self.updated = self.blocked_until
+
+    def succeeded(self):
+        """Recover a tenth of the rate"""
+        self.failures = 0
+        self.rate = min(self.rate + self.max_rate / 10, self.max_rate)
+
+
+class LocalBuckets(object):
+    """Token buckets of the senders kept in the process"""
+
+    def __init__(self, senders, rate, burst, now):
+        self.senders = list(senders)
+        self.buckets = {sender: TokenBucket(rate, burst, now)
+                        for sender in senders}
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Yield the buckets by sender, the shaper serializes their use"""
+        yield self.buckets
+
+
+class DatabaseBuckets(object):
+    """Token buckets of the senders in the sms_sender table, shared by the
+    processes sending texts; their times are time.time()"""
+
+    def __init__(self, engine, senders, rate, burst):
+        self.engine = engine
+        self.senders = list(senders)
+        self.rate = rate
+        self.burst = burst
+        self.created = False
+
+    def create(self):
+        """Add the rows of the senders missing from the table"""
+        table = classes.SmsSender.__table__
+        try:
+            with self.engine.begin() as connection:
+                known = {row.sender for row in connection.execute(
+                    table.select().where(table.c.sender.in_(self.senders)))}
+                now = time.time()
+                missing = [dict(sender=sender, tokens=self.burst,
+                                updated=now, rate=self.rate,
+                                blocked_until=now, failures=0)
+                           for sender in self.senders if sender not in known]
+                if missing:
+                    connection.execute(table.insert(), missing)
+        except exc.IntegrityError:
+            # another process added them first
+            pass
+        self.created = True
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Yield the buckets by sender, their rows are locked until they are
+        written back, in a transaction of their own committed before the
+        text is sent
+        """
+        if not self.created:
+            self.create()
+        table = classes.SmsSender.__table__
+        with self.engine.begin() as connection:
+            buckets = {}
+            for row in connection.execute(
+                    table.select().where(table.c.sender.in_(self.senders))
+                    .with_for_update()):
+                bucket = TokenBucket(self.rate, self.burst, row.updated)
+                # SMS_RATE_PER_SENDER or SMS_BURST may have been lowered
+                bucket.rate = min(row.rate, self.rate)
+                bucket.tokens = min(row.tokens, self.burst)
+                bucket.blocked_until = row.blocked_until
+                bucket.failures = row.failures
+                buckets[row.sender] = bucket
+            known = set(buckets)
+            # rows removed since they were added
+            for sender in self.senders:
+                if sender not in known:
+                    buckets[sender] = TokenBucket(self.rate, self.burst,
+                                                  time.time())
+            yield buckets
+            for sender, bucket in buckets.items():
+                values = dict(tokens=bucket.tokens, updated=bucket.updated,
+                              rate=bucket.rate,
+                              blocked_until=bucket.blocked_until,
+                              failures=bucket.failures)
+                if sender in known:
+                    connection.execute(table.update().where(
+                        table.c.sender == sender).values(values))
+                else:
+                    connection.execute(table.insert().values(
+                        sender=sender, **values))
+
+
+class RateShaper(object):
+    """Token buckets of a pool of sender numbers, served by lane"""
+
+    def __init__(self, senders, transport, rate=RATE_PER_SENDER,
+                 burst=BURST, max_retries=MAX_RETRIES, clock=time.monotonic,
+                 store=None):
+        """
+
+        :param senders: list of sender numbers
+        :param transport: function(sender, to, body) sending a message,
+        raising RateLimited (or an error with status 429) when throttled
+        :param rate: messages per second of each sender
+        :param burst: messages a sender may send at once after idling
+        :param max_retries: retries of a throttled message
+        :param clock: function returning the time in seconds, time.time
+        for a DatabaseBuckets store
+        :param store: buckets of the senders, LocalBuckets by default
+        """
+        self.clock = clock
+        self.store = store or LocalBuckets(senders, rate, burst, clock())
+        self.transport = transport
+        self.max_retries = max_retries
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._tickets = itertools.count()
+
+    def waiting(self):
+        """Return the number of messages waiting for a token"""
+        with self._condition:
+            return len(self._waiting)
+
+    def acquire(self, lane=REMINDER):
+        """
+        Wait for a token, the first waiting message of the lowest lane is
+        served first
+        :return: the sender number the token is from
+        """
+        start = self.clock()
+        with self._condition:
+            ticket = (lane, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._condition.wait()
+                        continue
+                    with self.store.locked() as buckets:
+                        now = self.clock()
+                        wait, _, sender = min(
+                            (bucket.wait(now), -bucket.tokens, sender)
+                            for sender, bucket in buckets.items())
+                        if wait <= 0:
+                            buckets[sender].take()
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+        SMS_QUEUE_SECONDS.observe(self.clock() - start, lane=LANES[lane])
+        return sender
+
+    def call(self, function, lane=REMINDER):
+        """
+        Call function(sender) with a token, retrying it when throttled
+        :return: what function returns
+        """
+        for attempt in itertools.count():
+            sender = self.acquire(lane)
+            try:
+                result = function(sender)
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                SMS_RATE_LIMITED.inc(sender=sender)
+                with self._condition:
+                    with self.store.locked() as buckets:
+                        buckets[sender].throttled(
+                            self.clock(), getattr(e, "retry_after", None))
+                    self._condition.notify_all()
+                if attempt >= self.max_retries:
+                    raise
+                continue
+            with self._condition, self.store.locked() as buckets:
+                buckets[sender].succeeded()
+            return result
+
+    def send(self, to, body, lane=REMINDER):
+        """Send a text message when a sender has a token"""
+        return self.call(lambda sender: self.transport(sender, to, body),
+                         lane)
+
+
+def shaper():
+    """Return the app's rate shaper, created on first use from its
+    SMS_ config"""
+    extensions = current_app.extensions
+    if "sms" not in extensions:
+        config = current_app.config
+        senders = config.get("SMS_SENDERS") or [SENDER]
+        rate = config.get("SMS_RATE_PER_SENDER", RATE_PER_SENDER)
+        burst = config.get("SMS_BURST", BURST)
+        if config.get("SMS_SHARED_BUCKETS", True):
+            store = DatabaseBuckets(db.engine, senders, rate, burst)
+            clock = time.time
+        else:
+            store = None
+            clock = time.monotonic
+        extensions["sms"] = RateShaper(
+            senders, twilio_transport, rate=rate, burst=burst,
+            max_retries=config.get("SMS_MAX_RETRIES", MAX_RETRIES),
+            clock=clock, store=store)
+    return extensions["sms"]
+
+
+def send(to, body, lane=REMINDER):
+    """Send a text message to the phone number to"""
+    return shaper().send(to, body, lane)
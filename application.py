@@ -1,6 +1,8 @@
-from app import application
+from app import create_app
 from dotenv import load_dotenv, find_dotenv
 
 ENV_FILE = find_dotenv()
 if ENV_FILE:
     load_dotenv(ENV_FILE)
+
+application = create_app()
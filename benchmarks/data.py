@@ -0,0 +1,125 @@
+"""
+Synthetic data for the benchmarks.
+
+scratch_app creates the app on a scratch sqlite database and transaction
+cache directory, the seed functions bulk insert users, habits, lottery
+entries and transactions into it with the generator of `flask seed-db`
+(scripts/seed_db.py). Every generator is seeded, so two runs at the same
+scale benchmark the same data.
+"""
+
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app import classes, create_app, db
+from config import Config
+from scripts import seed_db
+
+CATEGORY_IDS = ['13005043', '13005047', '13005000', '22016000', '19013000']
+START, END = date(2019, 1, 1), date(2020, 1, 1)
+# synthetic users' reminders are spread over the minutes of this day (UTC)
+REMINDER_DAY = datetime(2020, 1, 6)
+MINUTES_PER_DAY = 24 * 60
+
+
+@contextlib.contextmanager
+def scratch_app():
+    """Yield the app, in an app context, on an empty scratch database"""
+    scratch = tempfile.mkdtemp()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(scratch,
+                                                              'benchmark.db')
+        WTF_CSRF_ENABLED = False
+
+    application = create_app(BenchmarkConfig)
+    try:
+        with application.app_context():
+            db.create_all()
+            yield application
+            db.session.remove()
+    finally:
+        shutil.rmtree(scratch)
+
+
+def seed_users(count, minutes=MINUTES_PER_DAY):
+    """
+    Insert users with one everyday habit each, due at minutes spread over
+    REMINDER_DAY. The users are in UTC so next_fire_at is the reminder time
+    :param count: number of users
+    :param minutes: the reminders are spread over this many minutes from
+    midnight, the whole day by default
+    :return: id of the first user, users are numbered in order and the
+    phone number of a user is its zero padded id
+    """
+    first_id = seed_db.first_id(classes.User)
+    user_ids = first_id + np.arange(count)
+    seeder = seed_db.Seeder(start=REMINDER_DAY.date(), months=1)
+    seeder.users(user_ids, ['UTC'] * count, np.zeros(count, dtype=int),
+                 np.zeros(count, dtype=int))
+    habits = []
+    for i, user_id in enumerate(user_ids.tolist()):
+        minute = i % minutes
+        habits.append(dict(user_id=user_id, habit_name='latte',
+                           habit_category='Coffee',
+                           time_hour=minute // 60, time_minute=minute % 60,
+                           time_day_of_week='everyday',
+                           next_fire_at=str(REMINDER_DAY +
+                                            timedelta(minutes=minute))))
+    seed_db.insert(classes.Habits, habits)
+    db.session.commit()
+    return first_id
+
+
+def seed_lottery(user_ids):
+    """Insert an ended lottery with one entry of each user"""
+    user_ids = list(user_ids)
+    lottery = classes.Lottery(lottery_name='Bike', category='Sport', cost=10,
+                              start_date=datetime(2019, 12, 1),
+                              end_date=datetime(2019, 12, 31),
+                              total_entries=len(user_ids))
+    db.session.add(lottery)
+    db.session.flush()
+    seed_db.insert(classes.UserLotteryLog,
+                   [dict(user_id=user_id, lottery_id=lottery.id, entries=1)
+                    for user_id in user_ids])
+    seed_db.insert(classes.LotteryTicket,
+                   [dict(lottery_id=lottery.id, ticket_offset=i,
+                         user_id=user_id, entries=1)
+                    for i, user_id in enumerate(user_ids)])
+    db.session.commit()
+    return lottery
+
+
+def seed_transactions(user_id, count, account_id=None):
+    """Insert count synthetic transactions of the user for 2019, and their
+    habit aggregates"""
+    seeder = seed_db.Seeder(start=START, months=12)
+    seeder.transactions(np.array([user_id]),
+                        np.array([account_id], dtype=object),
+                        per_user=np.array([count]))
+    db.session.commit()
+
+
+def plaid_transactions(count, seed=0):
+    """Return random transactions as returned by the plaid api"""
+    generator = random.Random(seed)
+    days = (END - START).days
+    transactions = []
+    for _ in range(count):
+        day = str(START + timedelta(generator.randrange(days)))
+        transactions.append({
+            'date': day, 'authorized_date': day,
+            'amount': round(generator.uniform(1, 50), 2),
+            'category': ['Food and Drink', 'Restaurants'],
+            'category_id': generator.choice(CATEGORY_IDS),
+            'location': {'address': None, 'city': None, 'region': None,
+                         'country': None, 'postal_code': None,
+                         'lon': None, 'lat': None}})
+    return transactions
@@ -0,0 +1,99 @@
+"""
+Import-time benchmark for the WSGI entry point.
+
+Runs `python -X importtime -c "import application"` in a fresh
+interpreter and compares the cumulative import time against the budget
+recorded in import_budget.json. Modules listed as "lazy_modules" (the
+analytics and plotting stacks) must not be imported at all when a worker
+boots.
+
+Usage:
+python -m benchmarks.import_time [--runs N]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'import_budget.json')
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_budget(path=BUDGET_FILE):
+    """Return the recorded import budget"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_importtime(output):
+    """
+    Parse the stderr of `python -X importtime`
+    :param output: stderr of the interpreter (str)
+    :return: dictionary of module name to cumulative import time in us
+    """
+    cumulative = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def measure(module='application', runs=3):
+    """
+    Import module in fresh interpreters and keep the fastest run
+    :param module: name of the module to import
+    :param runs: number of interpreters to start
+    :return: tuple of (cumulative import time in ms, imported module names)
+    """
+    best_ms, imported = None, set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            cwd=ROOT_DIR, env=os.environ.copy(),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True)
+        cumulative = parse_importtime(result.stderr)
+        elapsed_ms = cumulative[module] / 1000
+        if best_ms is None or elapsed_ms < best_ms:
+            best_ms = elapsed_ms
+        imported = set(cumulative)
+    return best_ms, imported
+
+
+def check(budget, elapsed_ms, imported, timed=True):
+    """
+    Return a list of budget violations, empty if within budget
+    :param timed: whether to check the time, which depends on the host,
+    or only that the lazy modules are not imported
+    """
+    problems = []
+    if timed and elapsed_ms > budget['budget_ms']:
+        problems.append('import of {} took {:.0f}ms, budget is {}ms'.format(
+            budget['module'], elapsed_ms, budget['budget_ms']))
+    for name in budget['lazy_modules']:
+        if name in imported:
+            problems.append('{} is imported eagerly'.format(name))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    budget = load_budget()
+    elapsed_ms, imported = measure(budget['module'], args.runs)
+    problems = check(budget, elapsed_ms, imported)
+    print(json.dumps({'module': budget['module'],
+                      'elapsed_ms': round(elapsed_ms, 1),
+                      'budget_ms': budget['budget_ms'],
+                      'problems': problems}, indent=4))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""
+Load test of the app on a local server, without network.
+
+Serves the app on a scratch sqlite database (benchmarks/data.py) from a
+threaded local server, with Twilio and Plaid replaced by fakes that answer
+after a set latency, and replays phases of traffic from concurrent
+virtual users. The routes a phase mixes are:
+login - POST /login of a random user
+dashboard - GET /dashboard
+receive_message - a Twilio webhook answering a reminder Y or N
+send_message - a /send_message tick
+link_account - linking a bank account through /access_plaid_token
+
+A phase is one of the named MIXES or weights like
+"send_message=1,receive_message=20", run for --duration seconds. The
+default replays a morning: the reminder spike, the burst of replies, then
+browsing. The reminders of the users are spread over the first --spread
+minutes of REMINDER_DAY and the scheduler's clock runs --speed times faster
+than real time from the start of the first phase. Texts are shaped to
+--sms-rate per second from each of --senders numbers, as configured by
+SMS_SENDERS and SMS_RATE_PER_SENDER.
+
+Prints the requests, errors, throughput and latency percentiles of every
+route per phase as JSON, and the number of texts sent. sqlite has no row
+locks, so concurrent ticks can send a reminder twice, on Postgres
+dispatch_due sends each once.
+
+Usage:
+python -m benchmarks.load [--users 1000] [--workers 16] [--duration 10]
+                          [--mix spike --mix replies ...] [--spread 10]
+                          [--speed 60] [--senders 1] [--sms-rate 1]
+                          [--twilio-latency 0.1] [--plaid-latency 0.3]
+                          [--output FILE]
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytz
+import requests
+from werkzeug.serving import make_server
+
+from app import sms
+from benchmarks import data
+
+ROUTES = ['login', 'dashboard', 'receive_message', 'send_message',
+          'link_account']
+MIXES = {
+    # reminders go out while early users open the app
+    'spike': dict(send_message=1, dashboard=2),
+    # everyone answers their reminder
+    'replies': dict(receive_message=10, dashboard=1),
+    'browse': dict(login=1, dashboard=6, link_account=1),
+}
+DEFAULT_MIXES = ['spike', 'replies', 'browse']
+PERCENTILES = [50, 90, 95, 99]
+PASSWORD = 'password'
+# transactions the fake Plaid returns per account
+PAGE_SIZE = 100
+
+
+def parse_mix(spec):
+    """
+    Return the weights of a mix
+    :param spec: name of one of MIXES or weights like "login=1,dashboard=5"
+    :return: dictionary of route to weight
+    """
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    weights = {}
+    for part in spec.split(','):
+        route, _, weight = part.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError('unknown route {!r}, expected one of {}'.format(
+                route, ', '.join(ROUTES)))
+        weights[route] = float(weight) if weight else 1.0
+    return weights
+
+
+def percentile(timings, percent):
+    """Return the nearest-rank percentile of sorted timings"""
+    rank = max(int(round(percent / 100 * len(timings))), 1)
+    return timings[min(rank, len(timings)) - 1]
+
+
+def summarize(samples, seconds):
+    """
+    Summarize the samples of a phase
+    :param samples: list of (route, seconds, succeeded)
+    :param seconds: duration of the phase
+    :return: dictionary of route to its requests, errors, throughput and
+    latency percentiles in ms
+    """
+    report = {}
+    for route in ROUTES:
+        timings = sorted(elapsed * 1000 for name, elapsed, _ in samples
+                         if name == route)
+        if not timings:
+            continue
+        summary = dict(
+            requests=len(timings),
+            errors=sum(1 for name, _, succeeded in samples
+                       if name == route and not succeeded),
+            throughput_rps=round(len(timings) / seconds, 2))
+        for percent in PERCENTILES:
+            summary['p{}_ms'.format(percent)] = round(
+                percentile(timings, percent), 2)
+        summary['max_ms'] = round(timings[-1], 2)
+        report[route] = summary
+    return report
+
+
+class FakeTwilio(object):
+    """Twilio client answering after latency seconds and counting texts"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = itertools.count()
+        self.messages = self
+
+    def create(self, body, to, from_):
+        time.sleep(self.latency)
+        return mock.Mock(sid='SM{:032d}'.format(next(self.sent)))
+
+
+class FakePlaid(object):
+    """Plaid methods of app.routes answering after latency seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.items = itertools.count()
+
+    def token_exchange(self, client, public_token):
+        time.sleep(self.latency)
+        item = next(self.items)
+        return {'item_id': 'item-{}'.format(item),
+                'access_token': 'access-{}'.format(item)}
+
+    def get_transactions(self, client, start_date, end_date, access_token,
+                         account_id):
+        time.sleep(self.latency)
+        return data.plaid_transactions(PAGE_SIZE)
+
+    def remove_item(self, client, access_token):
+        time.sleep(self.latency)
+        return {'removed': True}
+
+
+class SimulatedClock(object):
+    """UTC clock starting at start and running speed times real time"""
+
+    def __init__(self, start, speed):
+        self.start = pytz.utc.localize(start)
+        self.speed = speed
+        self.started = time.perf_counter()
+
+    def __call__(self):
+        elapsed = (time.perf_counter() - self.started) * self.speed
+        return self.start + timedelta(seconds=elapsed)
+
+
+@contextlib.contextmanager
+def fakes(twilio_latency, plaid_latency, clock):
+    """Replace Twilio, Plaid and the scheduler's clock"""
+    twilio, plaid = FakeTwilio(twilio_latency), FakePlaid(plaid_latency)
+    with mock.patch('app.sms.client', return_value=twilio), \
+            mock.patch('app.routes.twilio_client', twilio), \
+            mock.patch('app.routes.token_exchange', plaid.token_exchange), \
+            mock.patch('app.routes.get_transactions',
+                       plaid.get_transactions), \
+            mock.patch('app.routes.remove_item', plaid.remove_item), \
+            mock.patch('app.scheduler.utcnow', clock):
+        yield twilio
+
+
+@contextlib.contextmanager
+def local_server(application):
+    """Serve the app from a thread, yield its url"""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, application, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_port)
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+class VirtualUser(object):
+    """One user of the app, with their own session cookie"""
+
+    # numbers of the fake messages and accounts, unique across users
+    sequence = itertools.count()
+
+    def __init__(self, url, first_id, count, generator):
+        self.url = url
+        self.first_id = first_id
+        self.count = count
+        self.generator = generator
+        self.session = requests.Session()
+        self.login()
+
+    def random_user(self):
+        return self.first_id + self.generator.randrange(self.count)
+
+    def login(self):
+        """Log in as a random user, on a new session"""
+        self.session = requests.Session()
+        return self.session.post(
+            self.url + '/login', allow_redirects=False,
+            data=dict(email='user{}@example.com'.format(self.random_user()),
+                      password=PASSWORD))
+
+    def dashboard(self):
+        return self.session.get(self.url + '/dashboard')
+
+    def receive_message(self):
+        """Post the webhook Twilio sends for a reply to a reminder"""
+        message = next(self.sequence)
+        return requests.post(self.url + '/receive_message', data={
+            'ToCountry': 'US', 'SmsMessageSid': 'SM{:032d}'.format(message),
+            'NumMedia': '0', 'SmsSid': 'SM{:032d}'.format(message),
+            'SmsStatus': 'received', 'To': '+16462573594',
+            'MessageSid': 'SM{:032d}'.format(message), 'AccountSid': 'AC0',
+            'From': '+1{:010d}'.format(self.random_user()),
+            'NumSegments': '1', 'ApiVersion': '2010-04-01',
+            'Body': self.generator.choice(['Y', 'N'])})
+
+    def send_message(self):
+        return requests.get(self.url + '/send_message',
+                            allow_redirects=False)
+
+    def link_account(self):
+        account = 'account-{}'.format(next(self.sequence))
+        return self.session.post(
+            self.url + '/access_plaid_token', allow_redirects=False,
+            data={'public_token': 'public-' + account,
+                  'accounts[0][id]': account,
+                  'accounts[0][name]': 'Checking',
+                  'accounts[0][type]': 'depository',
+                  'accounts[0][subtype]': 'checking'})
+
+    def run(self, weights, deadline, samples):
+        """Request routes picked by weight until deadline"""
+        routes, cumulative = list(weights), list(
+            itertools.accumulate(weights.values()))
+        while time.perf_counter() < deadline:
+            route = self.generator.choices(routes,
+                                           cum_weights=cumulative)[0]
+            start = time.perf_counter()
+            try:
+                succeeded = getattr(self, route)().status_code < 400
+            except requests.RequestException:
+                succeeded = False
+            samples.append((route, time.perf_counter() - start, succeeded))
+
+
+def run_phase(users, weights, duration):
+    """
+    Run the virtual users on one mix for duration seconds
+    :return: the phase's summary, see summarize
+    """
+    samples = []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=user.run,
+                                args=(weights, deadline, samples))
+               for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - start)
+
+
+def run(count=1000, workers=16, duration=10, mixes=DEFAULT_MIXES,
+        spread=10, speed=60, senders=1, sms_rate=sms.RATE_PER_SENDER,
+        twilio_latency=0.1, plaid_latency=0.3, seed=0):
+    """
+    Seed a scratch database and replay the phases of traffic
+    :param count: number of users
+    :param workers: number of concurrent virtual users
+    :param duration: seconds each phase runs
+    :param mixes: list of phases, names of MIXES or weights
+    :param spread: the reminders are spread over this many minutes
+    :param speed: how much faster than real time the scheduler's clock runs
+    :param senders: number of sender numbers in the pool
+    :param sms_rate: texts per second of each sender
+    :return: dictionary of the settings and of the phases' summaries
+    """
+    phases = [(mix, parse_mix(mix)) for mix in mixes]
+    with data.scratch_app() as application:
+        application.config.update(
+            SMS_SENDERS=['+1555{:07d}'.format(i) for i in range(senders)],
+            SMS_RATE_PER_SENDER=sms_rate,
+            # one process, and sqlite would lock the senders' rows behind
+            # the writes of the tick sending the text
+            SMS_SHARED_BUCKETS=False)
+        first_id = data.seed_users(count, minutes=spread)
+        clock = SimulatedClock(data.REMINDER_DAY, speed)
+        with local_server(application) as url, \
+                fakes(twilio_latency, plaid_latency, clock) as twilio:
+            users = [VirtualUser(url, first_id, count, random.Random(seed + i))
+                     for i in range(workers)]
+            clock.started = time.perf_counter()
+            results = [dict(mix=mix, report=run_phase(users, weights,
+                                                      duration))
+                       for mix, weights in phases]
+            texts = next(twilio.sent)
+    return dict(users=count, workers=workers, duration=duration,
+                senders=senders, sms_rate=sms_rate, texts_sent=texts,
+                phases=results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds each phase runs')
+    parser.add_argument('--mix', action='append', dest='mixes',
+                        help='a phase: {} or weights like '
+                             '"login=1,dashboard=5" (default: {})'.format(
+                                 ', '.join(MIXES), ' '.join(DEFAULT_MIXES)))
+    parser.add_argument('--spread', type=int, default=10,
+                        help='minutes the reminders are spread over')
+    parser.add_argument('--speed', type=float, default=60,
+                        help='speed of the scheduler clock')
+    parser.add_argument('--senders', type=int, default=1,
+                        help='sender numbers texts are sent from')
+    parser.add_argument('--sms-rate', type=float,
+                        default=sms.RATE_PER_SENDER,
+                        help='texts per second of each sender')
+    parser.add_argument('--twilio-latency', type=float, default=0.1)
+    parser.add_argument('--plaid-latency', type=float, default=0.3)
+    parser.add_argument('--output', help='save the results to this file')
+    args = parser.parse_args()
+
+    mixes = args.mixes or DEFAULT_MIXES
+    for mix in mixes:
+        try:
+            parse_mix(mix)
+        except ValueError as e:
+            parser.error(str(e))
+    result = run(args.users, args.workers, args.duration, mixes,
+                 args.spread, args.speed, args.senders, args.sms_rate,
+                 args.twilio_latency, args.plaid_latency)
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
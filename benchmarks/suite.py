@@ -0,0 +1,193 @@
+"""
+Benchmark suite of the app's hot paths on a scratch sqlite database.
+
+At each scale N (1k, 100k and 1M by default) it seeds N users with one
+everyday habit each, all entered in an ended lottery, and one heavy user
+with N transactions in 2019, then times:
+dashboard - GET /dashboard of the heavy user
+send_message - a /send_message tick, due reminders of N/1440 users
+receive_message - a "Y" reply to /receive_message
+lottery_drawing - drawing the lottery among N entries
+add_transactions - ingesting a page of 500 transactions for the heavy user
+insights - the 12 month coffee Insights of the heavy user
+
+Results are printed as JSON, --output saves them and --baseline compares
+them with a saved run, exiting with 1 when a median is more than
+--tolerance slower.
+
+Usage:
+python -m benchmarks.suite [--scale 1k --scale 100k ...] [--runs N]
+                           [--output FILE] [--baseline FILE]
+                           [--tolerance 0.25]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import pytz
+
+from app import classes, db
+from benchmarks import data
+
+DEFAULT_SCALES = ['1k', '100k', '1M']
+SUFFIXES = {'k': 1000, 'M': 1000000}
+PAGE_SIZE = 500
+# differences under this many ms are noise, never regressions
+NOISE_MS = 1.0
+
+
+def parse_scale(scale):
+    """Return the number of rows of a scale, e.g. '100k' is 100000"""
+    if scale[-1:] in SUFFIXES:
+        return int(scale[:-1]) * SUFFIXES[scale[-1]]
+    return int(scale)
+
+
+def timed(function, runs, setup=None):
+    """
+    Time runs calls of function
+    :param setup: called before each run, untimed, its result is passed to
+    function
+    :return: dictionary of the median and fastest run in ms
+    """
+    timings = []
+    for run in range(runs):
+        argument = setup(run) if setup is not None else run
+        start = time.perf_counter()
+        function(argument)
+        timings.append((time.perf_counter() - start) * 1000)
+    return dict(median_ms=round(statistics.median(timings), 2),
+                min_ms=round(min(timings), 2))
+
+
+def run_scale(count, runs):
+    """
+    Seed a scratch database at one scale and time every hot path
+    :param count: number of users and of the heavy user's transactions
+    :return: dictionary of benchmark name to timings
+    """
+    # imported once the scratch app exists, they import numpy
+    from plaid_methods import add_plaid_data
+    from scripts.coin_transaction import lottery_drawing
+    from scripts.extract_habit import Insights
+
+    with data.scratch_app() as application:
+        first_id = data.seed_users(count)
+        lottery = data.seed_lottery(range(first_id, first_id + count))
+        user = classes.User.query.get(first_id)
+        account = classes.Accounts(user=user, account_plaid_id='bench')
+        db.session.add(account)
+        db.session.commit()
+        data.seed_transactions(user.id, count)
+        client = application.test_client()
+        client.post('/login', data=dict(email=user.email,
+                                        password='password'))
+        results = {}
+
+        results['dashboard'] = timed(lambda _: client.get('/dashboard'),
+                                     runs)
+
+        def tick(run):
+            """Move the clock to the run's minute of the reminder day"""
+            now = pytz.utc.localize(data.REMINDER_DAY +
+                                    timedelta(minutes=run))
+            return mock.patch('app.scheduler.utcnow', return_value=now)
+
+        def send_message(clock):
+            with clock:
+                client.get('/send_message')
+
+        def reply(run):
+            phone = '{:010d}'.format(first_id + run % count)
+            return dict(From='+1' + phone, Body='Y')
+
+        def draw(_):
+            """Put the lottery back in play"""
+            classes.Lottery.query.filter_by(id=lottery.id) \
+                .update(dict(winner_user_id=None))
+            db.session.commit()
+
+        with mock.patch('app.sms.send'):
+            results['send_message'] = timed(send_message, runs, setup=tick)
+            results['receive_message'] = timed(
+                lambda form: client.post('/receive_message', data=form),
+                runs, setup=reply)
+            results['lottery_drawing'] = timed(lambda _: lottery_drawing(),
+                                               runs, setup=draw)
+
+        pages = [data.plaid_transactions(PAGE_SIZE, seed=run)
+                 for run in range(runs)]
+        results['add_transactions'] = timed(
+            lambda run: add_plaid_data.add_transactions(
+                pages[run], classes.User.query.get(first_id),
+                classes.Accounts.query.get(account.id)), runs)
+        results['insights'] = timed(
+            lambda _: Insights(first_id, date(2019, 1, 1), 'coffee', 0,
+                               months=12), runs)
+        return results
+
+
+def run(scales=DEFAULT_SCALES, runs=5):
+    """
+    Time the hot paths at every scale
+    :return: dictionary of the environment and of scale to results
+    """
+    return dict(python=platform.python_version(), runs=runs,
+                scales={scale: run_scale(parse_scale(scale), runs)
+                        for scale in scales})
+
+
+def compare(result, baseline, tolerance=0.25):
+    """
+    Compare a run with a baseline run
+    :param tolerance: allowed slowdown of a median, 0.25 is 25%
+    :return: list of (scale, benchmark, baseline ms, current ms) of the
+    regressions, benchmarks missing from the baseline are skipped
+    """
+    regressions = []
+    for scale, results in result['scales'].items():
+        for name, timings in results.items():
+            before = baseline['scales'].get(scale, {}).get(name)
+            if before is None:
+                continue
+            current, previous = timings['median_ms'], before['median_ms']
+            if current > previous * (1 + tolerance) and \
+                    current - previous > NOISE_MS:
+                regressions.append((scale, name, previous, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scale', action='append', dest='scales',
+                        help='scales to run, e.g. 1k, 100k or 1M '
+                             '(default: all three)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='save the results to this file')
+    parser.add_argument('--baseline', help='compare with a saved run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    result = run(args.scales or DEFAULT_SCALES, args.runs)
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for scale, name, previous, current in regressions:
+            print('REGRESSION {} at {}: {} ms -> {} ms'.format(
+                name, scale, previous, current), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
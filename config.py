@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -8,6 +9,43 @@ class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     SECRET_KEY = os.urandom(24)
 
+    # read-only queries go to the replica when it is set, a user's requests
+    # stay on the primary for DB_STICKY_SECONDS after they write
+    SQLALCHEMY_REPLICA_URI = os.environ.get("SQLALCHEMY_REPLICA_URI")
+    DB_STICKY_SECONDS = int(os.environ.get("DB_STICKY_SECONDS", 5))
+
+    # connection pool of every engine, ignored for sqlite
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    # postgresql statement_timeout, 0 disables it
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS",
+                                                 30000))
+
+    # SQL statements slower than this are logged to "app.slow_query"
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 250))
+
+    # pool of numbers texts are sent from, each sending at most
+    # SMS_RATE_PER_SENDER per second
+    SMS_SENDERS = os.environ.get("SMS_SENDERS", "+16462573594").split(",")
+    SMS_RATE_PER_SENDER = float(os.environ.get("SMS_RATE_PER_SENDER", 1))
+    SMS_BURST = int(os.environ.get("SMS_BURST", 1))
+    SMS_MAX_RETRIES = int(os.environ.get("SMS_MAX_RETRIES", 3))
+    # the senders' rates are shared by every process through the
+    # sms_sender table, 0 keeps them per process
+    SMS_SHARED_BUCKETS = os.environ.get("SMS_SHARED_BUCKETS", "1") == "1"
+
+    # requests with this token in the X-Profile header or profile query
+    # parameter are profiled to PROFILE_DIR, keeping the PROFILE_KEEP latest;
+    # /pool_stats answers it as a bearer token
+    PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+    PROFILE_DIR = os.environ.get(
+        "PROFILE_DIR",
+        os.path.join(tempfile.gettempdir(), "impulses-profiles"))
+    PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+
 # for running sphinx documentation:
 # class Config(object):
 #     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
@@ -0,0 +1,23 @@
+"""
+gunicorn settings, run with `gunicorn -c gunicorn.conf.py application`.
+
+The app is loaded once in the master (so every worker shares the same
+SECRET_KEY) and the master's pooled database connections are dropped
+right before each worker is forked. Every worker then opens at most
+DB_POOL_SIZE + DB_MAX_OVERFLOW connections of its own.
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    """Drop connections opened by the master before forking a worker"""
+    from app import db
+    from app.database import dispose_engines
+    dispose_engines(db)
@@ -0,0 +1,25 @@
+"""add data_version to user table
+
+Revision ID: a3c5e1f07b21
+Revises: 5ccad50bb0af
+Create Date: 2026-10-19 10:12:41.250117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e1f07b21'
+down_revision = '5ccad50bb0af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('data_version', sa.Integer(),
+                                    nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('user', 'data_version')
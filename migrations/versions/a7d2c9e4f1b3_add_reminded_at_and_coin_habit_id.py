@@ -0,0 +1,36 @@
+"""add reminded_at to habits and habit_id to coin
+
+Revision ID: a7d2c9e4f1b3
+Revises: f3a1c6d8b2e4
+Create Date: 2026-10-19 19:03:41.127905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2c9e4f1b3'
+down_revision = 'f3a1c6d8b2e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('habits', sa.Column('reminded_at', sa.DateTime(),
+                                      nullable=True))
+    # batch, sqlite cannot add a foreign key to an existing table
+    with op.batch_alter_table('coin') as batch_op:
+        batch_op.add_column(sa.Column('habit_id', sa.Integer(),
+                                      nullable=True))
+        batch_op.create_foreign_key('fk_coin_habit_id_habits', 'habits',
+                                    ['habit_id'], ['habits_id'],
+                                    ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('coin') as batch_op:
+        batch_op.drop_constraint('fk_coin_habit_id_habits',
+                                 type_='foreignkey')
+        batch_op.drop_column('habit_id')
+    op.drop_column('habits', 'reminded_at')
@@ -0,0 +1,57 @@
+"""add lottery_ticket table
+
+Revision ID: b2f7e9c4a8d1
+Revises: f8d2b6a4c1e7
+Create Date: 2026-10-19 23:41:52.617204
+
+The tickets of existing entries are numbered in the order of their
+user_lottery_log rows, the order draws used to walk them in.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2f7e9c4a8d1'
+down_revision = 'f8d2b6a4c1e7'
+branch_labels = None
+depends_on = None
+
+user_lottery_log = sa.table('user_lottery_log',
+                            sa.column('lottery_log_id', sa.Integer),
+                            sa.column('user_id', sa.Integer),
+                            sa.column('lottery_id', sa.Integer),
+                            sa.column('entries', sa.Integer))
+
+
+def upgrade():
+    lottery_ticket = op.create_table(
+        'lottery_ticket',
+        sa.Column('lottery_id', sa.Integer(), nullable=False),
+        sa.Column('ticket_offset', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('entries', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['lottery_id'], ['lottery.lottery_id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+        sa.PrimaryKeyConstraint('lottery_id', 'ticket_offset')
+    )
+    # backfill, each entry's tickets follow the ones of the earlier entries
+    offset = sa.func.sum(user_lottery_log.c.entries).over(
+        partition_by=user_lottery_log.c.lottery_id,
+        order_by=user_lottery_log.c.lottery_log_id) \
+        - user_lottery_log.c.entries
+    entries = sa.select([user_lottery_log.c.lottery_id,
+                         offset.label('ticket_offset'),
+                         user_lottery_log.c.user_id,
+                         user_lottery_log.c.entries]).alias('entries')
+    op.execute(lottery_ticket.insert().from_select(
+        ['lottery_id', 'ticket_offset', 'user_id', 'entries'],
+        sa.select([entries.c.lottery_id, entries.c.ticket_offset,
+                   entries.c.user_id, entries.c.entries])
+        .where(sa.and_(entries.c.user_id.isnot(None),
+                       entries.c.entries > 0))))
+
+
+def downgrade():
+    op.drop_table('lottery_ticket')
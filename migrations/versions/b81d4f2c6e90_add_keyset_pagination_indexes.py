@@ -0,0 +1,30 @@
+"""add keyset pagination indexes on coin and transaction
+
+Revision ID: b81d4f2c6e90
+Revises: a3c5e1f07b21
+Create Date: 2026-10-19 11:03:27.481920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d4f2c6e90'
+down_revision = 'a3c5e1f07b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_coin_user_id_log_id', 'coin',
+                    ['user_id', 'log_id'], unique=False)
+    op.create_index('ix_transaction_user_id_trans_date', 'transaction',
+                    ['user_id', 'trans_date', 'transaction_id'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transaction_user_id_trans_date',
+                  table_name='transaction')
+    op.drop_index('ix_coin_user_id_log_id', table_name='coin')
@@ -0,0 +1,39 @@
+"""add habit_aggregate table
+
+Revision ID: c4e9a07d3b15
+Revises: b81d4f2c6e90
+Create Date: 2026-10-19 13:42:10.218377
+
+Existing transactions are aggregated with
+`flask rebuild-habit-aggregates` after upgrading.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e9a07d3b15'
+down_revision = 'b81d4f2c6e90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'habit_aggregate',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('habit_bucket', sa.SmallInteger(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('weekday', sa.SmallInteger(), nullable=False),
+        sa.Column('trans_count', sa.Integer(), nullable=False),
+        sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+        sa.Column('amount_cents_squared', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'habit_bucket', 'month',
+                                'weekday')
+    )
+
+
+def downgrade():
+    op.drop_table('habit_aggregate')
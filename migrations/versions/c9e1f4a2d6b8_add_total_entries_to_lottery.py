@@ -0,0 +1,37 @@
+"""add total_entries to lottery
+
+Revision ID: c9e1f4a2d6b8
+Revises: a7d2c9e4f1b3
+Create Date: 2026-10-19 19:48:12.503917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1f4a2d6b8'
+down_revision = 'a7d2c9e4f1b3'
+branch_labels = None
+depends_on = None
+
+lottery = sa.table('lottery',
+                   sa.column('lottery_id', sa.Integer),
+                   sa.column('total_entries', sa.Integer))
+user_lottery_log = sa.table('user_lottery_log',
+                            sa.column('lottery_id', sa.Integer),
+                            sa.column('entries', sa.Integer))
+
+
+def upgrade():
+    op.add_column('lottery', sa.Column('total_entries', sa.Integer(),
+                                       nullable=False, server_default='0'))
+    # backfill, the sum of each lottery's entries
+    op.execute(lottery.update().values(total_entries=sa.func.coalesce(
+        sa.select([sa.func.sum(user_lottery_log.c.entries)])
+        .where(user_lottery_log.c.lottery_id == lottery.c.lottery_id)
+        .as_scalar(), 0)))
+
+
+def downgrade():
+    op.drop_column('lottery', 'total_entries')
@@ -0,0 +1,54 @@
+"""add habit_bucket to transaction table
+
+Revision ID: d27b5f8e4a61
+Revises: c4e9a07d3b15
+Create Date: 2026-10-19 15:20:44.806133
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27b5f8e4a61'
+down_revision = 'c4e9a07d3b15'
+branch_labels = None
+depends_on = None
+
+# habit bucket of the plaid category ids when this revision was written,
+# frozen here so later changes to scripts/habit_buckets.py do not change
+# this upgrade
+CATEGORY_BUCKETS = {
+    # coffee: Cafe, Coffee Shop
+    1: [13005043, 13005047],
+    # lunch: restaurants but winery, juice bar, ice cream, distillery,
+    # coffee shop and cafe
+    2: [13005000] + [category_id for category_id in range(13005002, 13005060)
+                     if category_id not in (13005019, 13005024, 13005037,
+                                            13005043, 13005047)],
+    # transportation: Ride share, Limos and Chauffeurs, Taxi
+    3: [22006001, 22011000, 22016000],
+}
+
+transaction = sa.table('transaction',
+                       sa.column('category_id', sa.Integer),
+                       sa.column('habit_bucket', sa.SmallInteger))
+
+
+def upgrade():
+    op.add_column('transaction', sa.Column('habit_bucket', sa.SmallInteger(),
+                                           nullable=False,
+                                           server_default='0'))
+    # backfill, every transaction starts in the OTHER bucket
+    for bucket, category_ids in CATEGORY_BUCKETS.items():
+        op.execute(transaction.update()
+                   .where(transaction.c.category_id.in_(category_ids))
+                   .values(habit_bucket=bucket))
+    op.create_index('ix_transaction_user_id_habit_bucket', 'transaction',
+                    ['user_id', 'habit_bucket', 'trans_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transaction_user_id_habit_bucket',
+                  table_name='transaction')
+    op.drop_column('transaction', 'habit_bucket')
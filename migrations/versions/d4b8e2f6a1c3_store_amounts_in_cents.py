@@ -0,0 +1,61 @@
+"""store transaction and savings amounts in integer cents
+
+Revision ID: d4b8e2f6a1c3
+Revises: c9e1f4a2d6b8
+Create Date: 2026-10-19 20:31:07.284516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e2f6a1c3'
+down_revision = 'c9e1f4a2d6b8'
+branch_labels = None
+depends_on = None
+
+# table: [(decimal column, cents column, nullable)]
+AMOUNTS = {
+    'transaction': [('trans_amount', 'trans_amount_cents', False)],
+    'savings_history': [
+        ('savings_amount', 'savings_amount_cents', False),
+        ('total_savings', 'total_savings_cents', False),
+        ('predicted_savings', 'predicted_savings_cents', True)],
+}
+
+
+def upgrade():
+    for table_name, columns in AMOUNTS.items():
+        for amount, cents, _ in columns:
+            op.add_column(table_name, sa.Column(cents, sa.BigInteger(),
+                                                nullable=True))
+            table = sa.table(table_name,
+                             sa.column(amount, sa.Numeric(10, 2)),
+                             sa.column(cents, sa.BigInteger))
+            op.execute(table.update().values({cents: sa.cast(
+                sa.func.round(table.c[amount] * 100), sa.BigInteger)}))
+        # batch, sqlite cannot alter or drop a column in place
+        with op.batch_alter_table(table_name) as batch_op:
+            for amount, cents, nullable in columns:
+                batch_op.alter_column(cents, existing_type=sa.BigInteger(),
+                                      nullable=nullable)
+                batch_op.drop_column(amount)
+
+
+def downgrade():
+    for table_name, columns in AMOUNTS.items():
+        for amount, cents, _ in columns:
+            op.add_column(table_name, sa.Column(amount, sa.Numeric(10, 2),
+                                                nullable=True))
+            table = sa.table(table_name,
+                             sa.column(amount, sa.Numeric(10, 2)),
+                             sa.column(cents, sa.BigInteger))
+            op.execute(table.update().values(
+                {amount: table.c[cents] / 100.0}))
+        with op.batch_alter_table(table_name) as batch_op:
+            for amount, cents, nullable in columns:
+                batch_op.alter_column(amount,
+                                      existing_type=sa.Numeric(10, 2),
+                                      nullable=nullable)
+                batch_op.drop_column(cents)
@@ -0,0 +1,33 @@
+"""add sms_sender table, the shared rate limits of the text senders
+
+Revision ID: e7c3a9f1d5b2
+Revises: d4b8e2f6a1c3
+Create Date: 2026-10-19 22:14:52.617304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3a9f1d5b2'
+down_revision = 'd4b8e2f6a1c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sms_sender',
+        sa.Column('sender', sa.String(length=20), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated', sa.Float(), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.Column('blocked_until', sa.Float(), nullable=False),
+        sa.Column('failures', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('sender')
+    )
+
+
+def downgrade():
+    op.drop_table('sms_sender')
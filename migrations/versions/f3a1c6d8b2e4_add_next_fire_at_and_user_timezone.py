@@ -0,0 +1,83 @@
+"""add next_fire_at to habits and timezone to user
+
+Revision ID: f3a1c6d8b2e4
+Revises: d27b5f8e4a61
+Create Date: 2026-10-19 17:12:08.341552
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import pytz
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a1c6d8b2e4'
+down_revision = 'd27b5f8e4a61'
+branch_labels = None
+depends_on = None
+
+user = sa.table('user',
+                sa.column('user_id', sa.Integer),
+                sa.column('timezone', sa.String))
+habits = sa.table('habits',
+                  sa.column('habits_id', sa.Integer),
+                  sa.column('user_id', sa.Integer),
+                  sa.column('time_minute', sa.Integer),
+                  sa.column('time_hour', sa.Integer),
+                  sa.column('time_day_of_week', sa.String),
+                  sa.column('next_fire_at', sa.DateTime))
+
+# the backfill's rules as of this revision, independent of app.scheduler
+DEFAULT_TIMEZONE = 'America/Los_Angeles'
+DAYS_OF_WEEK = {'weekday': [0, 1, 2, 3, 4],
+                'weekend': [5, 6],
+                'everyday': [0, 1, 2, 3, 4, 5, 6]}
+
+
+def next_fire_at(habit, after, tz):
+    """Return the habit's first reminder after `after` as naive UTC, None
+    if it never fires"""
+    local = after.astimezone(tz)
+    for days in range(8):
+        day = local.date() + timedelta(days=days)
+        if day.weekday() not in DAYS_OF_WEEK.get(habit.time_day_of_week, []):
+            continue
+        fire_at = tz.normalize(tz.localize(datetime(
+            day.year, day.month, day.day, int(habit.time_hour),
+            int(habit.time_minute))))
+        if fire_at > after:
+            return fire_at.astimezone(pytz.utc).replace(tzinfo=None)
+    return None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('timezone', sa.String(), nullable=False,
+                                    server_default=DEFAULT_TIMEZONE))
+    op.add_column('habits', sa.Column('next_fire_at', sa.DateTime(),
+                                      nullable=True))
+    # backfill, habits' next reminders from now in their user's time zone
+    connection = op.get_bind()
+    now = datetime.now(pytz.utc)
+    rows = connection.execute(
+        sa.select([habits.c.habits_id, habits.c.time_minute,
+                   habits.c.time_hour, habits.c.time_day_of_week,
+                   user.c.timezone])
+        .select_from(habits.join(user,
+                                 habits.c.user_id == user.c.user_id))) \
+        .fetchall()
+    for row in rows:
+        fire_at = next_fire_at(row, now, pytz.timezone(row.timezone))
+        if fire_at is not None:
+            op.execute(habits.update()
+                       .where(habits.c.habits_id == row.habits_id)
+                       .values(next_fire_at=fire_at))
+    op.create_index('ix_habits_next_fire_at', 'habits', ['next_fire_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_habits_next_fire_at', table_name='habits')
+    op.drop_column('habits', 'next_fire_at')
+    op.drop_column('user', 'timezone')
@@ -0,0 +1,39 @@
+"""add the pagination indexes of the filtered coin and transaction pages
+
+Revision ID: f8d2b6a4c1e7
+Revises: e7c3a9f1d5b2
+Create Date: 2026-10-19 22:58:36.940215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8d2b6a4c1e7'
+down_revision = 'e7c3a9f1d5b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_coin_user_id_log_date', 'coin',
+                    ['user_id', 'log_date', 'log_id'], unique=False)
+    op.create_index('ix_coin_user_id_description', 'coin',
+                    ['user_id', 'description', 'log_date', 'log_id'],
+                    unique=False)
+    op.create_index('ix_transaction_user_id_category_id', 'transaction',
+                    ['user_id', 'category_id', 'trans_date',
+                     'transaction_id'], unique=False)
+    op.create_index('ix_transaction_user_id_account_id', 'transaction',
+                    ['user_id', 'account_id', 'trans_date',
+                     'transaction_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transaction_user_id_account_id',
+                  table_name='transaction')
+    op.drop_index('ix_transaction_user_id_category_id',
+                  table_name='transaction')
+    op.drop_index('ix_coin_user_id_description', table_name='coin')
+    op.drop_index('ix_coin_user_id_log_date', table_name='coin')
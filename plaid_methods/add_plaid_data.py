@@ -1,5 +1,8 @@
 from app import db, classes
 from datetime import datetime
+from scripts import habit_aggregates, habit_buckets
+
+DELETE_CHUNK_SIZE = 10000
 
 
 def add_accounts(accounts, user, plaid_item, commit=True):
@@ -22,6 +25,7 @@ def add_accounts(accounts, user, plaid_item, commit=True):
                                user=user,
                                plaid_item=plaid_item)
         db.session.add(acc)
+    user.bump_data_version()
     if commit is True:
         db.session.commit()
 
@@ -38,15 +42,20 @@ def add_transactions(transactions, user, account, commit=True):
     database
     """
 
+    rows = []
     for transaction in transactions:
         loc = transaction['location']
         categories = ';'.join(transaction['category'])
+        trans_date = parse_date(transaction['date'])
+        habit_bucket = habit_buckets.classify(transaction['category_id'])
+        cents = classes.to_cents(transaction['amount'])
+        rows.append((trans_date, cents, habit_bucket))
         trans = classes.Transaction(user=user,
                                     account=account,
-                                    trans_date=parse_date(transaction['date']),
+                                    trans_date=trans_date,
                                     post_date=parse_date(
                                         transaction['authorized_date']),
-                                    trans_amount=transaction['amount'],
+                                    trans_amount_cents=cents,
                                     merchant_category=categories,
                                     merchant_address=loc['address'],
                                     merchant_city=loc['city'],
@@ -55,13 +64,48 @@ def add_transactions(transactions, user, account, commit=True):
                                     merchant_postal_code=loc['postal_code'],
                                     merchant_longitude=loc['lon'],
                                     merchant_latitude=loc['lat'],
-                                    category_id=transaction['category_id']
+                                    category_id=transaction['category_id'],
+                                    habit_bucket=habit_bucket
                                     )
         db.session.add(trans)
+    habit_aggregates.add(user.id, habit_aggregates.aggregate(rows))
+    user.bump_data_version()
     if commit is True:
         db.session.commit()
 
 
+def delete_transactions(account_id, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    Bulk delete all transactions of an account from the database and take
+    them out of the user's habit aggregates; the caller commits, in the
+    same transaction as the account, so a failure deletes nothing
+    :param account_id: id of the account whose transactions are deleted
+    :param chunk_size: maximum number of rows deleted per statement
+    :return: total number of deleted transactions
+    """
+    user_id = db.session.query(classes.Accounts.user_id) \
+        .filter_by(id=account_id).scalar()
+    transaction = classes.Transaction
+    rows = db.session.query(transaction.trans_date,
+                            transaction.trans_amount_cents,
+                            transaction.habit_bucket) \
+        .filter(transaction.account_id == account_id) \
+        .yield_per(chunk_size)
+    habit_aggregates.subtract(user_id, habit_aggregates.aggregate(rows))
+    deleted = 0
+    while True:
+        chunk = db.session.query(transaction.id) \
+            .filter_by(account_id=account_id) \
+            .limit(chunk_size) \
+            .subquery()
+        count = transaction.query \
+            .filter(transaction.id.in_(chunk)) \
+            .delete(synchronize_session=False)
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+
 def parse_date(date_string):
     try:
         return datetime.strptime(date_string, "%Y-%m-%d")
@@ -1,11 +1,16 @@
 import plaid
-from plaid.errors import APIError, ItemError, PlaidError
+from plaid.api import Item
+from plaid.errors import APIError, InstitutionError, ItemError, PlaidError, \
+    RateLimitExceededError
 import requests
+from retrying import retry
 
 import os
 from typing import List
 import time
 
+from app.metrics import external_call
+
 
 def get_transactions(
     client: plaid.Client, start_date: str, end_date: str,
@@ -34,21 +39,23 @@ def get_transactions(
     timeout = 5
     while True:
         try:
-            response = client.Transactions.get(
-                access_token, start_date=start_date, end_date=end_date,
-                account_ids=[account_id]
-            )
+            with external_call("plaid", "transactions_get"):
+                response = client.Transactions.get(
+                    access_token, start_date=start_date, end_date=end_date,
+                    account_ids=[account_id]
+                )
 
             transactions = response["transactions"]
 
             while len(transactions) < response["total_transactions"]:
-                response = client.Transactions.get(
-                    access_token,
-                    start_date=start_date,
-                    end_date=end_date,
-                    offset=len(transactions),
-                    account_ids=[account_id]
-                )
+                with external_call("plaid", "transactions_get"):
+                    response = client.Transactions.get(
+                        access_token,
+                        start_date=start_date,
+                        end_date=end_date,
+                        offset=len(transactions),
+                        account_ids=[account_id]
+                    )
                 transactions.extend(response["transactions"])
             break
         except ItemError as e:
@@ -74,7 +81,8 @@ def get_accounts(client: plaid.Client, access_token: str) -> List[dict]:
     :type [access_token]: [string]
     """
     try:
-        response = client.Accounts.get(access_token)
+        with external_call("plaid", "accounts_get"):
+            response = client.Accounts.get(access_token)
     except APIError as e:
         return e.code
     return response["accounts"]
@@ -90,8 +98,36 @@ def token_exchange(client: plaid.Client, public_token: str) -> dict:
         :type [public_token]: [string]
     """
     try:
-        response = client.Item.public_token.exchange(public_token)
+        with external_call("plaid", "public_token_exchange"):
+            response = client.Item.public_token.exchange(public_token)
     except PlaidError as e:
         return e.code
 
     return response
+
+
+def is_transient_error(exception: Exception) -> bool:
+    """
+    Returns True if a failed plaid call is worth retrying
+    :param [exception]: exception raised by the plaid client
+    :type [exception]: [Exception]
+    """
+    return isinstance(exception, (APIError, InstitutionError,
+                                  RateLimitExceededError,
+                                  requests.exceptions.RequestException))
+
+
+@retry(retry_on_exception=is_transient_error, stop_max_attempt_number=5,
+       wait_exponential_multiplier=1000, wait_exponential_max=30000)
+def remove_item(client: plaid.Client, access_token: str) -> dict:
+    """
+    Removes a plaid item, retrying with exponential backoff on transient
+    errors
+    :param [client]: plaid client object that encapsulates plaid keys
+    :type [client]: [plaid.Client]
+
+    :param [access_token]:  access token of the item to remove
+    :type [access_token]: [string]
+    """
+    with external_call("plaid", "item_remove"):
+        return Item(client).remove(access_token)
@@ -1,12 +1,11 @@
 """
 Helper functions for coin transactions, including add_login_coin,
-add_saving_coin, enter_lottery, and lottery_drawing.
+add_saving_coin, enter_lottery, lottery_drawing and draw_lottery.
 """
 
 import random
-import pytz
-from datetime import datetime
-from app import classes, db
+from app import classes, db, sms
+from app.lottery_cache import local_now
 
 
 # update user coins when logging in
@@ -23,12 +22,12 @@ def add_login_coin(user):
         .filter(classes.Coin.user == user,
                 classes.Coin.description.in_(["login", "registration"])) \
         .scalar()
-    tz = pytz.timezone("America/Los_Angeles")
+    today = user.today()
 
     if login_coin_date is None:  # first time login
         coin_amount = 10
         description = "registration"
-    elif (datetime.now().astimezone(tz).date() - login_coin_date).days > 0:
+    elif (today - login_coin_date).days > 0:
         # daily login
         coin_amount = 2
         description = "login"
@@ -36,28 +35,31 @@ def add_login_coin(user):
         return
 
     new_coin = classes.Coin(user=user, coin_amount=coin_amount,
-                            log_date=datetime.now().astimezone(tz).date(),
+                            log_date=today,
                             description=description)
     user.coins += coin_amount
+    user.bump_data_version()
     db.session.add(new_coin)
     db.session.commit()
 
 
 # helper function to update user coins when replying "yes" to saving texts
-def add_saving_coin(user):
+def add_saving_coin(user, habit=None, commit=True):
     """Update user coins when replying "yes" to saving texts.
 
     When the user replies "yes" to saving text messages, 10 coins will be
-    added. A new coin transaction will be added to coin table and the coins
-    column in user table will also be updated.
+    added for each habit saved on. A new coin transaction will be added to
+    coin table and the coins column in user table will also be updated.
     """
-    tz = pytz.timezone("America/Los_Angeles")
     new_coin = classes.Coin(user=user, coin_amount=10,
-                            log_date=datetime.now().astimezone(tz).date(),
-                            description="saving")
+                            log_date=user.today(),
+                            description="saving",
+                            habit_id=habit.id if habit is not None else None)
     user.coins += 10
+    user.bump_data_version()
     db.session.add(new_coin)
-    db.session.commit()
+    if commit:
+        db.session.commit()
 
 
 # helper function to update user coins when entering a lottery
@@ -69,24 +71,32 @@ def enter_lottery(user, lottery):
     user has.
 
     A new coin transaction will be added to coin table and the coins column
-    in user table will also be updated. The user_lottery_log table will also
-    be updated.
+    in user table will also be updated. The user_lottery_log table and the
+    lottery's total_entries will also be updated, and a lottery_ticket
+    numbered after the earlier entries is added.
     """
     # check if the user has bought the lottery before
     lottery_log = classes.UserLotteryLog.query.filter_by(
         user=user, lottery=lottery).first()
     if lottery_log:
-        lottery_log.entries += 1
+        lottery_log.entries = classes.UserLotteryLog.entries + 1
     else:  # the user buys the lottery for the first time
         new_lottery_log = classes.UserLotteryLog(user=user, lottery=lottery)
         db.session.add(new_lottery_log)
+    # the lottery row stays locked until the commit, so concurrent entries
+    # are all counted and never get the same ticket
+    ticket_offset = db.session.query(classes.Lottery.total_entries) \
+        .filter(classes.Lottery.id == lottery.id).with_for_update().scalar()
+    db.session.add(classes.LotteryTicket(lottery=lottery, user=user,
+                                         ticket_offset=ticket_offset))
+    lottery.total_entries = classes.Lottery.total_entries + 1
 
     # update the user's coins
-    tz = pytz.timezone("America/Los_Angeles")
     new_coin = classes.Coin(user=user, coin_amount=-lottery.cost,
-                            log_date=datetime.now().astimezone(tz).date(),
+                            log_date=user.today(),
                             description="lottery")
     user.coins -= lottery.cost
+    user.bump_data_version()
     db.session.add(new_coin)
     db.session.commit()
 
@@ -96,30 +106,50 @@ def lottery_drawing():
     """Draw the winner for lotteries that have ended.
 
     First check which lotteries have ended without the winner drawn.
-    Then choose the winner, send message to the winner, and update
-    the lottery table.
+    Then draw each of them with draw_lottery.
     """
-    tz = pytz.timezone("America/Los_Angeles")
-    current_time = datetime.now().astimezone(tz)
+    # lottery end dates are in the app's time zone
     lottery_to_draw = classes.Lottery.query.filter(
         classes.Lottery.winner_user_id.is_(None),
-        classes.Lottery.end_date <= str(current_time)).all()
+        classes.Lottery.end_date <= local_now()).all()
 
     for lottery in lottery_to_draw:
-        participants = classes.UserLotteryLog.query.filter_by(
-            lottery=lottery).all()
-        participants = [p.user_id for p in participants
-                        for _ in range(p.entries)]
-
-        if participants:
-            lottery.winner_user_id = winner = random.choice(participants)
-            # send message to the winner
-            body = f"Congratulations! You've won the lottery for " \
-                   + f"{lottery.lottery_name}!"
-            twilio_client.messages.create(
-                body=body,
-                to=classes.User.query.filter_by(id=winner).first().phone,
-                from_="+16462573594")
-        else:
-            lottery.winner_user_id = -1
+        draw_lottery(lottery, commit=False)
     db.session.commit()
+
+
+def draw_lottery(lottery, commit=True):
+    """Choose the winner of a lottery, send message to the winner, and
+    update the lottery table.
+
+    A ticket is drawn among the lottery's total_entries, the winner is the
+    holder of the lottery_ticket with the greatest offset up to it.
+    """
+    winner = None
+    if lottery.total_entries:
+        ticket = random.randrange(lottery.total_entries)
+        winner = db.session.query(classes.LotteryTicket.user_id) \
+            .filter(classes.LotteryTicket.lottery_id == lottery.id,
+                    classes.LotteryTicket.ticket_offset <= ticket) \
+            .order_by(classes.LotteryTicket.ticket_offset.desc()) \
+            .limit(1).scalar()
+
+    if winner is not None:
+        lottery.winner_user_id = winner
+        # send message to the winner
+        body = f"Congratulations! You've won the lottery for " \
+               + f"{lottery.lottery_name}!"
+        sms.send(classes.User.query.filter_by(id=winner).first().phone, body,
+                 sms.LOTTERY)
+    else:
+        lottery.winner_user_id = -1
+
+    # the result shows up on every participant's dashboard
+    participant_ids = db.session.query(classes.UserLotteryLog.user_id) \
+        .filter_by(lottery=lottery)
+    classes.User.query.filter(classes.User.id.in_(participant_ids)) \
+        .update({classes.User.data_version:
+                 classes.User.data_version + 1},
+                synchronize_session=False)
+    if commit:
+        db.session.commit()
@@ -1,119 +1,142 @@
-import ast
+import math
+
 import numpy as np
-import collections
-import matplotlib
-import matplotlib.pyplot as plt
-import mpld3
-from datetime import datetime
-from app import classes
+from app import classes, db
+from scripts import habit_aggregates, habit_buckets
+
+
+def summary_statistics(summary, median_cents):
+    """
+    Return the statistics of a habit's transactions from their aggregates
+    :param summary: output of habit_aggregates.summarize(), with at least
+    one transaction
+    :param median_cents: median transaction amount in cents
+    :return: dictionary of num, tot_amount, avg_amount, med_amount,
+    std_amount (in dollars) and per_weekday (7 counts, Monday first)
+    """
+    num = summary['trans_count']
+    cents = summary['amount_cents']
+    # population variance num**2 * var = num * sum(x**2) - sum(x)**2, exact
+    # in integers
+    spread = max(num * summary['amount_cents_squared'] - cents * cents, 0)
+    return dict(num=num,
+                tot_amount=round(cents / 100, 2),
+                avg_amount=round(cents / num / 100, 2),
+                med_amount=round(median_cents / 100, 2),
+                std_amount=round(math.sqrt(spread) / num / 100, 2),
+                per_weekday=list(summary['per_weekday']))
 
 
 class Insights:
     """
-    Class to retrieve insights for a particular habit
+    Class to retrieve insights for a particular habit over whole months.
+    The count, total, mean, standard deviation and day of the week split
+    come from the monthly habit aggregates, in O(months); only the median
+    reads the habit's transactions of the period, on the
+    (user_id, habit_bucket, trans_date) index
 
     """
 
-    def __init__(self, user_id, date, categories_file, habit_name, thresh):
+    def __init__(self, user_id, date, habit_name, thresh, months=1):
         """
 
         :param user_id: user id
-        :param date: beginning of the month to analyze
-        :param categories_file:
+        :param date: first month to analyze
         :param habit_name: string
-        :param thresh: int
+        :param thresh: minimum number of purchases per month, int
+        :param months: number of months to analyze, int
         """
         self.user_id = user_id
-        self.date = date
-        self.categories_file = categories_file
+        self.date = habit_aggregates.month_start(date)
+        self.months = months
         self.habit_name = habit_name
         self.thresh = thresh
-        self.transactions = self.get_habits_transactions()
-        if self.transactions is not None:
-            self.num = len(self.transactions)
-            self.tot_amount = self.total_amount(self.transactions)
-            self.avg_amount = self.average_amount(self.transactions)
-            self.recommended = int(round(self.num * 0.8))
-            self.yearly_saving = round((self.num - self.recommended) * 12 *
-                                       self.avg_amount, 2)
-            self.graph = self.num_per_day_graph(self.transactions)
+        self.previous = None
+        self.summary = self.get_habit_summary()
+        if self.summary is not None:
+            stats = summary_statistics(self.summary,
+                                       self.get_median_cents())
+            self.num = stats['num']
+            self.tot_amount = stats['tot_amount']
+            self.avg_amount = stats['avg_amount']
+            self.med_amount = stats['med_amount']
+            self.std_amount = stats['std_amount']
+            self.recommended, self.yearly_saving = self.projected_saving(
+                self.num, self.avg_amount, self.months)
+            self.graph = self.num_per_day_graph(stats['per_weekday'])
 
-    @staticmethod
-    def parse_plaid_data(plaid_data):
-        """
-        Parse a string from plaid into python object
-        :param plaid_data: name of the file (str)
-        :return: list of dictionary
-        """
-        plaid_data = plaid_data.replace('\n', '')
-        data = ast.literal_eval(plaid_data)
-        return data
+    @property
+    def end_date(self):
+        """First day after the analyzed months"""
+        return habit_aggregates.add_months(self.date, self.months)
 
-    def get_habits_transactions(self):
+    @property
+    def period_label(self):
+        """Analyzed months in words, e.g. 'in October 2019'"""
+        if self.months == 1:
+            return 'in {:%B %Y}'.format(self.date)
+        last = habit_aggregates.add_months(self.date, self.months - 1)
+        return 'from {:%B %Y} to {:%B %Y}'.format(self.date, last)
+
+    def get_habit_summary(self):
         """
-        Return habits transactions if above the threshold and number
-        of time spent on habit.
+        Return the summary of the habit's transactions if the user bought
+        it at least thresh times a month on average.
         Otherwise, return None.
         """
-        data = open(self.categories_file).read()
-        categories = self.parse_plaid_data(data)
-
-        if self.habit_name == 'coffee':
-            id_list = ['13005047',  # Cafe
-                       '13005043'  # Coffee Shop
-                       ]
-        elif self.habit_name == 'lunch':
-            # ids for restaurants
-            id_restaurants = [x['category_id']
-                              for x in categories['categories']
-                              if 'Restaurants' in x['hierarchy']]
-            # Ids to remove from restaurants
-            id_to_remove = ['13005001',  # winery
-                            '13005019',  # Juice Bar
-                            '13005024',  # Ice Cream
-                            '13005037',  # Distillery
-                            '13005043',  # Coffee Shop
-                            '13005047'  # Cafe
-                            ]
-            id_list = list(set(id_restaurants).difference(set(id_to_remove)))
-        elif self.habit_name == 'transportation':
-            id_list = ['22016000',  # Taxi
-                       '22011000',  # Limos and Chauffeurs
-                       '22006001'  # Ride share
-                       ]
-        else:
+        bucket = habit_buckets.BUCKETS.get(self.habit_name)
+        if bucket is None:
             # Not defined habit
             return None
-        # Get the transactions from that user, for the specified month and
-        # for the expenses from the category ids
-        end_date = datetime(year=self.date.year, month=self.date.month + 1,
-                            day=1)
-        transactions = classes.Transaction.query.filter_by(
-            user_id=self.user_id)\
-            .filter((classes.Transaction.trans_date >= self.date) &
-                    (classes.Transaction.trans_date < end_date) &
-                    (classes.Transaction.category_id.in_(id_list))).all()
-        ct = len(transactions)
-        if ct < self.thresh:
+        summary = habit_aggregates.summarize(self.user_id, bucket,
+                                             self.date, self.months)
+        if summary['trans_count'] == 0 or \
+                summary['trans_count'] < self.thresh * self.months:
             return None
-        return transactions
+        return summary
 
-    def num_per_day_graph(self, transactions):
+    def get_median_cents(self):
+        """
+        Return the median amount in cents of the habit's transactions in
+        the analyzed months, reading the middle one or two amounts
+        """
+        transaction = classes.Transaction
+        count = self.summary['trans_count']
+        middle = [cents for cents, in db.session.query(
+            transaction.trans_amount_cents)
+            .filter(transaction.user_id == self.user_id,
+                    transaction.habit_bucket ==
+                    habit_buckets.BUCKETS[self.habit_name],
+                    transaction.trans_date >= self.date,
+                    transaction.trans_date < self.end_date)
+            .order_by(transaction.trans_amount_cents)
+            .offset((count - 1) // 2).limit(2 - count % 2)]
+        return sum(middle) / len(middle) if middle else 0
+
+    def compare_year_over_year(self):
+        """
+        Set previous to the insights of the same months a year earlier,
+        None if the user did not buy the habit then
+        """
+        previous = Insights(self.user_id,
+                            habit_aggregates.add_months(self.date, -12),
+                            self.habit_name, 0, self.months)
+        self.previous = previous if previous.summary is not None else None
+        return self.previous
+
+    def num_per_day_graph(self, num_per_day):
         """
         Return the number of time user spent on habit on each day of the week
-        :param transactions: list of transactions
+        :param num_per_day: number of purchases on each day of the week,
+        Monday first
         """
-        map_day = {0: 'Mon', 1: 'Tues', 2: 'Wed', 3: 'Thurs',
-                   4: 'Fri', 5: 'Sat', 6: 'Sun'}
-        num_per_day = collections.Counter([x.trans_date.weekday()
-                                           for x in transactions])
-        for x in map_day.keys():
-            if x not in num_per_day.keys():
-                num_per_day[x] = 0
-        sorted_num_per_day = sorted(num_per_day.items())
-        day = [map_day[x[0]] for x in sorted_num_per_day]
-        freq = [x[1] for x in sorted_num_per_day]
+        day = ['Mon', 'Tues', 'Wed', 'Thurs', 'Fri', 'Sat', 'Sun']
+        freq = list(num_per_day)
+        # matplotlib and mpld3 are slow to import, load them on first use
+        import matplotlib
         matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import mpld3
         fig = plt.figure(figsize=(6, 3))
         plt.bar(day, freq, align='center', alpha=0.5, color='#327AB7')
         plt.ylabel('Purchased {}'.format(self.habit_name))
@@ -124,21 +147,15 @@ class Insights:
         return output
 
     @staticmethod
-    def total_amount(transactions):
-        """
-        Return the total amount spent on the habit.
-        :param transactions: list of transactions
-        """
-        tot_amount = round(sum([float(x.trans_amount) for x in transactions]),
-                           2)
-        return tot_amount
-
-    @staticmethod
-    def average_amount(transactions):
+    def projected_saving(num, avg_amount, months):
         """
-        Return the average spent on habit
-        :param transactions: list of transactions
+        Return the recommended number of purchases per month and the
+        approximate yearly saving of cutting down to it
+        :param num: number of purchases in the analyzed months
+        :param avg_amount: average cost of a purchase
+        :param months: number of analyzed months
         """
-        avg_amount = round(np.mean([float(x.trans_amount)
-                                    for x in transactions]), 2)
-        return avg_amount
+        per_month = num / months
+        recommended = int(round(per_month * 0.8))
+        yearly_saving = round((per_month - recommended) * 12 * avg_amount, 2)
+        return recommended, yearly_saving
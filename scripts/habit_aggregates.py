@@ -0,0 +1,161 @@
+"""
+Monthly habit aggregates of each user's spending.
+
+The habit_aggregate table holds the number, sum and sum of squares of a
+user's transaction amounts (in cents) per habit bucket, month and day of
+the week. add_transactions() adds to it in the same database transaction
+as the new rows, so Insights for any period are answered from at most
+7 rows per month instead of rescanning the raw transactions.
+"""
+
+from datetime import date
+
+from sqlalchemy.dialects import postgresql
+
+from app import classes, db
+
+
+def month_start(day):
+    """Return the first day of the month of day"""
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, months):
+    """Return the first day of the month months after month (or before,
+    if months is negative)"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def aggregate(rows):
+    """
+    Aggregate transactions by habit bucket, month and day of the week
+    :param rows: iterable of (trans_date, amount in cents, habit_bucket)
+    :return: dictionary of (habit_bucket, month, weekday) to
+    [trans_count, amount_cents, amount_cents_squared]
+    """
+    totals = {}
+    for trans_date, cents, habit_bucket in rows:
+        key = (habit_bucket, month_start(trans_date), trans_date.weekday())
+        total = totals.setdefault(key, [0, 0, 0])
+        total[0] += 1
+        total[1] += cents
+        total[2] += cents * cents
+    return totals
+
+
+def add(user_id, totals):
+    """
+    Add aggregated transactions to the user's habit aggregates, the caller
+    commits
+    :param user_id: user id
+    :param totals: output of aggregate()
+    """
+    if not totals:
+        return
+    habit_aggregate = classes.HabitAggregate
+    rows = [dict(user_id=user_id, habit_bucket=key[0], month=key[1],
+                 weekday=key[2], trans_count=count, amount_cents=cents,
+                 amount_cents_squared=squared)
+            for key, (count, cents, squared) in totals.items()]
+    # increments in SQL so concurrent ingestions do not lose counts, and
+    # a row two of them create at once is inserted by one, incremented by
+    # the other
+    if db.session.get_bind(habit_aggregate.__mapper__).dialect.name == \
+            "postgresql":
+        insert = postgresql.insert(habit_aggregate.__table__)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=["user_id", "habit_bucket", "month", "weekday"],
+            set_={name: habit_aggregate.__table__.c[name] +
+                  getattr(insert.excluded, name)
+                  for name in ["trans_count", "amount_cents",
+                               "amount_cents_squared"]}), rows)
+        return
+    # elsewhere the UPDATE takes the write lock, sqlite has one writer
+    for row in rows:
+        updated = habit_aggregate.query.filter_by(
+            user_id=user_id, habit_bucket=row["habit_bucket"],
+            month=row["month"], weekday=row["weekday"]) \
+            .update({habit_aggregate.trans_count:
+                     habit_aggregate.trans_count + row["trans_count"],
+                     habit_aggregate.amount_cents:
+                     habit_aggregate.amount_cents + row["amount_cents"],
+                     habit_aggregate.amount_cents_squared:
+                     habit_aggregate.amount_cents_squared +
+                     row["amount_cents_squared"]},
+                    synchronize_session=False)
+        if not updated:
+            db.session.execute(habit_aggregate.__table__.insert(), row)
+
+
+def subtract(user_id, totals):
+    """
+    Take aggregated transactions, e.g. of a deleted account, out of the
+    user's habit aggregates and drop the rows left empty; the caller
+    commits
+    :param user_id: user id
+    :param totals: output of aggregate()
+    """
+    add(user_id, {key: [-value for value in values]
+                  for key, values in totals.items()})
+    db.session.flush()
+    classes.HabitAggregate.query.filter_by(user_id=user_id, trans_count=0) \
+        .delete(synchronize_session=False)
+
+
+def rebuild(user_id, chunk_size=10000):
+    """
+    Recompute the user's habit aggregates from their transactions, e.g.
+    after transactions were deleted; the caller commits
+    :param user_id: user id
+    :param chunk_size: number of transactions read at a time
+    """
+    classes.HabitAggregate.query.filter_by(user_id=user_id) \
+        .delete(synchronize_session=False)
+    transaction = classes.Transaction
+    rows = db.session.query(transaction.trans_date,
+                            transaction.trans_amount_cents,
+                            transaction.habit_bucket) \
+        .filter(transaction.user_id == user_id) \
+        .yield_per(chunk_size)
+    add(user_id, aggregate(rows))
+
+
+def summarize(user_id, habit_bucket, start, months=1):
+    """
+    Summarize a user's spending on a habit
+    :param user_id: user id
+    :param habit_bucket: habit bucket (int)
+    :param start: first month of the period (date)
+    :param months: number of months in the period
+    :return: dictionary with the trans_count, amount_cents and
+    amount_cents_squared of the period and per_weekday, the number of
+    transactions on each day of the week (Monday first)
+    """
+    habit_aggregate = classes.HabitAggregate
+    start = month_start(start)
+    rows = db.session.query(
+        habit_aggregate.weekday,
+        db.func.sum(habit_aggregate.trans_count),
+        db.func.sum(habit_aggregate.amount_cents),
+        db.func.sum(habit_aggregate.amount_cents_squared)) \
+        .filter(habit_aggregate.user_id == user_id,
+                habit_aggregate.habit_bucket == habit_bucket,
+                habit_aggregate.month >= start,
+                habit_aggregate.month < add_months(start, months)) \
+        .group_by(habit_aggregate.weekday) \
+        .all()
+    summary = dict(trans_count=0, amount_cents=0, amount_cents_squared=0,
+                   per_weekday=[0] * 7)
+    for weekday, count, cents, squared in rows:
+        summary["trans_count"] += int(count)
+        summary["amount_cents"] += int(cents)
+        summary["amount_cents_squared"] += int(squared)
+        summary["per_weekday"][weekday] = int(count)
+    return summary
+
+
+def latest_month(user_id):
+    """Return the last month the user spent anything in, or None"""
+    return db.session.query(db.func.max(classes.HabitAggregate.month)) \
+        .filter(classes.HabitAggregate.user_id == user_id).scalar()
@@ -0,0 +1,85 @@
+"""
+Habit buckets transactions are classified into by their plaid category.
+
+Buckets are small integers so they can be stored and indexed cheaply:
+OTHER (0), COFFEE (1), LUNCH (2) and TRANSPORTATION (3).
+"""
+
+import ast
+import os
+
+OTHER, COFFEE, LUNCH, TRANSPORTATION = 0, 1, 2, 3
+BUCKETS = {"coffee": COFFEE, "lunch": LUNCH,
+           "transportation": TRANSPORTATION}
+CATEGORIES_FILE = os.path.join(os.path.dirname(__file__), "categories.json")
+
+_category_buckets = {}
+
+
+def parse_plaid_data(plaid_data):
+    """
+    Parse a string from plaid into python object
+    :param plaid_data: content of the file (str)
+    :return: list of dictionary
+    """
+    plaid_data = plaid_data.replace('\n', '')
+    data = ast.literal_eval(plaid_data)
+    return data
+
+
+def category_ids(habit_name, categories_file=CATEGORIES_FILE):
+    """
+    Return the plaid category ids of a habit, None if it is not defined
+    :param habit_name: coffee, lunch or transportation (str)
+    :param categories_file: plaid category taxonomy
+    :return: list of category ids (str)
+    """
+    if habit_name == 'coffee':
+        return ['13005047',  # Cafe
+                '13005043'  # Coffee Shop
+                ]
+    elif habit_name == 'lunch':
+        with open(categories_file) as f:
+            categories = parse_plaid_data(f.read())
+        # ids for restaurants
+        id_restaurants = [x['category_id']
+                          for x in categories['categories']
+                          if 'Restaurants' in x['hierarchy']]
+        # Ids to remove from restaurants
+        id_to_remove = ['13005001',  # winery
+                        '13005019',  # Juice Bar
+                        '13005024',  # Ice Cream
+                        '13005037',  # Distillery
+                        '13005043',  # Coffee Shop
+                        '13005047'  # Cafe
+                        ]
+        return list(set(id_restaurants).difference(set(id_to_remove)))
+    elif habit_name == 'transportation':
+        return ['22016000',  # Taxi
+                '22011000',  # Limos and Chauffeurs
+                '22006001'  # Ride share
+                ]
+    # Not defined habit
+    return None
+
+
+def category_buckets(categories_file=CATEGORIES_FILE):
+    """Return a dictionary of plaid category id (int) to habit bucket"""
+    if categories_file not in _category_buckets:
+        buckets = {}
+        for habit_name, bucket in BUCKETS.items():
+            for category_id in category_ids(habit_name, categories_file):
+                buckets[int(category_id)] = bucket
+        _category_buckets[categories_file] = buckets
+    return _category_buckets[categories_file]
+
+
+def classify(category_id):
+    """
+    Return the habit bucket of a transaction
+    :param category_id: plaid category id (int, str or None)
+    :return: habit bucket (int)
+    """
+    if category_id is None:
+        return OTHER
+    return category_buckets().get(int(category_id), OTHER)
@@ -1,85 +1,505 @@
-# import os
-# import sys
-#
-#
-# sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-#
-# from plaid_methods import methods, add_plaid_data
-# from app import classes, db
-# from plaid.api import sandbox
-# from plaid import Client
-#
-# os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///../app/test.db'
-# os.environ['PLAID_CLIENT_ID'] = '5e717f8b062e7500146bfedc'
-# os.environ['PLAID_SECRET'] = '3a807e1be3a56c9c40378286eb6cb8'
-# os.environ['PLAID_PUBLIC_KEY'] = 'fd4fdc88940c3e8ad4bdafc8e1cdb5'
-# os.environ['PLAID_ENV'] = 'sandbox'
-#
-#
-# classes.User.query.delete()
-# classes.Transaction.query.delete()
-# classes.Accounts.query.delete()
-# classes.Coin.query.delete()
-# classes.Habits.query.delete()
-# classes.PlaidItems.query.delete()
-# db.session.commit()
-#
-# client = Client(os.environ['PLAID_CLIENT_ID'],
-#                 os.environ['PLAID_SECRET'],
-#                 os.environ['PLAID_PUBLIC_KEY'],
-#                 os.environ['PLAID_ENV'])
-#
-#
-# class User():
-#     def __init__(self, fname, lname, email, phone, password):
-#         self.fname = fname
-#         self.lname = lname
-#         self.email = email
-#         self.phone = phone
-#         self.password = password
-#
-#
-# class Habit():
-#     def __init__(self, habit_name, habit_category, minute,
-#                  hour, day_of_week):
-#         self.habit_name = habit_name
-#         self.habit_category = habit_category
-#         self.minute = minute
-#         self.hour = hour
-#         self.day_of_week = day_of_week
-#
-#
-# def create_dummy_user(user, sandbox_options=None, habits=None):
-#
-#     user = classes.User(user.fname, user.lname, user.email,
-#                         user.phone, user.password)
-#     db.session.add(user)
-#     public_token = sandbox.PublicToken(client)\
-#         .create('ins_109508',
-#                 initial_products=['transactions'],
-#                 _options=sandbox_options)['public_token']
-#     response = methods.token_exchange(client, public_token)
-#     plaid = classes.PlaidItems(user=user, item_id=response['item_id'],
-#                                access_token=response['access_token'])
-#
-#     accounts = methods.get_accounts(client, user.plaid_items[0].access_token)
-#     checking_account = [
-#         account for account in accounts if account['name'] == "Checking"][0]
-#     add_plaid_data.add_accounts(
-#         [checking_account], user, user.plaid_items[0], commit=False)
-#     transactions = methods.get_transactions(
-#         client, '2019-10-01', '2019-11-01', plaid.access_token,
-#         checking_account['account_id'])
-#     print(f"Number of Transactions added: {len(transactions)}")
-#     add_plaid_data.add_transactions(transactions, user, user.accounts[0])
-#     db.session.commit()
-#
-#
-# kevin = User('Kevin', 'Loftis', 'loftiskg@gmail.com', '6154831195', '12345')
-# options_path = os.path.join(os.path.dirname(__file__), 'custom_user_1.json')
-# sandbox_options = {'override_username': 'user_custom',
-#                    'override_password': open(options_path).read()}
-#
-# # coffee_habit = Habit("Make Coffee at Home","Coffee", 0,7,'1-5')
-#
-# create_dummy_user(kevin, sandbox_options)
+"""
+Offline generator of synthetic users, for load tests and benchmarks.
+
+Creates users with a plaid item, a checking account, habits, coins,
+lottery entries and transactions, without calling plaid. The shape of a
+user's spending comes from the sandbox user in custom_user_1.json: how
+many transactions a day, the share of coffee, lunch, transportation and
+other purchases and the spread of their amounts. Each user varies around
+it. Other purchases are drawn from the plaid categories in
+categories.json, weighted by their top-level group.
+
+Rows are generated with NumPy a chunk of users at a time and written with
+bulk inserts, habit aggregates included. The same seed always generates
+the same data. The benchmarks (benchmarks/data.py) generate their users
+and transactions with the same Seeder.
+
+Usage:
+FLASK_APP=application.py flask seed-db --users 100000 [--seed 0]
+                                       [--start 2019-10-01] [--months 3]
+"""
+
+import json
+import math
+import os
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from app import classes, db
+from app.scheduler import next_fire_at, to_db, utcnow
+from scripts import habit_aggregates, habit_buckets
+
+PROFILE_FILE = os.path.join(os.path.dirname(__file__), "custom_user_1.json")
+CATEGORIES_FILE = habit_buckets.CATEGORIES_FILE
+CHUNK_SIZE = 10000
+
+# purchase kinds, recognized in the profile's descriptions by keywords
+KINDS = ["other", "coffee", "lunch", "transportation"]
+KIND_KEYWORDS = {"coffee": ["coffee", "cafe", "starbucks", "juicery"],
+                 "lunch": ["restaurant", "resturant", "deli", "burger",
+                           "kaze"],
+                 "transportation": ["clipper", "uber", "lyft", "taxi"]}
+# share of other purchases by top-level plaid category
+GROUP_WEIGHTS = {"Food and Drink": 30, "Shops": 30, "Travel": 8,
+                 "Service": 8, "Recreation": 6, "Healthcare": 5,
+                 "Transfer": 5, "Payment": 4, "Community": 2,
+                 "Bank Fees": 1, "Interest": 0.5, "Tax": 0.3,
+                 "Cash Advance": 0.2}
+TIME_ZONES = {"America/Los_Angeles": 0.3, "America/New_York": 0.4,
+              "America/Chicago": 0.2, "America/Denver": 0.1}
+# spread of the amounts of kinds with a single purchase in the profile
+DEFAULT_SIGMA = 0.5
+HABITS = [("coffee", "Coffee"), ("lunch", "Lunch"),
+          ("transportation", "Transportation")]
+DAYS_OF_WEEK = {"weekday": 0.5, "everyday": 0.3, "weekend": 0.2}
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey",
+               "Riley", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Johnson", "Nguyen", "Patel",
+              "Brown", "Kim", "Lopez", "Davis"]
+
+HabitTime = namedtuple("HabitTime", "time_hour time_minute time_day_of_week")
+
+
+def load_profile(profile_file=PROFILE_FILE):
+    """
+    Return the spending shape of the sandbox user
+    :return: dictionary of per_day, the number of transactions a day,
+    counts, the number of purchases of each kind, and mu and sigma, the
+    log-normal parameters of the amounts of each kind
+    """
+    with open(profile_file) as f:
+        transactions = json.load(f)["override_accounts"][0]["transactions"]
+    amounts = {kind: [] for kind in KINDS}
+    for transaction in transactions:
+        description = transaction["description"].lower()
+        kind = next((kind for kind, keywords in KIND_KEYWORDS.items()
+                     if any(word in description for word in keywords)),
+                    "other")
+        amounts[kind].append(math.log(transaction["amount"]))
+    days = [datetime.strptime(t["date_transacted"], "%Y-%m-%d").date()
+            for t in transactions]
+    everything = [amount for kind in KINDS for amount in amounts[kind]]
+    return dict(per_day=len(transactions) / ((max(days) - min(days)).days
+                                             + 1),
+                counts=np.array([len(amounts[kind]) for kind in KINDS]),
+                mu=np.array([np.mean(amounts[kind] or everything)
+                             for kind in KINDS]),
+                sigma=np.array([np.std(amounts[kind]) if
+                                len(amounts[kind]) > 1 else DEFAULT_SIGMA
+                                for kind in KINDS]))
+
+
+def load_categories(categories_file=CATEGORIES_FILE):
+    """
+    Return the plaid categories each kind of purchase is drawn from
+    :return: dictionary of kind to (category ids, probabilities), and
+    dictionaries of category id to merchant_category and habit bucket
+    """
+    with open(categories_file) as f:
+        categories = habit_buckets.parse_plaid_data(f.read())["categories"]
+    merchant = {int(c["category_id"]): ";".join(c["hierarchy"])
+                for c in categories}
+    buckets = {category_id: habit_buckets.classify(category_id)
+               for category_id in merchant}
+    choices = {}
+    for kind in KINDS[1:]:
+        ids = [int(c) for c in habit_buckets.category_ids(kind)]
+        choices[kind] = (np.array(ids), np.full(len(ids), 1 / len(ids)))
+    # other purchases, in no habit bucket
+    other = [c for c in categories
+             if buckets[int(c["category_id"])] == habit_buckets.OTHER]
+    group_sizes = {}
+    for c in other:
+        group_sizes[c["hierarchy"][0]] = \
+            group_sizes.get(c["hierarchy"][0], 0) + 1
+    weights = np.array([GROUP_WEIGHTS.get(c["hierarchy"][0], 0.1) /
+                        group_sizes[c["hierarchy"][0]] for c in other])
+    choices["other"] = (np.array([int(c["category_id"]) for c in other]),
+                        weights / weights.sum())
+    return choices, merchant, buckets
+
+
+def first_id(model):
+    """Return the next free primary key of a table"""
+    return (db.session.query(db.func.max(
+        model.__table__.primary_key.columns.values()[0])).scalar() or 0) + 1
+
+
+def insert(model, rows):
+    """
+    Bulk insert rows with the database driver's executemany, skipping
+    SQLAlchemy's per-row processing
+    :param model: model of the table
+    :param rows: list of dictionaries of column values, dates and times as
+    ISO strings
+    """
+    if not rows:
+        return
+    connection = db.session.connection()
+    compiled = model.__table__.insert().compile(dialect=connection.dialect,
+                                                column_keys=list(rows[0]))
+    if compiled.positional:
+        rows = [tuple(row[key] for key in compiled.positiontup)
+                for row in rows]
+    connection.connection.cursor().executemany(str(compiled), rows)
+
+
+def reset_sequences():
+    """Move postgresql id sequences past the ids inserted explicitly"""
+    if db.session.bind.dialect.name != "postgresql":
+        return
+    for model in [classes.User, classes.PlaidItems, classes.Accounts,
+                  classes.Transaction, classes.Habits, classes.Coin,
+                  classes.Lottery, classes.UserLotteryLog]:
+        table = model.__table__
+        column = table.primary_key.columns.values()[0]
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('\"{0}\"', '{1}'), "
+            "(SELECT coalesce(max({1}), 1) FROM \"{0}\"))"
+            .format(table.name, column.name))
+
+
+class Seeder:
+    """
+    Generator of synthetic users and everything they own
+
+    """
+
+    def __init__(self, seed=0, start=date(2019, 10, 1), months=3,
+                 profile=None, categories=None):
+        """
+
+        :param seed: seed of the random generator, int
+        :param start: first day of the generated activity
+        :param months: number of months of activity
+        :param profile: output of load_profile(), loaded by default
+        :param categories: output of load_categories(), loaded by default
+        """
+        self.random = np.random.default_rng(seed)
+        self.start = habit_aggregates.month_start(start)
+        self.end = habit_aggregates.add_months(self.start, months)
+        self.days = (self.end - self.start).days
+        self.months = months
+        self.profile = profile or load_profile()
+        self.choices, self.merchant, self.buckets = \
+            categories or load_categories()
+        days = [self.start + timedelta(days=day)
+                for day in range(self.days + 3)]
+        self.dates = [str(day) for day in days]
+        self.month_index = np.array(
+            [(day.year - self.start.year) * 12 + day.month -
+             self.start.month for day in days[:self.days]])
+        self.month_starts = [str(habit_aggregates.add_months(self.start,
+                                                             month))
+                             for month in range(months)]
+        self.password_hash = generate_password_hash("password")
+        self.now = utcnow()
+        self.fire_times = {}
+        self.winners = {}
+        self.total_entries = {}
+        self.counts = dict(user=0, plaid_items=0, accounts=0, habits=0,
+                           coin=0, lottery=0, user_lottery_log=0,
+                           lottery_ticket=0,
+                           transaction=0, habit_aggregate=0)
+
+    def run(self, users, chunk_size=CHUNK_SIZE):
+        """
+        Generate users a chunk at a time, committing each chunk
+        :param users: number of users
+        :return: dictionary of table name to number of inserted rows
+        """
+        if db.session.bind.dialect.name == "sqlite":
+            # scratch data, trade durability for speed
+            db.session.execute("PRAGMA synchronous = OFF")
+        lotteries = self.lotteries()
+        db.session.commit()
+        for start in range(0, users, chunk_size):
+            self.chunk(min(chunk_size, users - start), lotteries)
+            db.session.commit()
+        self.draw(lotteries)
+        reset_sequences()
+        db.session.commit()
+        return self.counts
+
+    def lotteries(self):
+        """Insert a lottery per month, the last one ends after the
+        generated activity so it is still open"""
+        lottery_id = first_id(classes.Lottery)
+        rows = []
+        for month in range(self.months):
+            start = habit_aggregates.add_months(self.start, month)
+            end = habit_aggregates.add_months(start, 2 if month ==
+                                              self.months - 1 else 1)
+            rows.append(dict(lottery_id=lottery_id + month,
+                             lottery_name="Prize {}".format(month + 1),
+                             start_date=datetime(start.year, start.month, 1),
+                             end_date=datetime(end.year, end.month, 1) -
+                             timedelta(minutes=1),
+                             category="Gift Card",
+                             cost=int(self.random.integers(5, 21))))
+        db.session.execute(classes.Lottery.__table__.insert(), rows)
+        self.counts["lottery"] += len(rows)
+        return rows
+
+    def chunk(self, count, lotteries):
+        """Insert count users and everything they own"""
+        user_ids = first_id(classes.User) + np.arange(count)
+        item_ids = first_id(classes.PlaidItems) + np.arange(count)
+        account_ids = first_id(classes.Accounts) + np.arange(count)
+        coins, suggestions = self.coins(user_ids, lotteries)
+        zones = self.random.choice(list(TIME_ZONES), size=count,
+                                   p=list(TIME_ZONES.values()))
+        self.users(user_ids, zones, coins, suggestions)
+        insert(classes.PlaidItems, [
+            dict(plaid_item_id=item_id, user_id=user_id,
+                 item_id="seed-item-{}".format(user_id),
+                 access_token="seed-access-{}".format(user_id))
+            for item_id, user_id in zip(item_ids.tolist(),
+                                        user_ids.tolist())])
+        insert(classes.Accounts, [
+            dict(account_id=account_id, user_id=user_id, plaid_id=item_id,
+                 account_plaid_id="seed-account-{}".format(user_id),
+                 account_name="Checking", account_type="depository",
+                 account_subtype="checking")
+            for account_id, user_id, item_id in zip(
+                account_ids.tolist(), user_ids.tolist(), item_ids.tolist())])
+        self.counts["plaid_items"] += count
+        self.counts["accounts"] += count
+        self.habits(user_ids, zones)
+        self.transactions(user_ids, account_ids)
+
+    def users(self, user_ids, zones, coins, suggestions):
+        """
+        Insert users, user n has the email usern@example.com and the phone
+        number n, zero padded
+        :param user_ids: array of the user ids
+        :param zones: the users' time zone names
+        :param coins: array of the users' coin balances
+        :param suggestions: array of the users' numbers of saving
+        suggestions
+        """
+        count = len(user_ids)
+        names = self.random.integers(len(FIRST_NAMES), size=(count, 2))
+        signup = self.random.integers(-30, 0, size=count)
+        users = []
+        for i, user_id in enumerate(user_ids.tolist()):
+            users.append(dict(
+                user_id=user_id, first_name=FIRST_NAMES[names[i, 0]],
+                last_name=LAST_NAMES[names[i, 1]],
+                email="user{}@example.com".format(user_id),
+                phone="{:010d}".format(user_id),
+                password_hash=self.password_hash,
+                signup_date=str(datetime.combine(
+                    self.start + timedelta(days=int(signup[i])),
+                    datetime.min.time())),
+                status="verified", timezone=str(zones[i]),
+                coins=int(coins[i]), saving_suggestions=int(suggestions[i]),
+                data_version=0))
+        insert(classes.User, users)
+        self.counts["user"] += count
+
+    def coins(self, user_ids, lotteries):
+        """
+        Insert the users' coin history and lottery entries
+        :return: arrays of the users' coin balances and number of saving
+        suggestions
+        """
+        count = len(user_ids)
+        logins = self.random.poisson(3 * self.months, size=count)
+        savings = self.random.poisson(2 * self.months, size=count)
+        balance = 10 + 2 * logins + 10 * savings
+        costs = np.array([lottery["cost"] for lottery in lotteries])
+        entries = self.random.integers(1, 4, size=(count, len(lotteries))) \
+            * (self.random.random((count, len(lotteries))) < 0.3)
+        # users never spend more coins than they earned
+        entries[(entries * costs).sum(axis=1) > balance] = 0
+        balance -= (entries * costs).sum(axis=1)
+
+        self.pick_winners(user_ids, entries, lotteries)
+        # each user's tickets follow the ones bought before them
+        offsets = np.cumsum(entries, axis=0) - entries
+        for j, lottery in enumerate(lotteries):
+            offsets[:, j] += self.total_entries.get(lottery["lottery_id"], 0)
+            self.total_entries[lottery["lottery_id"]] = \
+                self.total_entries.get(lottery["lottery_id"], 0) + \
+                int(entries[:, j].sum())
+        rows, logs, tickets = [], [], []
+        for i, user_id in enumerate(user_ids.tolist()):
+            rows.append(dict(user_id=user_id, coin_amount=10,
+                             log_date=self.dates[0],
+                             description="registration"))
+            days = self.random.integers(self.days, size=logins[i] +
+                                        savings[i]).tolist()
+            for n, day in enumerate(days):
+                login = n < logins[i]
+                rows.append(dict(user_id=user_id,
+                                 coin_amount=2 if login else 10,
+                                 log_date=self.dates[day],
+                                 description="login" if login else "saving"))
+            for j, lottery in enumerate(lotteries):
+                if entries[i, j]:
+                    logs.append(dict(user_id=user_id,
+                                     lottery_id=lottery["lottery_id"],
+                                     entries=int(entries[i, j])))
+                    tickets.append(dict(lottery_id=lottery["lottery_id"],
+                                        ticket_offset=int(offsets[i, j]),
+                                        user_id=user_id,
+                                        entries=int(entries[i, j])))
+                    rows.extend(dict(user_id=user_id,
+                                     coin_amount=-lottery["cost"],
+                                     log_date=str(lottery["start_date"]
+                                                  .date()),
+                                     description="lottery")
+                                for _ in range(entries[i, j]))
+        insert(classes.Coin, rows)
+        insert(classes.UserLotteryLog, logs)
+        insert(classes.LotteryTicket, tickets)
+        self.counts["coin"] += len(rows)
+        self.counts["user_lottery_log"] += len(logs)
+        self.counts["lottery_ticket"] += len(tickets)
+        return balance, 2 * savings
+
+    def pick_winners(self, user_ids, entries, lotteries):
+        """Keep a winner of each lottery among the entrants seen so far,
+        chosen with a chance proportional to their entries (weighted
+        reservoir sampling)"""
+        keys = self.random.random(entries.shape) ** \
+            (1 / np.maximum(entries, 1))
+        keys[entries == 0] = -1
+        for j, lottery in enumerate(lotteries):
+            best = int(keys[:, j].argmax())
+            if keys[best, j] > self.winners.get(lottery["lottery_id"],
+                                                (-1, None))[0]:
+                self.winners[lottery["lottery_id"]] = (keys[best, j],
+                                                       int(user_ids[best]))
+
+    def habits(self, user_ids, zones):
+        """Insert zero to three habits per user"""
+        numbers = self.random.choice(4, size=len(user_ids),
+                                     p=[0.2, 0.5, 0.2, 0.1])
+        rows = []
+        for i, user_id in enumerate(user_ids.tolist()):
+            for habit in self.random.permutation(len(HABITS))[:numbers[i]]:
+                habit_name, habit_category = HABITS[habit]
+                time = HabitTime(
+                    int(self.random.integers(7, 21)),
+                    int(self.random.choice([0, 15, 30, 45])),
+                    str(self.random.choice(list(DAYS_OF_WEEK),
+                                           p=list(DAYS_OF_WEEK.values()))))
+                rows.append(dict(user_id=user_id, habit_name=habit_name,
+                                 habit_category=habit_category,
+                                 time_hour=time.time_hour,
+                                 time_minute=time.time_minute,
+                                 time_day_of_week=time.time_day_of_week,
+                                 next_fire_at=self.fire_at(time, zones[i])))
+        insert(classes.Habits, rows)
+        self.counts["habits"] += len(rows)
+
+    def fire_at(self, time, zone):
+        """Return the next reminder of a habit time, computed once per
+        time and time zone"""
+        key = time + (zone,)
+        if key not in self.fire_times:
+            fire_at = next_fire_at(time, self.now,
+                                   classes.time_zone(str(zone)))
+            self.fire_times[key] = str(to_db(fire_at))
+        return self.fire_times[key]
+
+    def transactions(self, user_ids, account_ids, per_user=None):
+        """
+        Insert the users' transactions and their habit aggregates
+        :param user_ids: array of the user ids
+        :param account_ids: array of the users' account ids
+        :param per_user: array of the number of transactions of each user,
+        drawn from the profile's rate by default
+        """
+        profile = self.profile
+        count = len(user_ids)
+        if per_user is None:
+            # each user buys more or less often than the profile
+            rates = profile["per_day"] * self.random.lognormal(0, 0.5,
+                                                               count)
+            per_user = self.random.poisson(rates * self.days)
+        # with their own mix of kinds
+        shares = self.random.dirichlet(profile["counts"] + 1, size=count)
+        owner = np.repeat(np.arange(count), per_user)
+        total = len(owner)
+        kind = (self.random.random(total)[:, None] >
+                np.cumsum(shares, axis=1)[owner][:, :-1]).sum(axis=1)
+        category = np.empty(total, dtype=np.int64)
+        for k, name in enumerate(KINDS):
+            mask = kind == k
+            ids, p = self.choices[name]
+            category[mask] = self.random.choice(ids, size=mask.sum(), p=p)
+        cents = np.maximum(50, np.rint(100 * np.exp(
+            profile["mu"][kind] + profile["sigma"][kind] *
+            self.random.standard_normal(total)))).astype(np.int64)
+        day = self.random.integers(self.days, size=total)
+        posted = day + self.random.integers(0, 3, size=total)
+        bucket = np.array([self.buckets[c] for c in category.tolist()],
+                          dtype=np.int64)
+
+        rows = [dict(user_id=user_id, account_id=account_id,
+                     trans_amount_cents=c, category_id=category_id,
+                     trans_date=self.dates[d], post_date=self.dates[p],
+                     merchant_category=self.merchant[category_id],
+                     habit_bucket=b)
+                for user_id, account_id, c, category_id, d, p, b in zip(
+                    user_ids[owner].tolist(), account_ids[owner].tolist(),
+                    cents.tolist(), category.tolist(), day.tolist(),
+                    posted.tolist(), bucket.tolist())]
+        for start in range(0, total, CHUNK_SIZE * 10):
+            insert(classes.Transaction, rows[start:start + CHUNK_SIZE * 10])
+        self.counts["transaction"] += total
+        self.aggregates(user_ids[owner], bucket, day, cents)
+
+    def aggregates(self, user_ids, bucket, day, cents):
+        """Insert the habit aggregates of transactions"""
+        weekday = (self.start.weekday() + day) % 7
+        month = self.month_index[day]
+        keys = np.stack([user_ids, bucket, month, weekday], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        trans_count = np.bincount(inverse, minlength=len(groups))
+        amount = np.zeros(len(groups), dtype=np.int64)
+        np.add.at(amount, inverse, cents)
+        squared = np.zeros(len(groups), dtype=np.int64)
+        np.add.at(squared, inverse, cents * cents)
+        rows = [dict(user_id=user_id, habit_bucket=b,
+                     month=self.month_starts[m],
+                     weekday=w, trans_count=n, amount_cents=a,
+                     amount_cents_squared=s)
+                for (user_id, b, m, w), n, a, s in zip(
+                    groups.tolist(), trans_count.tolist(), amount.tolist(),
+                    squared.tolist())]
+        insert(classes.HabitAggregate, rows)
+        self.counts["habit_aggregate"] += len(rows)
+
+    def draw(self, lotteries):
+        """Set the entry totals of the lotteries and the winners of the ones
+        that ended"""
+        for lottery in lotteries:
+            values = dict(total_entries=self.total_entries.get(
+                lottery["lottery_id"], 0))
+            if lottery["end_date"].date() < self.end:
+                values["winner_user_id"] = self.winners.get(
+                    lottery["lottery_id"], (-1, -1))[1]
+            classes.Lottery.query.filter_by(id=lottery["lottery_id"]) \
+                .update(values)
+
+
+def seed(users, seed=0, start=date(2019, 10, 1), months=3,
+         chunk_size=CHUNK_SIZE):
+    """
+    Generate synthetic users into the database
+    :param users: number of users
+    :param seed: seed of the random generator, int
+    :param start: first day of the generated activity
+    :param months: number of months of activity
+    :param chunk_size: number of users generated and committed at a time
+    :return: dictionary of table name to number of inserted rows
+    """
+    return Seeder(seed, start, months).run(users, chunk_size)
@@ -0,0 +1,42 @@
+"""
+Query budgets for route tests.
+
+    with query_budget(5):
+        self.app.get('/dashboard')
+
+fails the test when the block runs more than 5 SQL statements and lists
+them, so a lazy load per row (N+1) shows up in the test that introduces
+it instead of in production.
+"""
+
+import contextlib
+
+from sqlalchemy import event
+
+from app import db
+
+
+@contextlib.contextmanager
+def query_budget(budget):
+    """
+    Fail when the block runs more SQL statements than budget
+    :param budget: largest number of statements allowed
+    :return: the list of statements run so far, for inspection
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()))
+
+    engines = list(db.engines) or [db.engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+    if len(statements) > budget:
+        raise AssertionError(
+            "{} SQL statements over a budget of {}:\n{}".format(
+                len(statements), budget, "\n".join(statements)))
@@ -0,0 +1,167 @@
+from app import create_app, classes, db
+import csv
+import io
+import json
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+from sqlalchemy import event
+
+
+application = create_app()
+
+
+class TestApi(unittest.TestCase):
+    """Class for testing the paginated history API"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158675309', 'password')
+        other = classes.User('Other', 'Last', 'other@test.com',
+                             '6158675310', 'password')
+        self.start = date(2020, 3, 1)
+        for i in range(7):
+            # two transactions per day, so the cursor has to break ties
+            day = self.start + timedelta(days=i // 2)
+            db.session.add(classes.Transaction(user=self.user,
+                                               trans_amount=i,
+                                               category_id=i % 2,
+                                               trans_date=day))
+            db.session.add(classes.Coin(user=self.user, coin_amount=i,
+                                        log_date=day,
+                                        description='login'))
+        db.session.add(classes.Transaction(user=other, trans_amount=1,
+                                           trans_date=self.start))
+        db.session.add(classes.Coin(user=other, coin_amount=1,
+                                    log_date=self.start,
+                                    description='login'))
+        db.session.commit()
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+        self.app_context.pop()
+
+    def pages(self, url):
+        """Follow next_cursor from url and return the list of pages"""
+        pages, cursor = [], None
+        while True:
+            query = url + ('&cursor=' + cursor if cursor else '')
+            data = self.app.get(query).get_json()
+            pages.append(data['items'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return pages
+
+    def plan(self, url, table):
+        """Return the query plan of the page of table url reads"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context,
+                   executemany):
+            if 'FROM {} '.format(table) in statement and 'LIMIT' in statement:
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            self.assertEqual(self.app.get(url).status_code, 200)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        statement, parameters = statements[-1]
+        return ' '.join(str(row) for row in db.engine.execute(
+            'EXPLAIN QUERY PLAN ' + statement, parameters))
+
+    def test_filters_use_indexes(self):
+        for url, table, index in [
+                ('/api/coins?start_date=2020-03-02', 'coin',
+                 'ix_coin_user_id_log_date'),
+                ('/api/coins?description=login&end_date=2020-03-02',
+                 'coin', 'ix_coin_user_id_description'),
+                ('/api/transactions?end_date=2020-03-02', '"transaction"',
+                 'ix_transaction_user_id_trans_date'),
+                ('/api/transactions?category_id=1', '"transaction"',
+                 'ix_transaction_user_id_category_id'),
+                ('/api/transactions?account_id=1&cursor=2020-03-02_5',
+                 '"transaction"', 'ix_transaction_user_id_account_id')]:
+            plan = self.plan(url, table)
+            self.assertIn(index, plan, url)
+            # the pages are read in index order, never sorted
+            self.assertNotIn('TEMP B-TREE', plan, url)
+
+    def test_coins_pagination(self):
+        # logging in awarded a coin today, leave it out
+        pages = self.pages('/api/coins?limit=3&end_date=2020-03-31')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        amounts = [coin['coin_amount'] for page in pages for coin in page]
+        self.assertEqual(amounts, [6, 5, 4, 3, 2, 1, 0])
+
+    def test_transactions_pagination(self):
+        pages = self.pages('/api/transactions?limit=2')
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        items = [t for page in pages for t in page]
+        self.assertEqual([t['trans_amount'] for t in items],
+                         ['6.00', '5.00', '4.00', '3.00', '2.00', '1.00',
+                          '0.00'])
+
+    def test_transactions_filters(self):
+        end_date = (self.start + timedelta(days=1)).isoformat()
+        data = self.app.get('/api/transactions?category_id=1&end_date='
+                            + end_date).get_json()
+        self.assertEqual([t['trans_amount'] for t in data['items']],
+                         ['3.00', '1.00'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_parameters(self):
+        response = self.app.get('/api/transactions?cursor=yesterday')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/api/coins?start_date=03/01/2020')
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_csv(self):
+        with mock.patch('app.api.EXPORT_CHUNK_SIZE', 3):
+            response = self.app.get('/api/transactions/export')
+            self.assertTrue(response.is_streamed)
+            rows = list(csv.DictReader(io.StringIO(
+                response.get_data(as_text=True))))
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual([row['trans_amount'] for row in rows],
+                         ['0.00', '1.00', '2.00', '3.00', '4.00', '5.00',
+                          '6.00'])
+        self.assertEqual(rows[0]['trans_date'], '2020-03-01')
+
+    def test_export_ndjson(self):
+        response = self.app.get('/api/transactions/export?format=ndjson'
+                                '&start_date=2020-03-02&end_date=2020-03-02')
+        rows = [json.loads(line)
+                for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['trans_amount'] for row in rows],
+                         ['2.00', '3.00'])
+        response = self.app.get('/api/transactions/export?format=xlsx')
+        self.assertEqual(response.status_code, 400)
+
+    def test_find_insights_redirects_to_export(self):
+        response = self.app.get('/find_insights?format=ndjson')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/api/transactions/export', response.location)
+
+
+if __name__ == "__main__":
+    unittest.main()
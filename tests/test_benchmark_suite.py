@@ -0,0 +1,34 @@
+from benchmarks import suite
+import unittest
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """Class for testing the benchmark suite runs and comparison"""
+
+    def test_parse_scale(self):
+        self.assertEqual(suite.parse_scale('1k'), 1000)
+        self.assertEqual(suite.parse_scale('1M'), 1000000)
+        self.assertEqual(suite.parse_scale('250'), 250)
+
+    def test_run(self):
+        result = suite.run(['200'], runs=1)
+        self.assertEqual(sorted(result['scales']['200']),
+                         ['add_transactions', 'dashboard', 'insights',
+                          'lottery_drawing', 'receive_message',
+                          'send_message'])
+        for timings in result['scales']['200'].values():
+            self.assertGreater(timings['median_ms'], 0)
+
+    def test_compare(self):
+        baseline = {'scales': {'1k': {'dashboard': {'median_ms': 10},
+                                      'insights': {'median_ms': 0.2}}}}
+        result = {'scales': {'1k': {'dashboard': {'median_ms': 14},
+                                    'insights': {'median_ms': 0.9},
+                                    'send_message': {'median_ms': 5}}}}
+        self.assertEqual(suite.compare(result, baseline),
+                         [('1k', 'dashboard', 10, 14)])
+        self.assertEqual(suite.compare(result, baseline, tolerance=0.5), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+from app import create_app, db
+from app.database import TimedQueuePool, engine_options, _track_pool
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine, exc
+
+
+application = create_app()
+
+
+class TestDatabase(unittest.TestCase):
+    """Class for testing the engine and connection pool setup"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine('sqlite:///' + self.path,
+                                    poolclass=TimedQueuePool, pool_size=1,
+                                    max_overflow=0, pool_timeout=0.1)
+        self.stats = _track_pool(self.engine)
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        self.engine.dispose()
+        os.remove(self.path)
+
+    def test_engine_options(self):
+        config = dict(application.config,
+                      SQLALCHEMY_DATABASE_URI='postgresql://u:p@host/db',
+                      DB_POOL_SIZE=3, DB_STATEMENT_TIMEOUT_MS=500)
+        options = engine_options(config)
+        self.assertIs(options['poolclass'], TimedQueuePool)
+        self.assertEqual(options['pool_size'], 3)
+        self.assertEqual(options['connect_args'],
+                         {'options': '-c statement_timeout=500'})
+        config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.assertEqual(engine_options(config), {})
+
+    def test_checkout_stats(self):
+        connection = self.engine.connect()
+        with self.assertRaises(exc.TimeoutError):
+            self.engine.connect()
+        connection.close()
+        stats = self.stats.as_dict()
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['checkins'], 1)
+        self.assertEqual(stats['waits'], 2)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreater(stats['max_wait_seconds'], 0.05)
+
+    def test_connection_from_parent_process_is_replaced(self):
+        connection = self.engine.connect()
+        record = connection.connection._connection_record
+        connection.close()
+        record.info['pid'] = -1
+        self.engine.connect().close()
+        stats = self.stats.as_dict()
+        self.assertEqual(stats['invalidated'], 1)
+        self.assertEqual(stats['connects'], 2)
+
+    def test_pool_stats_route(self):
+        with application.app_context():
+            db.engine
+        client = application.test_client()
+        # answered as an unknown page, redirected to the index
+        self.assertEqual(client.get('/pool_stats').status_code, 302)
+        application.config['PROFILE_TOKEN'] = 'secret'
+        try:
+            for headers in [{}, {'Authorization': 'Bearer wrong'},
+                            {'X-Profile': 'secret'}]:
+                response = client.get('/pool_stats', headers=headers)
+                self.assertEqual(response.status_code, 302)
+            response = client.get('/pool_stats',
+                                  headers={'Authorization': 'Bearer secret'})
+        finally:
+            application.config['PROFILE_TOKEN'] = None
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('checkouts', list(response.get_json().values())[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
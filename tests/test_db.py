@@ -1,7 +1,11 @@
-from app import application, classes, db
+from app import create_app, classes, db
 import os
 import unittest
 from datetime import datetime
+from decimal import Decimal
+
+
+application = create_app()
 
 
 class TestDB(unittest.TestCase):
@@ -15,6 +19,8 @@ class TestDB(unittest.TestCase):
         application.config['TESTING'] = True
         application.config['WTF_CSRF_ENABLED'] = False
         application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
         db.drop_all()
         db.create_all()
 
@@ -24,6 +30,7 @@ class TestDB(unittest.TestCase):
         This is executed after each test.
         """
         db.session.remove()
+        self.app_context.pop()
 
     ####################################################################
     # Database Tests
@@ -112,6 +119,8 @@ class TestDB(unittest.TestCase):
         self.assertEqual(trans.account_id, account.id, msg="check account id")
         self.assertEqual(str(trans.trans_amount), "123.45",
                          msg="check transaction amount")
+        self.assertEqual(trans.trans_amount_cents, 12345,
+                         msg="check transaction amount in cents")
         self.assertEqual(trans.category_id, 12345678, msg="check category id")
         self.assertEqual(trans.is_preferred_saving, "Yes",
                          msg="check if it is a preferred saving category")
@@ -199,6 +208,42 @@ class TestDB(unittest.TestCase):
         self.assertEqual(coin.description, "login",
                          msg="check coin description")
 
+    def test_amounts_in_cents(self):
+        for amount in [0.1, 1.005, "19.99", Decimal("-2.50"), 7]:
+            db.session.add(classes.Transaction(
+                trans_amount=amount, trans_date=datetime(2020, 1, 1)))
+        db.session.commit()
+        transaction = classes.Transaction
+        self.assertEqual(
+            db.session.query(transaction.trans_amount_cents)
+            .order_by(transaction.id).all(),
+            [(10,), (101,), (1999,), (-250,), (700,)])
+        self.assertEqual(
+            db.session.query(transaction.trans_amount)
+            .order_by(transaction.id).all(),
+            [(Decimal("0.10"),), (Decimal("1.01"),), (Decimal("19.99"),),
+             (Decimal("-2.50"),), (Decimal("7.00"),)])
+        # amounts in dollars are compared to the cents column
+        query = transaction.query.filter(transaction.trans_amount > 1)
+        self.assertIn("trans_amount_cents >", str(query))
+        self.assertEqual(query.count(), 3)
+        self.assertEqual(transaction.query.filter(
+            transaction.trans_amount.in_([0.1, "7"])).count(), 2)
+        self.assertEqual(transaction.query.filter_by(
+            trans_amount=Decimal("19.99")).delete(), 1)
+        self.assertEqual(db.session.query(
+            db.func.sum(transaction.trans_amount_cents)).scalar(), 561)
+
+        saving = classes.SavingsHistory(savings_amount=1, total_savings=2,
+                                        transfer_date=datetime(2020, 1, 1),
+                                        update_date=datetime(2020, 1, 1))
+        saving.predicted_savings = None
+        db.session.add(saving)
+        db.session.commit()
+        self.assertEqual((saving.savings_amount_cents,
+                          saving.total_savings_cents,
+                          saving.predicted_savings), (100, 200, None))
+
 
 if __name__ == "__main__":
     unittest.main()
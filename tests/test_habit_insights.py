@@ -0,0 +1,232 @@
+from app import create_app, classes, db
+from plaid_methods import add_plaid_data
+from scripts import habit_aggregates, habit_buckets
+from scripts.extract_habit import Insights
+from tests.query_budget import query_budget
+import statistics
+import unittest
+from datetime import date
+
+
+application = create_app()
+
+
+def plaid_transaction(day, amount, category_id):
+    """Return a transaction as returned by the plaid api"""
+    return {'date': day, 'authorized_date': day, 'amount': amount,
+            'category': ['Food and Drink', 'Restaurants'],
+            'category_id': category_id,
+            'location': {'address': None, 'city': None, 'region': None,
+                         'country': None, 'postal_code': None,
+                         'lon': None, 'lat': None}}
+
+
+class TestHabitInsights(unittest.TestCase):
+    """Class for testing habit buckets, aggregates and Insights"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158675309', 'password')
+        item = classes.PlaidItems(user=self.user, item_id='item',
+                                  access_token='token')
+        self.account = classes.Accounts(user=self.user, plaid_item=item,
+                                        account_plaid_id='account')
+        db.session.add(self.user)
+        db.session.commit()
+
+        # coffee every day of December 2018 and 2019 (4.00 and 5.00), a
+        # lunch and a taxi in November 2019
+        transactions = [plaid_transaction('2019-11-05', 12.5, '13005000'),
+                        plaid_transaction('2019-11-06', 20, '22016000')]
+        for year, amount in [(2018, 4), (2019, 5)]:
+            transactions += [plaid_transaction(
+                '{}-12-{:02d}'.format(year, day), amount, '13005043')
+                for day in range(1, 32)]
+        add_plaid_data.add_transactions(transactions, self.user,
+                                        self.account)
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+        self.app_context.pop()
+
+    def test_classify(self):
+        self.assertEqual(habit_buckets.classify('13005043'),
+                         habit_buckets.COFFEE)
+        self.assertEqual(habit_buckets.classify(13005000),
+                         habit_buckets.LUNCH)
+        self.assertEqual(habit_buckets.classify('22016000'),
+                         habit_buckets.TRANSPORTATION)
+        self.assertEqual(habit_buckets.classify(None), habit_buckets.OTHER)
+
+    def test_ingestion_sets_habit_bucket(self):
+        buckets = dict(db.session.query(classes.Transaction.trans_date,
+                                        classes.Transaction.habit_bucket)
+                       .filter(classes.Transaction.trans_date <
+                               date(2019, 12, 1)))
+        self.assertEqual(buckets[date(2019, 11, 5)], habit_buckets.LUNCH)
+        self.assertEqual(buckets[date(2019, 11, 6)],
+                         habit_buckets.TRANSPORTATION)
+        self.assertEqual(buckets[date(2018, 12, 1)], habit_buckets.COFFEE)
+
+    def test_month_arithmetic(self):
+        self.assertEqual(habit_aggregates.add_months(date(2019, 12, 1), 1),
+                         date(2020, 1, 1))
+        self.assertEqual(habit_aggregates.add_months(date(2019, 1, 1), -12),
+                         date(2018, 1, 1))
+
+    def test_ingestion_updates_aggregates(self):
+        summary = habit_aggregates.summarize(
+            self.user.id, habit_buckets.COFFEE, date(2019, 12, 1))
+        self.assertEqual(summary['trans_count'], 31)
+        self.assertEqual(summary['amount_cents'], 31 * 500)
+        self.assertEqual(summary['amount_cents_squared'], 31 * 500 * 500)
+        # December 2019 started on a Sunday
+        self.assertEqual(summary['per_weekday'], [5, 5, 4, 4, 4, 4, 5])
+
+        add_plaid_data.add_transactions(
+            [plaid_transaction('2019-12-02', 3, '13005043')], self.user,
+            self.account)
+        summary = habit_aggregates.summarize(
+            self.user.id, habit_buckets.COFFEE, date(2019, 12, 1))
+        self.assertEqual(summary['trans_count'], 32)
+        self.assertEqual(summary['per_weekday'][0], 6)
+
+    def test_aggregate_row_created_meanwhile(self):
+        user_id = self.user.id
+        key = (habit_buckets.LUNCH, date(2020, 2, 1), 0)
+        totals = {key: [1, 300, 90000]}
+        # another ingestion creates the row of the new month first
+        db.engine.execute(classes.HabitAggregate.__table__.insert().values(
+            user_id=user_id, habit_bucket=key[0], month=key[1],
+            weekday=key[2], trans_count=1, amount_cents=300,
+            amount_cents_squared=90000))
+        habit_aggregates.add(user_id, totals)
+        # and a row nobody created yet
+        habit_aggregates.add(user_id, {key[:2] + (1,): [1, 100, 10000]})
+        db.session.commit()
+        summary = habit_aggregates.summarize(user_id, habit_buckets.LUNCH,
+                                             date(2020, 2, 1))
+        self.assertEqual(summary['trans_count'], 3)
+        self.assertEqual(summary['amount_cents'], 700)
+        self.assertEqual(summary['per_weekday'][:2], [2, 1])
+
+    def test_december_insights(self):
+        insights = Insights(self.user.id, date(2019, 12, 1), 'coffee', 8)
+        self.assertEqual(insights.end_date, date(2020, 1, 1))
+        self.assertEqual(insights.num, 31)
+        self.assertEqual(insights.tot_amount, 155)
+        self.assertEqual(insights.avg_amount, 5)
+        self.assertEqual(insights.med_amount, 5)
+        self.assertEqual(insights.std_amount, 0)
+        self.assertEqual(insights.recommended, 25)
+        self.assertEqual(insights.period_label, 'in December 2019')
+        self.assertIsNone(
+            Insights(self.user.id, date(2019, 12, 1), 'lunch', 6).summary)
+
+    def test_projected_saving(self):
+        self.assertEqual(Insights.projected_saving(31, 5, 1), (25, 360))
+
+    def test_insights_from_aggregates(self):
+        amounts = [3.1, 4.25, 2, 7.8, 4.25, 12.05, 2.5]
+        add_plaid_data.add_transactions(
+            [plaid_transaction('2020-01-{:02d}'.format(day), amount,
+                               '13005043')
+             for day, amount in enumerate(amounts, 1)], self.user,
+            self.account)
+        user_id = self.user.id
+        with query_budget(2) as statements:
+            insights = Insights(user_id, date(2020, 1, 1), 'coffee', 1)
+        cents = [round(amount * 100) for amount in amounts]
+        self.assertEqual(insights.num, 7)
+        self.assertEqual(insights.tot_amount, round(sum(cents) / 100, 2))
+        self.assertEqual(insights.avg_amount,
+                         round(statistics.mean(cents) / 100, 2))
+        self.assertEqual(insights.med_amount, 4.25)
+        self.assertEqual(insights.std_amount,
+                         round(statistics.pstdev(cents) / 100, 2))
+        # the median reads the habit's transactions on their index
+        self.assertIn('trans_amount_cents', statements[-1])
+        plan = db.session.execute(
+            'EXPLAIN QUERY PLAN ' + str(db.session.query(
+                classes.Transaction.trans_amount_cents)
+                .filter(classes.Transaction.user_id == 1,
+                        classes.Transaction.habit_bucket == 1,
+                        classes.Transaction.trans_date >= '2020-01-01',
+                        classes.Transaction.trans_date < '2020-02-01')
+                .statement.compile(db.engine,
+                                   compile_kwargs={'literal_binds': True})))
+        self.assertIn('ix_transaction_user_id_habit_bucket',
+                      ' '.join(str(row) for row in plan))
+
+        amounts.remove(12.05)
+        classes.Transaction.query.filter_by(trans_amount=12.05).delete()
+        habit_aggregates.rebuild(self.user.id)
+        insights = Insights(self.user.id, date(2020, 1, 1), 'coffee', 1)
+        # even count, the mean of the middle two
+        self.assertEqual(insights.med_amount,
+                         round(statistics.median(amounts), 2))
+
+    def test_rolling_and_year_over_year(self):
+        insights = Insights(self.user.id, date(2019, 10, 1), 'coffee', 8,
+                            months=3)
+        self.assertEqual(insights.num, 31)
+        self.assertEqual(insights.period_label,
+                         'from October 2019 to December 2019')
+        insights = Insights(self.user.id, date(2019, 12, 1), 'coffee', 8)
+        previous = insights.compare_year_over_year()
+        self.assertEqual(previous.tot_amount, 124)
+        self.assertEqual(previous.period_label, 'in December 2018')
+
+    def test_delete_subtracts_aggregates(self):
+        other = classes.Accounts(user=self.user, account_plaid_id='other')
+        db.session.add(other)
+        db.session.add(classes.Transaction(
+            user=self.user, account=other, trans_amount=2,
+            trans_date=date(2019, 12, 2),
+            habit_bucket=habit_buckets.COFFEE))
+        db.session.commit()
+        habit_aggregates.rebuild(self.user.id)
+        db.session.commit()
+        add_plaid_data.delete_transactions(self.account.id)
+        db.session.commit()
+        row, = classes.HabitAggregate.query.all()
+        self.assertEqual((row.habit_bucket, row.month, row.trans_count,
+                          row.amount_cents),
+                         (habit_buckets.COFFEE, date(2019, 12, 1), 1, 200))
+
+    def test_dashboard_insights_periods(self):
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+        data = self.app.get('/dashboard/insights').get_json()
+        self.assertEqual(data['month'], '2019-12-01')
+        self.assertEqual([i['habit_name'] for i in data['insights']],
+                         ['coffee'])
+        data = self.app.get('/dashboard/insights?period=yoy').get_json()
+        self.assertEqual(data['insights'][0]['previous_tot_amount'], 124)
+        data = self.app.get('/dashboard/insights?period=12m&month=2019-12') \
+            .get_json()
+        self.assertEqual(data['month'], '2019-01-01')
+        self.assertEqual(data['insights'], [])
+        response = self.app.get('/dashboard/insights?period=week')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+from benchmarks import import_time
+import os
+import sys
+import unittest
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime needs python 3.7")
+class TestImportTime(unittest.TestCase):
+    """Class for testing the import time of the app"""
+
+    def test_lazy_imports(self):
+        budget = import_time.load_budget()
+        elapsed_ms, imported = import_time.measure(budget['module'], runs=1)
+        self.assertIn('app.routes', imported)
+        self.assertEqual(import_time.check(budget, elapsed_ms, imported,
+                                           timed=False), [])
+
+    # wall clock, it flakes on a loaded host
+    @unittest.skipUnless(os.environ.get('IMPORT_BUDGET') == '1',
+                         "set IMPORT_BUDGET=1 to check the import time")
+    def test_import_within_budget(self):
+        budget = import_time.load_budget()
+        elapsed_ms, imported = import_time.measure(budget['module'])
+        self.assertEqual(import_time.check(budget, elapsed_ms, imported), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+from benchmarks import load
+import unittest
+
+
+class TestLoad(unittest.TestCase):
+    """Class for testing the load test harness"""
+
+    def test_parse_mix(self):
+        self.assertEqual(load.parse_mix('replies'),
+                         dict(receive_message=10, dashboard=1))
+        self.assertEqual(load.parse_mix('login=1, dashboard=2.5'),
+                         dict(login=1, dashboard=2.5))
+        with self.assertRaises(ValueError):
+            load.parse_mix('checkout=1')
+
+    def test_summarize(self):
+        samples = [('dashboard', i / 1000, i != 100)
+                   for i in range(1, 101)]
+        report = load.summarize(samples, 2)
+        self.assertEqual(list(report), ['dashboard'])
+        self.assertEqual(report['dashboard']['requests'], 100)
+        self.assertEqual(report['dashboard']['errors'], 1)
+        self.assertEqual(report['dashboard']['throughput_rps'], 50)
+        self.assertEqual(report['dashboard']['p50_ms'], 50)
+        self.assertEqual(report['dashboard']['p99_ms'], 99)
+        self.assertEqual(report['dashboard']['max_ms'], 100)
+
+    def test_run(self):
+        result = load.run(count=20, workers=2, duration=0.3,
+                          mixes=load.ROUTES, speed=600, sms_rate=1000,
+                          twilio_latency=0, plaid_latency=0)
+        for route, phase in zip(load.ROUTES, result['phases']):
+            self.assertEqual(list(phase['report']), [route])
+            self.assertGreater(phase['report'][route]['requests'], 0)
+            self.assertEqual(phase['report'][route]['errors'], 0)
+        self.assertGreater(result['texts_sent'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
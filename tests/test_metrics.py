@@ -0,0 +1,91 @@
+from app import create_app, classes, db, metrics, sms
+import unittest
+from unittest import mock
+
+
+application = create_app()
+
+
+class TestMetrics(unittest.TestCase):
+    """Class for testing the request, SQL and external call metrics"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+        db.session.add(classes.User('First', 'Last', 'test@test.com',
+                                    '6158675309', 'password'))
+        db.session.commit()
+        metrics.reset()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        application.config['SLOW_QUERY_MS'] = metrics.SLOW_QUERY_MS
+        db.session.remove()
+        self.app_context.pop()
+
+    def test_route_metrics(self):
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+        self.app.get('/dashboard')
+        self.assertEqual(metrics.REQUEST_LATENCY.count(
+            endpoint='main.dashboard', method='GET', status='200'), 1)
+        self.assertEqual(metrics.REQUEST_STATEMENTS.count(
+            endpoint='main.dashboard'), 1)
+        self.assertGreater(metrics.SQL_STATEMENTS.value(
+            endpoint='main.dashboard'), 0)
+        self.assertGreater(metrics.SQL_SECONDS.value(
+            endpoint='main.dashboard'), 0)
+
+        # answered as an unknown page, redirected to the index
+        self.assertEqual(self.app.get('/metrics').status_code, 302)
+        application.config['PROFILE_TOKEN'] = 'secret'
+        try:
+            self.assertEqual(self.app.get(
+                '/metrics', headers={'Authorization': 'Bearer wrong'})
+                .status_code, 302)
+            response = self.app.get(
+                '/metrics', headers={'Authorization': 'Bearer secret'})
+        finally:
+            application.config['PROFILE_TOKEN'] = None
+        self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="main.'
+                      'dashboard",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="main.'
+                      'dashboard",method="GET",status="200",le="+Inf"} 1',
+                      text)
+        self.assertIn('sql_statements_total{endpoint="main.login"}', text)
+
+    def test_slow_query_log(self):
+        application.config['SLOW_QUERY_MS'] = 0
+        with self.assertLogs('app.slow_query', level='WARNING') as logs:
+            classes.User.query.count()
+        self.assertIn('in background: SELECT count(*)', logs.output[0])
+        self.assertEqual(metrics.SLOW_STATEMENTS.value(
+            endpoint=metrics.BACKGROUND), 1)
+
+    def test_external_calls(self):
+        with mock.patch('app.sms.client'):
+            sms.send('6158675309', 'Hello')
+        self.assertEqual(metrics.EXTERNAL_LATENCY.count(
+            service='twilio', operation='messages_create'), 1)
+        self.assertGreater(metrics.EXTERNAL_SECONDS.value(
+            endpoint=metrics.BACKGROUND, service='twilio'), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
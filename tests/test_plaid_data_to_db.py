@@ -2,11 +2,14 @@ import unittest
 import os
 from datetime import datetime
 from plaid_methods import add_plaid_data, methods
-from app import application, db, classes
+from app import create_app, db, classes
 from plaid import Client
 from plaid.api import sandbox
 
 
+application = create_app()
+
+
 ENV_VARS = {
     "PLAID_CLIENT_ID": os.environ["PLAID_CLIENT_ID"],
     "PLAID_PUBLIC_KEY": os.environ["PLAID_PUBLIC_KEY"],
@@ -27,6 +30,8 @@ class TestDataToDB(unittest.TestCase):
         application.config['TESTING'] = True
         application.config['WTF_CSRF_ENABLED'] = False
         application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
         self.app = application.test_client()
         # setup plaid client
         self.client = Client(
@@ -59,6 +64,7 @@ class TestDataToDB(unittest.TestCase):
         This is executed after each test.
         """
         db.session.remove()
+        self.app_context.pop()
 
     ####################################################################
     # Add data to Database Tests
@@ -153,6 +159,33 @@ class TestDataToDB(unittest.TestCase):
                          transactions[0]['category_id'],
                          msg="check category id")
 
+    def test_delete_transactions(self):
+        """Test if transactions of an account are deleted in chunks
+        """
+        accounts = [classes.Accounts(user=self.test_user,
+                                     plaid_item=self.test_item,
+                                     account_plaid_id=str(i))
+                    for i in range(2)]
+        for account in accounts:
+            for _ in range(5):
+                db.session.add(classes.Transaction(user=self.test_user,
+                                                   account=account,
+                                                   trans_amount=1,
+                                                   trans_date=datetime.now()))
+        db.session.commit()
+        deleted = add_plaid_data.delete_transactions(accounts[0].id,
+                                                     chunk_size=2)
+        self.assertEqual(deleted, 5)
+        # the caller commits
+        db.session.rollback()
+        self.assertEqual(classes.Transaction.query.count(), 10)
+        add_plaid_data.delete_transactions(accounts[0].id, chunk_size=2)
+        db.session.commit()
+        self.assertEqual(classes.Transaction.query.filter_by(
+            account_id=accounts[0].id).count(), 0)
+        self.assertEqual(classes.Transaction.query.filter_by(
+            account_id=accounts[1].id).count(), 5)
+
 
 if __name__ == "__main__":
     unittest.main()
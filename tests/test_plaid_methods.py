@@ -1,5 +1,5 @@
 from plaid.errors import PlaidError
-from app import application, classes, db
+from app import create_app, classes, db
 import os
 import unittest
 import flask
@@ -8,6 +8,9 @@ from plaid import Client
 from plaid.api import sandbox
 
 
+application = create_app()
+
+
 ENV_VARS = {
     "PLAID_CLIENT_ID": os.environ["PLAID_CLIENT_ID"],
     "PLAID_PUBLIC_KEY": os.environ["PLAID_PUBLIC_KEY"],
@@ -58,6 +61,8 @@ class TestPlaidMethods(unittest.TestCase):
         application.config['TESTING'] = True
         application.config['WTF_CSRF_ENABLED'] = False
         application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
         self.app = application.test_client()
         # setup plaid client
         self.client = Client(
@@ -76,6 +81,7 @@ class TestPlaidMethods(unittest.TestCase):
         This is executed after each test.
         """
         db.session.remove()
+        self.app_context.pop()
 
     ####################################################################
     # Plaid Method Tests
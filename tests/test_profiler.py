@@ -0,0 +1,116 @@
+from app import create_app, classes, db, profiler
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+
+application = create_app()
+
+
+class TestProfiler(unittest.TestCase):
+    """Class for testing the on-demand request profiler"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        self.profile_dir = tempfile.mkdtemp()
+        application.config['TESTING'] = True
+        application.config['WTF_CSRF_ENABLED'] = False
+        application.config['PROFILE_TOKEN'] = 'secret'
+        application.config['PROFILE_DIR'] = self.profile_dir
+        application.config['PROFILE_KEEP'] = profiler.KEEP
+        self.app_context = application.app_context()
+        self.app_context.push()
+        self.app = application.test_client()
+        db.drop_all()
+        db.create_all()
+        db.session.add(classes.User('First', 'Last', 'test@test.com',
+                                    '6158675309', 'password'))
+        db.session.commit()
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        application.config['PROFILE_TOKEN'] = None
+        db.session.remove()
+        self.app_context.pop()
+        shutil.rmtree(self.profile_dir)
+
+    def profiles(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_profile_request(self):
+        response = self.app.get('/dashboard',
+                                headers={'X-Profile': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        name = response.headers['X-Profile-Id']
+        self.assertIn('-main.dashboard-', name)
+        self.assertEqual(self.profiles(), [name + '.pstats', name + '.txt'])
+        stats = pstats.Stats(os.path.join(self.profile_dir,
+                                          name + '.pstats'))
+        self.assertTrue(any(function == 'dashboard'
+                            for _, _, function in stats.stats))
+        with open(os.path.join(self.profile_dir, name + '.txt')) as report:
+            text = report.read()
+        self.assertTrue(text.startswith('GET /dashboard\n'))
+        self.assertIn('KiB, peak', text)
+        self.assertIn('KiB in', text)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        response = self.app.get('/dashboard?profile=secret')
+        self.assertIn('X-Profile-Id', response.headers)
+        self.assertEqual(len(self.profiles()), 4)
+
+    def test_tracing_left_on(self):
+        tracemalloc.start()
+        try:
+            response = self.app.get('/dashboard',
+                                    headers={'X-Profile': 'secret'})
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        name = response.headers['X-Profile-Id']
+        with open(os.path.join(self.profile_dir, name + '.txt')) as report:
+            text = report.read()
+        # the peak is only reported when it can be reset, Python 3.9+
+        self.assertEqual('KiB, peak' in text,
+                         hasattr(tracemalloc, 'reset_peak'))
+
+    def test_not_requested(self):
+        for headers in [{}, {'X-Profile': 'wrong'}, {'X-Profile': 'sécret'}]:
+            response = self.app.get('/dashboard', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Id', response.headers)
+        application.config['PROFILE_TOKEN'] = None
+        response = self.app.get('/dashboard', headers={'X-Profile': ''})
+        self.assertNotIn('X-Profile-Id', response.headers)
+        self.assertEqual(self.profiles(), [])
+
+    def test_one_profile_at_a_time(self):
+        with profiler._running:
+            response = self.app.get('/dashboard',
+                                    headers={'X-Profile': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response.headers)
+        self.assertEqual(self.profiles(), [])
+
+    def test_rotation(self):
+        application.config['PROFILE_KEEP'] = 2
+        names = [self.app.get('/dashboard', headers={'X-Profile': 'secret'})
+                 .headers['X-Profile-Id'] for _ in range(4)]
+        self.assertEqual(self.profiles(),
+                         sorted(name + extension for name in names[2:]
+                                for extension in ['.pstats', '.txt']))
+
+
+if __name__ == "__main__":
+    unittest.main()
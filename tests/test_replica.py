@@ -0,0 +1,93 @@
+from app import create_app, classes, db
+from app.database import REPLICA_BIND
+from config import Config
+import os
+import shutil
+import tempfile
+import unittest
+import flask
+
+
+class TestReplica(unittest.TestCase):
+    """Class for testing read-replica routing with two sqlite files"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        self.tmp_dir = tempfile.mkdtemp()
+        config = type('ReplicaConfig', (Config,), {
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'SQLALCHEMY_DATABASE_URI':
+                'sqlite:///' + os.path.join(self.tmp_dir, 'primary.db'),
+            'SQLALCHEMY_REPLICA_URI':
+                'sqlite:///' + os.path.join(self.tmp_dir, 'replica.db'),
+            'DB_STICKY_SECONDS': 60})
+        self.application = create_app(config)
+        self.app = self.application.test_client()
+        with self.application.app_context():
+            db.create_all()
+            db.Model.metadata.create_all(
+                bind=db.get_engine(self.application, bind=REPLICA_BIND))
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        shutil.rmtree(self.tmp_dir)
+
+    def add_user(self, email, phone):
+        user = classes.User('First', 'Last', email, phone, 'password')
+        db.session.add(user)
+        db.session.commit()
+
+    def test_reads_go_to_replica(self):
+        with self.application.app_context():
+            replica = db.get_engine(self.application, bind=REPLICA_BIND)
+            replica.execute(classes.User.__table__.insert().values(
+                first_name='Replica', last_name='Last', email='r@test.com',
+                phone='1111111111', password_hash='x'))
+            self.assertEqual(classes.User.query.one().first_name, 'Replica')
+
+    def test_session_reads_its_own_writes(self):
+        with self.application.app_context():
+            self.add_user('test@test.com', '6158675309')
+            self.assertEqual(classes.User.query.count(), 1)
+        with self.application.app_context():
+            # a new session without request context reads the replica
+            self.assertEqual(classes.User.query.count(), 0)
+
+    def test_user_sticks_to_primary_after_write(self):
+        data = {'first_name': 'First',
+                'last_name': 'Last',
+                'email': 'test@test.com',
+                'phone': '1234567890',
+                'password': 'password'}
+        login = dict(email='test@test.com', password='password')
+        with self.app as c:
+            response = self.app.post('/register', data=data)
+            self.assertTrue(response.location.endswith('login'))
+            self.app.post('/login', data=login)
+            self.assertIn('_user_id', flask.session)
+
+        # another client has not written, its reads go to the replica,
+        # which has no such user
+        with self.application.test_request_context('/index'):
+            self.assertEqual(classes.User.query.count(), 0)
+
+    def test_requests_that_may_write_read_primary(self):
+        with self.application.app_context():
+            self.add_user('test@test.com', '6158675309')
+        # e.g. the coin balance checked before buying a lottery ticket
+        with self.application.test_request_context('/dashboard',
+                                                   method='POST'):
+            self.assertEqual(classes.User.query.count(), 1)
+        with self.application.test_request_context('/dashboard'):
+            self.assertEqual(classes.User.query.count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,14 @@
-from app import application, classes, db
+from app import create_app, classes, db, lottery_cache
+from scripts import coin_transaction
 import os
 import unittest
 import flask
+from datetime import date, datetime, timedelta
+from unittest import mock
+from tests.query_budget import query_budget
+
+
+application = create_app()
 
 
 class TestRoutes(unittest.TestCase):
@@ -15,9 +22,13 @@ class TestRoutes(unittest.TestCase):
         application.config['TESTING'] = True
         application.config['WTF_CSRF_ENABLED'] = False
         application.config['DEBUG'] = False
+        self.app_context = application.app_context()
+        self.app_context.push()
         self.app = application.test_client()
         db.drop_all()
         db.create_all()
+        # lotteries cached by the previous test are gone with its database
+        application.extensions.pop('active_lotteries', None)
 
     def tearDown(self):
         """Clean-up for the test cases
@@ -25,6 +36,7 @@ class TestRoutes(unittest.TestCase):
         This is executed after each test.
         """
         db.session.remove()
+        self.app_context.pop()
 
     ####################################################################
     # Route Tests
@@ -77,6 +89,22 @@ class TestRoutes(unittest.TestCase):
         with self.app as c:
             response = self.app.post('/register', data=data)
             self.assertTrue(response.location.endswith('login'))
+        self.assertEqual(classes.User.query.one().timezone,
+                         'America/Los_Angeles')
+
+    def test_register_with_time_zone(self):
+        data = {'first_name': 'First',
+                'last_name': 'Last',
+                'email': 'test@test.com',
+                'phone': '1234567890',
+                'password': 'password',
+                'timezone': 'Europe/London'}
+        self.app.post('/register', data=data)
+        self.assertEqual(classes.User.query.one().timezone, 'Europe/London')
+        data['timezone'] = 'Mars/Olympus_Mons'
+        data['email'] = 'test@test1.com'
+        self.app.post('/register', data=data)
+        self.assertEqual(classes.User.query.count(), 1)
 
     def test_email_exists_register(self):
         test_user = classes.User('First', 'Last', 'test@test.com',
@@ -107,6 +135,326 @@ class TestRoutes(unittest.TestCase):
             response = self.app.post('/register', data=data)
             self.assertEqual(response.location, None)
 
+    def test_dashboard_tabs(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158675309', 'password')
+        test_user.status = 'verified'
+        db.session.add(test_user)
+        db.session.add(classes.Habits(user=test_user, habit_name='latte',
+                                      habit_category='Coffee', time_minute=0,
+                                      time_hour=9,
+                                      time_day_of_week='weekday'))
+        db.session.commit()
+        with self.app as c:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            response = self.app.get('/dashboard')
+            self.assertEqual(response.status_code, 200)
+            for tab in ['savings', 'insights', 'habits', 'lottery',
+                        'account']:
+                self.assertIn(b'/dashboard/' + tab.encode(), response.data)
+                data = self.app.get('/dashboard/' + tab).get_json()
+                self.assertIn('html', data)
+            data = self.app.get('/dashboard/habits').get_json()
+            self.assertEqual(data['habits'][0]['habit_name'], 'latte')
+            self.assertIn('latte', data['html'])
+
+    def test_dashboard_etag(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158675309', 'password')
+        db.session.add(test_user)
+        db.session.commit()
+        with self.app as c:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            response = self.app.get('/dashboard/habits')
+            etag = response.headers['ETag']
+            with mock.patch('app.routes.render_template') as render:
+                response = self.app.get('/dashboard/habits',
+                                        headers={'If-None-Match': etag})
+                render.assert_not_called()
+            self.assertEqual(response.status_code, 304)
+
+            # saving habits bumps the user's data version
+            self.app.post('/habit_table_save_changes',
+                          data=dict(habit_name=['latte'],
+                                    habit_category=['coffee'],
+                                    time_hour_minute=['09:30'],
+                                    time_day_of_week=['weekday']))
+            response = self.app.get('/dashboard/habits',
+                                    headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_receive_message_numbered_replies(self):
+        user = classes.User('First', 'Last', 'test@test.com', '6158675309',
+                            'password')
+        reminded_at = datetime.utcnow()
+        habits = [classes.Habits(user=user, habit_name=name,
+                                 habit_category=category, time_minute=0,
+                                 time_hour=9, time_day_of_week='everyday',
+                                 reminded_at=reminded_at)
+                  for name, category in [('latte', 'Coffee'),
+                                         ('salad', 'Lunch')]]
+        db.session.add(user)
+        db.session.commit()
+
+        def reply(body):
+            return self.app.post('/receive_message',
+                                 data={'From': '+16158675309',
+                                       'Body': body}).data
+
+        def saved():
+            return sorted(coin.habit_id for coin in classes.Coin.query)
+
+        self.assertIn(b'respond with the numbers', reply('3'))
+        self.assertIn(b'maybe next time', reply('N'))
+        self.assertIn(b'you save some money today', reply('2'))
+        self.assertEqual(saved(), [habits[1].id])
+        # the lunch saving is not counted twice
+        self.assertIn(b'you save some money today', reply('1, 2'))
+        self.assertEqual(saved(), [habits[0].id, habits[1].id])
+        self.assertIn(b"Oops", reply('Y'))
+        self.assertEqual(classes.User.query.get(user.id).coins, 20)
+
+    def test_lottery_odds_and_draw(self):
+        buyer = classes.User('First', 'Last', 'test@test.com', '6158675309',
+                             'password')
+        other = classes.User('Other', 'Last', 'other@test.com',
+                             '6158675310', 'password')
+        lottery = classes.Lottery(lottery_name='Bike',
+                                  start_date=datetime(2020, 1, 1),
+                                  end_date=datetime(2099, 1, 31),
+                                  category='Sport', cost=5)
+        db.session.add_all([buyer, other, lottery])
+        db.session.commit()
+        coin_transaction.enter_lottery(other, lottery)
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+        for _ in range(2):
+            self.app.post('/dashboard', data=dict(lottery_submit='buy',
+                                                  lottery_check=lottery.id))
+        self.assertEqual(classes.Lottery.query.get(lottery.id).total_entries,
+                         3)
+
+        bought = self.app.get('/dashboard/lottery').get_json()['bought']
+        self.assertEqual(bought[0]['entries'], 2)
+        self.assertAlmostEqual(bought[0]['odds'], 2 / 3)
+
+        # ticket 0 is the first entrant's, 1 and 2 are the buyer's
+        self.assertEqual([(ticket.ticket_offset, ticket.user_id)
+                          for ticket in classes.LotteryTicket.query
+                          .order_by(classes.LotteryTicket.ticket_offset)],
+                         [(0, other.id), (1, buyer.id), (2, buyer.id)])
+        with mock.patch('app.sms.send'), \
+                mock.patch('random.randrange', return_value=2), \
+                query_budget(4):
+            coin_transaction.draw_lottery(lottery)
+        self.assertEqual(lottery.winner_user_id, buyer.id)
+        with mock.patch('app.sms.send'), \
+                mock.patch('random.randrange', return_value=0):
+            coin_transaction.draw_lottery(lottery)
+        self.assertEqual(lottery.winner_user_id, other.id)
+
+    def test_lottery_etag_follows_other_entries(self):
+        buyer = classes.User('First', 'Last', 'test@test.com', '6158675309',
+                             'password')
+        other = classes.User('Other', 'Last', 'other@test.com',
+                             '6158675310', 'password')
+        lottery = classes.Lottery(lottery_name='Bike',
+                                  start_date=datetime(2020, 1, 1),
+                                  end_date=datetime(2099, 1, 31),
+                                  category='Sport', cost=5)
+        db.session.add_all([buyer, other, lottery])
+        db.session.commit()
+        coin_transaction.enter_lottery(buyer, lottery)
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+        response = self.app.get('/dashboard/lottery')
+        self.assertEqual(response.get_json()['bought'][0]['odds'], 1)
+        etag = response.headers['ETag']
+        self.assertEqual(self.app.get(
+            '/dashboard/lottery',
+            headers={'If-None-Match': etag}).status_code, 304)
+
+        # another entry changes the buyer's odds, not their data version
+        coin_transaction.enter_lottery(other, lottery)
+        response = self.app.get('/dashboard/lottery',
+                                headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['bought'][0]['odds'], 1 / 2)
+
+    def test_active_lottery_cache(self):
+        cache = lottery_cache.LotteryCache(
+            clock=lambda: datetime(2020, 1, 15))
+        lottery = classes.Lottery(lottery_name='Bike',
+                                  start_date=datetime(2020, 1, 1),
+                                  end_date=datetime(2020, 1, 31, 23, 59),
+                                  category='Sport', cost=5)
+        upcoming = classes.Lottery(lottery_name='Car',
+                                   start_date=datetime(2020, 1, 15, 0, 0, 30),
+                                   end_date=datetime(2020, 2, 29),
+                                   category='Sport', cost=5)
+        db.session.add_all([lottery, upcoming])
+        db.session.commit()
+        self.assertEqual([active.lottery_name for active in cache.get()],
+                         ['Bike'])
+        # until the next lottery starts
+        self.assertEqual(cache.expires_at, datetime(2020, 1, 15, 0, 0, 30))
+        with query_budget(0):
+            cache.get()
+
+        # committing a lottery change drops the app's cache
+        with application.test_request_context():
+            app_cache = lottery_cache.cache()
+            self.assertEqual(len(lottery_cache.active_lotteries()), 0)
+            db.session.add(classes.Lottery(
+                lottery_name='Boat', start_date=datetime(2020, 1, 1),
+                end_date=datetime(2099, 1, 1), category='Sport', cost=5))
+            db.session.commit()
+            self.assertEqual([active.lottery_name for active
+                              in lottery_cache.active_lotteries()], ['Boat'])
+            self.assertIs(lottery_cache.cache(), app_cache)
+
+    ####################################################################
+    # Query Budgets
+    ####################################################################
+    def budget_user(self):
+        """Add a verified user with three habits due, an account and
+        entries in three open and three ended lotteries, and log them in"""
+        user = classes.User('First', 'Last', 'test@test.com', '6158675309',
+                            'password')
+        user.status = 'verified'
+        item = classes.PlaidItems(user=user, item_id='item',
+                                  access_token='token')
+        classes.Accounts(user=user, plaid_item=item, account_plaid_id='old')
+        due = datetime.utcnow() - timedelta(minutes=1)
+        for name in ['latte', 'lunch', 'taxi']:
+            classes.Habits(user=user, habit_name=name,
+                           habit_category='Coffee', time_minute=0,
+                           time_hour=9, time_day_of_week='everyday',
+                           next_fire_at=due)
+        for i in range(6):
+            # the ended ones are already drawn, /send_message texts no one
+            lottery = classes.Lottery(lottery_name='Prize {}'.format(i),
+                                      start_date=datetime(2020, 1, 1),
+                                      end_date=datetime(2099 if i < 3
+                                                        else 2020, 1, 31),
+                                      category='Gift Card', cost=10,
+                                      winner_user_id=1 if i >= 3 else None,
+                                      total_entries=4)
+            classes.UserLotteryLog(user=user, lottery=lottery)
+        db.session.add(user)
+        db.session.commit()
+        self.app.post('/login', data=dict(email='test@test.com',
+                                          password='password'))
+        # the test's session outlives requests, start them with nothing
+        # loaded so lazy loads are counted
+        db.session.remove()
+
+    def test_dashboard_query_budget(self):
+        self.budget_user()
+        # the user and the cached dashboard data
+        with query_budget(2):
+            self.app.get('/dashboard')
+        # the user, the open lotteries and the next start, cached for every
+        # user, their entry totals, and the entries with their lotteries,
+        # however many lotteries were entered
+        with query_budget(5):
+            response = self.app.get('/dashboard/lottery')
+        self.assertEqual(len(response.get_json()['bought']), 6)
+        self.assertEqual(len(response.get_json()['available']), 3)
+        with query_budget(3):
+            self.app.get('/dashboard/lottery')
+
+    def test_receive_message_query_budget(self):
+        self.budget_user()
+        with mock.patch('app.sms.send'):
+            self.app.get('/send_message')
+        db.session.remove()
+        # one insert per coin
+        with query_budget(7):
+            response = self.app.post('/receive_message',
+                                     data={'From': '+16158675309',
+                                           'Body': 'Y'})
+        self.assertIn(b'you save some money today', response.data)
+        self.assertEqual(classes.Coin.query.filter_by(
+            description='saving').count(), 3)
+
+    def test_send_message_query_budget(self):
+        self.budget_user()
+        # the due habits of a user are locked, advanced and committed
+        # together, a few statements per user are expected
+        with mock.patch('app.sms.send') as send, query_budget(6):
+            self.app.get('/send_message')
+        send.assert_called_once()
+
+    def test_access_plaid_token_query_budget(self):
+        self.budget_user()
+        transaction = {'date': '2019-10-02', 'authorized_date': '2019-10-02',
+                       'amount': 4.5, 'category': ['Food and Drink'],
+                       'category_id': '13005043',
+                       'location': {'address': None, 'city': None,
+                                    'region': None, 'country': None,
+                                    'postal_code': None, 'lon': None,
+                                    'lat': None}}
+        form = {'public_token': 'public',
+                'accounts[0][id]': 'new', 'accounts[0][name]': 'Checking',
+                'accounts[0][type]': 'depository',
+                'accounts[0][subtype]': 'checking'}
+        with mock.patch('app.routes.token_exchange',
+                        return_value={'item_id': 'new-item',
+                                      'access_token': 'new-token'}), \
+                mock.patch('app.routes.get_transactions',
+                           return_value=[transaction] * 3) as transactions, \
+                query_budget(20):
+            self.app.post('/access_plaid_token', data=form)
+        # the account linked before is not imported again
+        transactions.assert_called_once()
+        self.assertEqual(transactions.call_args[1],
+                         dict(access_token='new-token', account_id='new'))
+        self.assertEqual(classes.Transaction.query.count(), 3)
+
+    def test_delete_plaid_account(self):
+        test_user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158675309', 'password')
+        item = classes.PlaidItems(user=test_user, item_id='item',
+                                  access_token='token')
+        account = classes.Accounts(user=test_user, plaid_item=item,
+                                   account_plaid_id='account')
+        for _ in range(3):
+            db.session.add(classes.Transaction(user=test_user,
+                                               account=account,
+                                               trans_amount=1,
+                                               trans_date=date.today()))
+        db.session.add(test_user)
+        db.session.commit()
+        account_id = account.id
+        with self.app as c, \
+                mock.patch('app.routes.jobs.submit') as submit:
+            self.app.post('/login', data=dict(email='test@test.com',
+                                              password='password'))
+            # the account delete commits once, when it fails nothing is
+            # deleted and the item stays linked at plaid
+            with mock.patch.object(db.session, 'commit',
+                                   side_effect=RuntimeError) as commit, \
+                    self.assertRaises(RuntimeError):
+                self.app.post('/delete_plaid_account',
+                              data=dict(accountId=account_id))
+            commit.assert_called_once()
+            submit.assert_not_called()
+            db.session.rollback()
+            self.assertEqual(classes.Transaction.query.count(), 3)
+            self.assertEqual(classes.Accounts.query.count(), 1)
+            response = self.app.post('/delete_plaid_account',
+                                     data=dict(accountId=account_id))
+            self.assertTrue(response.location.endswith('dashboard'))
+            submit.assert_called_once()
+            self.assertEqual(submit.call_args[0][2], 'token')
+        self.assertEqual(classes.Transaction.query.count(), 0)
+        self.assertEqual(classes.Accounts.query.count(), 0)
+        self.assertEqual(classes.PlaidItems.query.count(), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,246 @@
+from app import create_app, classes, db
+from app.scheduler import DRAW_RETRY, Scheduler, dispatch_due, \
+    next_fire_at, parse_reply, schedule
+import unittest
+import pytz
+from datetime import datetime, timedelta
+from unittest import mock
+
+
+application = create_app()
+TZ = pytz.timezone("America/Los_Angeles")
+
+
+def local(*args):
+    """Return a time in the app's time zone as UTC"""
+    return TZ.localize(datetime(*args)).astimezone(pytz.utc)
+
+
+def utc(*args):
+    """Return a time in UTC"""
+    return pytz.utc.localize(datetime(*args))
+
+
+class Clock:
+    """Fake clock the tests move forward"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler(unittest.TestCase):
+    """Class for testing the reminder scheduler"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        self.app_context = application.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+        self.user = classes.User('First', 'Last', 'test@test.com',
+                                 '6158675309', 'password')
+        self.habit = classes.Habits(user=self.user, habit_name='latte',
+                                    habit_category='Coffee', time_minute=30,
+                                    time_hour=9,
+                                    time_day_of_week='weekday')
+        # Friday 3 January 2020, 8:00 in Los Angeles
+        self.clock = Clock(local(2020, 1, 3, 8, 0))
+        schedule(self.habit, self.user.tz, self.clock.now)
+        db.session.add(self.user)
+        db.session.commit()
+        self.scheduler = Scheduler(clock=self.clock)
+        self.send = mock.patch('app.sms.send').start()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        mock.patch.stopall()
+        db.session.remove()
+        self.app_context.pop()
+
+    def test_next_fire_at(self):
+        self.assertEqual(next_fire_at(self.habit, local(2020, 1, 3, 8, 0)),
+                         local(2020, 1, 3, 9, 30))
+        # after Friday's reminder the next weekday is Monday
+        self.assertEqual(next_fire_at(self.habit, local(2020, 1, 3, 9, 30)),
+                         local(2020, 1, 6, 9, 30))
+        self.habit.time_day_of_week = 'weekend'
+        self.assertEqual(next_fire_at(self.habit, local(2020, 1, 3, 8, 0)),
+                         local(2020, 1, 4, 9, 30))
+
+    def test_daylight_saving_transitions(self):
+        self.habit.time_day_of_week = 'everyday'
+        # Los Angeles springs forward on 8 March 2020, 9:30 moves from
+        # 17:30 to 16:30 UTC
+        self.assertEqual(next_fire_at(self.habit, local(2020, 3, 7, 10, 0)),
+                         utc(2020, 3, 8, 16, 30))
+        self.assertEqual(next_fire_at(self.habit, local(2020, 3, 6, 10, 0)),
+                         utc(2020, 3, 7, 17, 30))
+        # 2:30 does not exist that day, the reminder is sent at 3:30 PDT
+        self.habit.time_hour = 2
+        self.assertEqual(next_fire_at(self.habit, local(2020, 3, 7, 10, 0)),
+                         utc(2020, 3, 8, 10, 30))
+        # and falls back on 1 November 2020, 1:30 happens twice and the
+        # reminder is sent once, at 1:30 PST
+        self.habit.time_hour = 1
+        self.assertEqual(next_fire_at(self.habit, local(2020, 10, 31, 10, 0)),
+                         utc(2020, 11, 1, 9, 30))
+        self.assertEqual(next_fire_at(self.habit, utc(2020, 11, 1, 9, 30)),
+                         utc(2020, 11, 2, 9, 30))
+
+    def test_user_time_zone(self):
+        self.user.timezone = 'Europe/London'
+        schedule(self.habit, self.user.tz, self.clock.now)
+        self.assertEqual(self.habit.next_fire_at, datetime(2020, 1, 6, 9, 30))
+        # London springs forward on 29 March 2020, three weeks after Los
+        # Angeles
+        schedule(self.habit, self.user.tz, local(2020, 3, 26, 12, 0))
+        self.assertEqual(self.habit.next_fire_at, datetime(2020, 3, 27, 9, 30))
+        schedule(self.habit, self.user.tz, local(2020, 3, 27, 12, 0))
+        self.assertEqual(self.habit.next_fire_at, datetime(2020, 3, 30, 8, 30))
+
+    def test_habit_reminders(self):
+        self.assertEqual(self.habit.next_fire_at, datetime(2020, 1, 3, 17, 30))
+        self.assertEqual(self.scheduler.wait_seconds(), 5)
+        self.assertEqual(self.scheduler.run_due(), 0)
+
+        self.clock.now = local(2020, 1, 3, 9, 29, 58)
+        self.assertEqual(self.scheduler.wait_seconds(), 2)
+        self.clock.now = local(2020, 1, 3, 9, 30)
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.send.assert_called_once_with(
+            '6158675309', 'Would you like to save $5 on Coffee today? '
+                          'Respond Y/N')
+        self.assertEqual(self.user.saving_suggestions, 1)
+        # advanced past the weekend
+        self.assertEqual(classes.Habits.query.get(self.habit.id).next_fire_at,
+                         datetime(2020, 1, 6, 17, 30))
+        self.assertEqual(dispatch_due(local(2020, 1, 5, 23, 0)), 0)
+
+    def test_same_time_reminders_are_one_text(self):
+        lunch = classes.Habits(user=self.user, habit_name='salad',
+                               habit_category='Lunch', time_minute=30,
+                               time_hour=9, time_day_of_week='everyday')
+        schedule(lunch, self.user.tz, self.clock.now)
+        db.session.add(lunch)
+        db.session.commit()
+
+        self.clock.now = local(2020, 1, 3, 9, 30)
+        self.assertEqual(self.scheduler.run_due(), 2)
+        self.send.assert_called_once_with(
+            '6158675309', 'Would you like to save $5 today on 1. Coffee '
+                          '(latte) 2. Lunch (salad)? Respond with the '
+                          'numbers you save on (e.g. 1 2), Y for all or N')
+        self.assertEqual(self.user.saving_suggestions, 2)
+        self.assertEqual(self.habit.reminded_at, datetime(2020, 1, 3, 17, 30))
+        self.assertEqual(lunch.reminded_at, datetime(2020, 1, 3, 17, 30))
+
+    def test_parse_reply(self):
+        self.assertEqual(parse_reply('Y', 3), [1, 2, 3])
+        self.assertEqual(parse_reply(' n ', 3), [])
+        self.assertEqual(parse_reply('3, 1 3', 3), [1, 3])
+        self.assertIsNone(parse_reply('4', 3))
+        self.assertIsNone(parse_reply('yes please', 3))
+
+    def test_late_reminders_are_skipped(self):
+        self.clock.now = local(2020, 1, 3, 11, 0)
+        self.assertEqual(self.scheduler.run_due(), 0)
+        self.send.assert_not_called()
+        self.assertEqual(classes.Habits.query.get(self.habit.id).next_fire_at,
+                         datetime(2020, 1, 6, 17, 30))
+
+    def test_failed_send_is_not_retried(self):
+        self.clock.now = local(2020, 1, 3, 9, 30)
+        self.send.side_effect = RuntimeError
+        with self.assertLogs('app.scheduler', level='ERROR'):
+            self.assertEqual(dispatch_due(self.clock.now), 0)
+        self.send.reset_mock(side_effect=True)
+        self.clock.now += timedelta(seconds=5)
+        self.assertEqual(dispatch_due(self.clock.now), 0)
+        self.send.assert_not_called()
+        habit = classes.Habits.query.get(self.habit.id)
+        self.assertEqual(habit.next_fire_at, datetime(2020, 1, 6, 17, 30))
+        self.assertIsNone(habit.reminded_at)
+
+    def test_edited_habits_are_dispatched(self):
+        db.session.delete(self.habit)
+        lunch = classes.Habits(user=self.user, habit_name='lunch',
+                               habit_category='Lunch', time_minute=0,
+                               time_hour=12, time_day_of_week='everyday')
+        schedule(lunch, self.user.tz, self.clock.now)
+        db.session.add(lunch)
+        db.session.commit()
+
+        self.clock.now = local(2020, 1, 3, 12, 0)
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertIn('Lunch', self.send.call_args[0][1])
+
+    def test_lottery_drawn_at_end_date(self):
+        self.scheduler.load_lotteries()
+        lottery = classes.Lottery(lottery_name='Bike',
+                                  start_date=datetime(2020, 1, 1),
+                                  end_date=datetime(2020, 1, 3, 10, 0),
+                                  category='Sport', cost=10,
+                                  total_entries=1)
+        db.session.add(lottery)
+        db.session.add(classes.UserLotteryLog(user=self.user,
+                                              lottery=lottery))
+        db.session.add(classes.LotteryTicket(user=self.user, lottery=lottery,
+                                             ticket_offset=0))
+        self.habit.time_day_of_week = 'weekend'
+        schedule(self.habit, self.user.tz, self.clock.now)
+        db.session.commit()
+        self.scheduler.load_lotteries()
+
+        self.clock.now = local(2020, 1, 3, 9, 59)
+        self.assertEqual(self.scheduler.run_due(), 0)
+        self.assertIsNone(lottery.winner_user_id)
+        self.assertEqual(self.scheduler.wait_seconds(), 5)
+        self.clock.now += timedelta(minutes=1)
+        self.assertEqual(self.scheduler.wait_seconds(), 0)
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertEqual(classes.Lottery.query.get(lottery.id)
+                         .winner_user_id, self.user.id)
+        self.assertIn('Bike', self.send.call_args[0][1])
+
+    def test_failed_draw_is_retried(self):
+        lottery = classes.Lottery(lottery_name='Bike',
+                                  start_date=datetime(2020, 1, 1),
+                                  end_date=datetime(2020, 1, 3, 7, 0),
+                                  category='Sport', cost=10,
+                                  total_entries=1)
+        db.session.add(lottery)
+        db.session.add(classes.UserLotteryLog(user=self.user,
+                                              lottery=lottery))
+        db.session.add(classes.LotteryTicket(user=self.user, lottery=lottery,
+                                             ticket_offset=0))
+        db.session.commit()
+        lottery_id = lottery.id
+        self.scheduler.load_lotteries()
+        self.send.side_effect = RuntimeError
+        with self.assertLogs('app.scheduler', level='ERROR'):
+            self.assertEqual(self.scheduler.run_due(), 0)
+        self.assertEqual(self.scheduler.heap,
+                         [(self.clock.now + DRAW_RETRY, lottery_id)])
+
+        self.send.side_effect = None
+        self.scheduler.load_lotteries()
+        self.assertEqual(self.scheduler.run_due(), 0)
+        self.clock.now += DRAW_RETRY
+        self.assertEqual(self.scheduler.run_due(), 1)
+        self.assertEqual(classes.Lottery.query.get(lottery_id)
+                         .winner_user_id, self.user.id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+from app import create_app, classes, db
+from scripts import habit_aggregates, habit_buckets, seed_db
+import unittest
+from datetime import date
+
+
+application = create_app()
+
+
+class TestSeedDb(unittest.TestCase):
+    """Class for testing the offline synthetic data generator"""
+
+    def setUp(self):
+        """Initialization for the test cases
+
+        This is executed prior to each test.
+        """
+        application.config['TESTING'] = True
+        self.app_context = application.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        """Clean-up for the test cases
+
+        This is executed after each test.
+        """
+        db.session.remove()
+        self.app_context.pop()
+
+    def transactions(self):
+        return db.session.query(
+            classes.Transaction.user_id, classes.Transaction.trans_date,
+            classes.Transaction.trans_amount,
+            classes.Transaction.category_id) \
+            .order_by(classes.Transaction.id).all()
+
+    def test_seed(self):
+        counts = seed_db.seed(50, seed=1, chunk_size=20)
+        self.assertEqual(counts['user'], 50)
+        self.assertEqual(classes.User.query.count(), 50)
+        self.assertEqual(classes.Accounts.query.count(), 50)
+        self.assertEqual(classes.Transaction.query.count(),
+                         counts['transaction'])
+        self.assertGreater(counts['transaction'], 50 * 30)
+
+        user = classes.User.query.get(7)
+        self.assertEqual(user.coins,
+                         sum(coin.coin_amount for coin in user.coin))
+        self.assertGreaterEqual(user.coins, 0)
+        transaction = user.transaction[0]
+        self.assertEqual(transaction.account.user_id, user.id)
+        self.assertEqual(transaction.habit_bucket,
+                         habit_buckets.classify(transaction.category_id))
+        for habit in user.habits:
+            self.assertIsNotNone(habit.next_fire_at)
+
+        # the generated aggregates are the ones ingestion would build
+        summary = habit_aggregates.summarize(
+            user.id, habit_buckets.COFFEE, date(2019, 10, 1), 3)
+        habit_aggregates.rebuild(user.id)
+        self.assertEqual(habit_aggregates.summarize(
+            user.id, habit_buckets.COFFEE, date(2019, 10, 1), 3), summary)
+
+        # lotteries that ended were won by one of their entrants
+        lottery = classes.Lottery.query.get(1)
+        self.assertIn(lottery.winner_user_id,
+                      [log.user_id for log in classes.UserLotteryLog.query
+                       .filter_by(lottery_id=lottery.id)])
+        self.assertIsNone(classes.Lottery.query.get(3).winner_user_id)
+        for lottery in classes.Lottery.query:
+            self.assertEqual(lottery.total_entries,
+                             sum(log.entries for log in lottery.lottery_log))
+            # the tickets are numbered from 0 without gaps
+            offset = 0
+            for ticket in sorted(lottery.tickets,
+                                 key=lambda ticket: ticket.ticket_offset):
+                self.assertEqual(ticket.ticket_offset, offset)
+                offset += ticket.entries
+            self.assertEqual(offset, lottery.total_entries)
+
+    def test_same_seed_same_data(self):
+        seed_db.seed(20, seed=3)
+        first = self.transactions()
+        db.drop_all()
+        db.create_all()
+        seed_db.seed(20, seed=3)
+        self.assertEqual(self.transactions(), first)
+        db.drop_all()
+        db.create_all()
+        seed_db.seed(20, seed=4)
+        self.assertNotEqual(self.transactions(), first)
+
+    def test_command(self):
+        result = application.test_cli_runner().invoke(
+            args=['seed-db', '--users', '5', '--months', '1'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('user: 5', result.output)
+        self.assertEqual(db.session.query(
+            db.func.min(classes.Transaction.trans_date)).scalar().month, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+from app import create_app, classes, db, sms
+import threading
+import time
+import unittest
+
+
+application = create_app()
+
+
+class FakeTransport:
+    """Transport recording the texts, refusing the first throttled ones"""
+
+    def __init__(self, throttled=0, retry_after=None):
+        self.sent = []
+        self.throttled = throttled
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+
+    def __call__(self, sender, to, body):
+        with self.lock:
+            if self.throttled:
+                self.throttled -= 1
+                raise sms.RateLimited(self.retry_after)
+            self.sent.append((sender, to, body, time.monotonic()))
+        return len(self.sent)
+
+
+class TestSms(unittest.TestCase):
+    """Class for testing the outbound text rate shaper"""
+
+    def test_token_bucket(self):
+        bucket = sms.TokenBucket(rate=2, burst=2, now=0)
+        self.assertEqual(bucket.wait(0), 0)
+        bucket.take()
+        bucket.take()
+        self.assertEqual(bucket.wait(0), 0.5)
+        self.assertEqual(bucket.wait(0.5), 0)
+        # a 429 halves the rate and pauses the number
+        bucket.throttled(0.5, retry_after=3)
+        self.assertEqual(bucket.rate, 1)
+        self.assertEqual(bucket.wait(0.5), 3)
+        self.assertEqual(bucket.wait(3.5), 0)
+        bucket.take()
+        self.assertEqual(bucket.wait(3.5), 1)
+        for _ in range(5):
+            bucket.succeeded()
+        self.assertAlmostEqual(bucket.rate, 2)
+
+    def test_backoff_without_retry_after(self):
+        bucket = sms.TokenBucket(rate=1, burst=1, now=0)
+        bucket.throttled(0)
+        self.assertEqual(bucket.blocked_until, sms.BACKOFF_SECONDS)
+        bucket.throttled(1)
+        self.assertEqual(bucket.blocked_until, 1 + 2 * sms.BACKOFF_SECONDS)
+        self.assertEqual(bucket.rate, 0.25)
+
+    def test_rate_per_sender(self):
+        transport = FakeTransport()
+        shaper = sms.RateShaper(['+1', '+2'], transport, rate=20)
+        start = time.monotonic()
+        for i in range(6):
+            shaper.send('6158675309', str(i))
+        # one text at once from each number, then one per 50 ms from each
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        senders = [sender for sender, _, _, _ in transport.sent]
+        self.assertEqual(sorted(senders), ['+1'] * 3 + ['+2'] * 3)
+        for sender in ['+1', '+2']:
+            times = [at for number, _, _, at in transport.sent
+                     if number == sender]
+            for before, after in zip(times, times[1:]):
+                self.assertGreaterEqual(after - before, 0.045)
+
+    def test_rate_limited_retry(self):
+        transport = FakeTransport(throttled=1, retry_after=0.05)
+        shaper = sms.RateShaper(['+1'], transport, rate=100)
+        self.assertEqual(shaper.send('6158675309', 'Hello'), 1)
+        self.assertEqual(len(transport.sent), 1)
+        self.assertAlmostEqual(shaper.store.buckets['+1'].rate, 60)
+
+        transport.throttled = 2
+        shaper = sms.RateShaper(['+1'], transport, rate=100, max_retries=1)
+        with self.assertRaises(sms.RateLimited):
+            shaper.send('6158675309', 'Hello')
+        self.assertEqual(len(transport.sent), 1)
+
+    def test_lanes(self):
+        transport = FakeTransport()
+        shaper = sms.RateShaper(['+1'], transport, rate=10)
+        shaper.send('6158675309', 'first')
+        threads = []
+        for body, lane in [('lottery', sms.LOTTERY),
+                           ('reminder', sms.REMINDER),
+                           ('lottery 2', sms.LOTTERY),
+                           ('reminder 2', sms.REMINDER)]:
+            threads.append(threading.Thread(
+                target=shaper.send, args=('6158675309', body, lane)))
+            threads[-1].start()
+            while shaper.waiting() < len(threads):
+                time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+        self.assertEqual([body for _, _, body, _ in transport.sent],
+                         ['first', 'reminder', 'reminder 2', 'lottery',
+                          'lottery 2'])
+
+    def test_app_shaper(self):
+        application.config['SMS_SENDERS'] = ['+1', '+2']
+        with application.app_context():
+            shaper = sms.shaper()
+            self.assertIs(sms.shaper(), shaper)
+            self.assertIsInstance(shaper.store, sms.DatabaseBuckets)
+            self.assertEqual(shaper.store.senders, ['+1', '+2'])
+            self.assertIs(shaper.transport, sms.twilio_transport)
+            del application.extensions['sms']
+
+    def test_shared_buckets(self):
+        with application.app_context():
+            db.drop_all()
+            db.create_all()
+            transport = FakeTransport(throttled=1, retry_after=0.05)
+            # the shapers of two processes
+            shapers = [sms.RateShaper(
+                ['+1'], transport, clock=time.time,
+                store=sms.DatabaseBuckets(db.engine, ['+1'], 20, 1))
+                for _ in range(2)]
+            start = time.monotonic()
+            for i in range(4):
+                shapers[i % 2].send('6158675309', str(i))
+            # one 429 pauses the number for both, then they share its
+            # halved rate, recovering a tenth of it with each text
+            self.assertGreaterEqual(time.monotonic() - start,
+                                    0.05 + 1 / 12 + 1 / 14 + 1 / 16)
+            times = [at for _, _, _, at in transport.sent]
+            for before, after in zip(times, times[1:]):
+                self.assertGreaterEqual(after - before, 0.045)
+            sender = classes.SmsSender.query.get('+1')
+            self.assertEqual(sender.failures, 0)
+            self.assertLess(sender.rate, 20)
+            db.session.remove()
+
+
+if __name__ == "__main__":
+    unittest.main()